@@ -0,0 +1,185 @@
+# coding: utf-8
+
+"""以MySQL命令行的样式在终端中渲染表格
+列宽根据采样的行计算，渲染时逐块输出，不需要在内存中保存整张表格的文本，
+对于很大的表格，可以只显示开头和结尾的若干行：
+
+    +----+-------+
+    | id | name  |
+    +----+-------+
+    |  1 | Sam   |
+    |  2 | Jack  |
+    | .. | ...   |
+    +----+-------+
+"""
+
+import re
+import types
+import unicodedata
+from itertools import islice
+
+# 默认用于计算列宽的采样行数
+DEFAULT_SAMPLE_SIZE = 1000
+
+_NON_ASCII = re.compile(u"[^\x00-\x7f]")
+_CONTROL_CHARS = re.compile(u"[\r\n\t]")
+_NUMBER_TYPES = (types.IntType, types.LongType, types.FloatType)
+_ELLIPSIS = u"..."
+
+
+class ConsoleTableRenderer(object):
+
+    """终端表格渲染器
+    """
+
+    # 每次写出的行数
+    ROWS_PER_CHUNK = 1000
+
+    def __init__(self, table, max_rows=None, head=None, tail=None,
+                 sample_size=DEFAULT_SAMPLE_SIZE):
+        """
+        :param table 要渲染的表格
+        :param max_rows 最多显示的行数，超出时显示开头和结尾各一半
+        :param head 显示开头的行数，与tail一起指定时会忽略max_rows
+        :param tail 显示结尾的行数
+        :param sample_size 用于计算列宽的采样行数，为None时扫描所有要显示的行，
+                           采样之后的行中超出列宽的内容会被截断
+        """
+        self._table = table
+        self._max_rows = max_rows
+        self._head = head
+        self._tail = tail
+        self._sample_size = sample_size
+
+    def render(self, write):
+        """渲染表格
+        :param write 接受unicode片段的写函数
+        """
+        table = self._table
+        titles = [_text(title.title) for title in table.titles]
+        total = len(table)
+        head_num, tail_num = self._partition(total)
+        omitted = total - head_num - tail_num
+
+        # 采样开头的行以及全部结尾的行用于计算列宽
+        rows = islice(table, head_num)
+        sample_num = head_num if self._sample_size is None \
+            else min(self._sample_size, head_num)
+        sample = [_row_cells(row) for row in islice(rows, sample_num)]
+        tail_cells = [_row_cells(table[idx])
+                      for idx in xrange(total - tail_num, total)]
+        widths, aligns = _measure(titles, sample + tail_cells)
+
+        border = u"+" + u"+".join(u"-" * (width + 2) for width in widths) \
+            + u"+"
+        format_line = _line_formatter(widths, aligns)
+        write(u"\n".join((
+            border,
+            format_line(titles, [False] * len(widths)),
+            border,
+        )) + u"\n")
+
+        chunk = [format_line(cells) for cells in sample]
+        for row in rows:
+            chunk.append(format_line(_row_cells(row)))
+            if len(chunk) >= self.ROWS_PER_CHUNK:
+                write(u"\n".join(chunk) + u"\n")
+                chunk = []
+        if omitted:
+            chunk.append(format_line([_ELLIPSIS] * len(widths),
+                                     [False] * len(widths)))
+        chunk.extend(format_line(cells) for cells in tail_cells)
+        chunk.append(border)
+        if omitted:
+            chunk.append(u"{} rows in set ({} rows omitted)".format(
+                total, omitted))
+        write(u"\n".join(chunk) + u"\n")
+
+    def _partition(self, total):
+        """计算开头和结尾要显示的行数
+        """
+        if self._head is None and self._tail is None:
+            if self._max_rows is None or total <= self._max_rows:
+                return total, 0
+            head_num = (self._max_rows + 1) / 2
+            return head_num, self._max_rows - head_num
+        head_num, tail_num = self._head or 0, self._tail or 0
+        if head_num + tail_num >= total:
+            return total, 0
+        return head_num, tail_num
+
+
+def format_table(table, **options):
+    """将表格渲染为unicode字符串，options与ConsoleTableRenderer的参数一致
+    """
+    chunks = []
+    ConsoleTableRenderer(table, **options).render(chunks.append)
+    return u"".join(chunks)
+
+
+def _text(value):
+    if isinstance(value, unicode):
+        text = value
+    elif isinstance(value, str):
+        text = value.decode("utf-8", "replace")
+    else:
+        text = unicode(value)
+    return _CONTROL_CHARS.sub(u" ", text)
+
+
+def _row_cells(row):
+    return [(value, _text(value)) for value in row]
+
+
+def _measure(titles, rows):
+    """计算每一列的宽度以及对齐方式，数值列右对齐
+    """
+    widths = [_display_width(title) for title in titles]
+    numeric = [True] * len(titles)
+    for cells in rows:
+        for idx, (value, text) in enumerate(cells):
+            width = _display_width(text)
+            if width > widths[idx]:
+                widths[idx] = width
+            if numeric[idx] and value is not None and \
+                    not isinstance(value, _NUMBER_TYPES):
+                numeric[idx] = False
+    return widths, numeric
+
+
+def _line_formatter(widths, aligns):
+    def format_line(cells, line_aligns=aligns):
+        parts = []
+        for cell, width, right in zip(cells, widths, line_aligns):
+            text = cell[1] if isinstance(cell, tuple) else cell
+            text_width = _display_width(text)
+            if text_width > width:
+                text = _truncate(text, width)
+                text_width = _display_width(text)
+            padding = u" " * (width - text_width)
+            parts.append(padding + text if right else text + padding)
+        return u"| " + u" | ".join(parts) + u" |"
+    return format_line
+
+
+def _display_width(text):
+    """终端中的显示宽度，东亚宽字符占两列
+    """
+    if not _NON_ASCII.search(text):
+        return len(text)
+    return sum(2 if unicodedata.east_asian_width(char) in "WF" else 1
+               for char in text)
+
+
+def _truncate(text, width):
+    limit = width - len(_ELLIPSIS)
+    if limit <= 0:
+        return _ELLIPSIS[:width]
+    result, used = [], 0
+    for char in text:
+        char_width = _display_width(char)
+        if used + char_width > limit:
+            break
+        result.append(char)
+        used += char_width
+    return u"".join(result) + _ELLIPSIS
@@ -0,0 +1,200 @@
+# coding: utf-8
+
+"""按照主键比较两个表格的差异
+每一行只保留主键以及由比较列计算出的8字节摘要，两侧各遍历一次即可得到
+新增、删除以及变更的行号：
+
+    inserted, deleted, changed = diff_table(yesterday, today, "id")
+
+数据量很大时，可以将(主键, 摘要, 行号)按照主键的哈希值溢出到磁盘上的若干分区文件中，
+之后逐个分区进行比较，内存中只需要保存一个分区的主键：
+
+    diff_table(yesterday, today, ["shop_id", "sku"], spill=True, partitions=64)
+"""
+
+import os
+import types
+import shutil
+import hashlib
+import operator
+import tempfile
+import cPickle as pickle
+from decimal import Decimal
+from itertools import izip, imap
+from girlfriend.data.table import ListTable, ColumnTable
+from girlfriend.exception import InvalidArgumentException
+
+# 溢出到磁盘时，每个分区缓冲的记录数目
+SPILL_BUFFER_SIZE = 1024
+
+
+def diff_table(old, new, keys, fields=None, spill=False, partitions=16,
+               spill_dir=None):
+    """比较两个表格
+    :param old 旧表格
+    :param new 新表格
+    :param keys 主键列，字符串表示单列，列表或元组表示多列，主键在每个表格中必须唯一
+    :param fields 参与比较的列，默认为新表格中除主键以外的所有列
+    :param spill 是否将主键与摘要溢出到磁盘上分区比较
+    :param partitions 溢出到磁盘时的分区数目
+    :param spill_dir 分区文件所在的目录，默认为系统临时目录
+    :return (新增行在new中的行号, 删除行在old中的行号, 变更行在new中的行号)，均为有序列表
+    """
+    single_key = isinstance(keys, types.StringTypes)
+    key_fields = [keys] if single_key else list(keys)
+    if fields is None:
+        fields = [title.name for title in new.titles
+                  if title.name not in key_fields]
+    old_entries = _entries(old, key_fields, fields, single_key)
+    new_entries = _entries(new, key_fields, fields, single_key)
+
+    if spill:
+        if partitions <= 0:
+            raise InvalidArgumentException(u"分区数目必须为正整数")
+        inserted, deleted, changed = _diff_spilled(
+            old_entries, new_entries, partitions, spill_dir)
+    else:
+        inserted, deleted, changed = _diff(old_entries, new_entries)
+    return sorted(inserted), sorted(deleted), sorted(changed)
+
+
+def _entries(table, key_fields, fields, single_key):
+    """逐行生成(主键, 摘要, 行号)
+    """
+    key_num = len(key_fields)
+    all_fields = key_fields + list(fields)
+    names = set(title.name for title in table.titles)
+    for field in all_fields:
+        if field not in names:
+            raise InvalidArgumentException(
+                u"表格'{}'中不存在列'{}'".format(table.name, field))
+
+    md5 = hashlib.md5
+    for position, values in enumerate(_iter_values(table, all_fields)):
+        key = values[0] if single_key else values[:key_num]
+        digest = md5(repr(tuple(imap(_canonical, values[key_num:]))))
+        yield key, digest.digest()[:8], position
+
+
+def _canonical(value):
+    """统一相等但repr不同的值，避免CSV与数据库等不同来源的相同数据被认为发生了变更：
+       unicode编码为utf-8字符串；数值中整数值统一为int，其余统一为规范化的Decimal，
+       比如5、5L、5.0、Decimal("5.00")都视为5，1.5与Decimal("1.50")都视为Decimal("1.5")
+    """
+    canonical = _CANONICAL_FUNCTIONS.get(type(value))
+    return value if canonical is None else canonical(value)
+
+
+def _canonical_float(value):
+    if value.is_integer():
+        return int(value)
+    if value != value or value in (_INFINITY, -_INFINITY):
+        return value
+    # repr为能够还原该浮点数的最短十进制表示
+    return Decimal(repr(value)).normalize()
+
+
+def _canonical_decimal(value):
+    if not value.is_finite():
+        return value
+    if value == value.to_integral_value():
+        return int(value)
+    return value.normalize()
+
+
+_INFINITY = float("inf")
+
+_CANONICAL_FUNCTIONS = {
+    unicode: lambda value: value.encode("utf-8"),
+    long: int,
+    float: _canonical_float,
+    Decimal: _canonical_decimal,
+}
+
+
+def _iter_values(table, fields):
+    """逐行提取指定列的值元组，ListTable与ColumnTable直接访问底层数据
+    """
+    if isinstance(table, ListTable):
+        getter = operator.itemgetter(
+            *(table._mapping[field] for field in fields))
+        if len(fields) == 1:
+            return ((value,) for value in imap(getter, table._data))
+        return imap(getter, table._data)
+    if isinstance(table, ColumnTable):
+        return izip(*[table.column(field) for field in fields])
+    return (tuple(row[field] for field in fields) for row in table)
+
+
+def _diff(old_entries, new_entries):
+    digests = {}
+    for key, digest, position in old_entries:
+        if key in digests:
+            raise InvalidArgumentException(
+                u"旧表格中存在重复的主键{}".format(repr(key)))
+        digests[key] = (digest, position)
+
+    inserted, changed, seen = [], [], set()
+    for key, digest, position in new_entries:
+        if key in seen:
+            raise InvalidArgumentException(
+                u"新表格中存在重复的主键{}".format(repr(key)))
+        seen.add(key)
+        old_entry = digests.pop(key, None)
+        if old_entry is None:
+            inserted.append(position)
+        elif old_entry[0] != digest:
+            changed.append(position)
+    deleted = [position for _, position in digests.itervalues()]
+    return inserted, deleted, changed
+
+
+def _diff_spilled(old_entries, new_entries, partitions, spill_dir):
+    directory = tempfile.mkdtemp(prefix="gf_diff_", dir=spill_dir)
+    try:
+        old_paths = _spill(old_entries, partitions, directory, "old")
+        new_paths = _spill(new_entries, partitions, directory, "new")
+        inserted, deleted, changed = [], [], []
+        for old_path, new_path in izip(old_paths, new_paths):
+            result = _diff(_load(old_path), _load(new_path))
+            inserted.extend(result[0])
+            deleted.extend(result[1])
+            changed.extend(result[2])
+        return inserted, deleted, changed
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _spill(entries, partitions, directory, prefix):
+    """按照主键的哈希值将记录写入分区文件，返回各分区文件的路径
+    """
+    paths = [os.path.join(directory, "{}_{}".format(prefix, idx))
+             for idx in xrange(partitions)]
+    files = [open(path, "wb") for path in paths]
+    buffers = [[] for _ in xrange(partitions)]
+    try:
+        for entry in entries:
+            idx = hash(entry[0]) % partitions
+            buffer_ = buffers[idx]
+            buffer_.append(entry)
+            if len(buffer_) >= SPILL_BUFFER_SIZE:
+                pickle.dump(buffer_, files[idx], pickle.HIGHEST_PROTOCOL)
+                buffers[idx] = []
+        for buffer_, file_ in izip(buffers, files):
+            if buffer_:
+                pickle.dump(buffer_, file_, pickle.HIGHEST_PROTOCOL)
+    finally:
+        for file_ in files:
+            file_.close()
+    return paths
+
+
+def _load(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                entries = pickle.load(f)
+            except EOFError:
+                return
+            for entry in entries:
+                yield entry
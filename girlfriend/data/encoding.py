@@ -0,0 +1,276 @@
+# coding: utf-8
+
+"""字典编码（分类）列
+对于状态、城市、类别这种取值很少却重复出现在大量行中的字符串列，
+使用整数编码加共享词表的方式存储，可以显著减少内存占用，
+分组、分区、关联、透视等操作也可以直接在整数编码上进行。
+
+字典编码只作用于ColumnTable，读取插件默认仍然返回ListTable等按行存储的表格，
+需要通过TableWrapper(..., table_type=ColumnTable)或者ColumnTableWrapper显式选择，
+此时唯一值比例低于阈值的字符串列会在构建表格时自动编码：
+
+    CSVR("orders.csv", result_wrapper=TableWrapper(
+        "orders", titles, table_type=ColumnTable))
+"""
+
+import types
+from array import array
+from itertools import imap, izip
+from girlfriend.exception import InvalidArgumentException
+
+# 默认的编码阈值，唯一值数目不超过行数的10%时进行编码
+DEFAULT_ENCODE_THRESHOLD = 0.1
+
+# 行数太少时编码没有意义
+MIN_ENCODE_ROWS = 16
+
+CODE_TYPECODE = "i"
+
+
+class Vocabulary(object):
+
+    """词表，维护值与整数编码之间的双向映射，可以被多个列共享
+    """
+
+    def __init__(self, values=None):
+        self._values = []
+        self._codes = {}
+        if values:
+            for value in values:
+                self.encode(value)
+
+    @property
+    def values(self):
+        """按编码顺序排列的值列表
+        """
+        return self._values
+
+    def encode(self, value):
+        """获取值的编码，值不存在时会被加入词表
+        """
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._codes[value] = code
+            self._values.append(value)
+        return code
+
+    def code(self, value, default=None):
+        """获取值的编码，值不存在时返回default
+        """
+        return self._codes.get(value, default)
+
+    def decode(self, code):
+        return self._values[code]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, value):
+        return value in self._codes
+
+
+class DictEncodedColumn(object):
+
+    """字典编码列，以整数数组保存编码，以词表保存真实的值，
+       对外表现为一个普通的序列，下标访问以及迭代都返回解码之后的值
+    """
+
+    def __init__(self, codes=None, vocabulary=None):
+        """
+        :param codes 编码序列，会被转换为整数数组
+        :param vocabulary 词表，不指定时创建新的词表
+        """
+        if isinstance(codes, array):
+            self._codes = codes
+        else:
+            self._codes = array(CODE_TYPECODE, codes or ())
+        self._vocabulary = vocabulary if vocabulary is not None \
+            else Vocabulary()
+
+    @classmethod
+    def encode(cls, values, vocabulary=None):
+        """对值序列进行编码
+        """
+        if vocabulary is None:
+            vocabulary = Vocabulary()
+        encode = vocabulary.encode
+        return cls(array(CODE_TYPECODE, imap(encode, values)), vocabulary)
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def vocabulary(self):
+        return self._vocabulary
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, index):
+        values = self._vocabulary.values
+        if isinstance(index, slice):
+            return [values[code] for code in self._codes[index]]
+        return values[self._codes[index]]
+
+    def __iter__(self):
+        return imap(self._vocabulary.values.__getitem__, self._codes)
+
+    def append(self, value):
+        self._codes.append(self._vocabulary.encode(value))
+
+    def take(self, positions):
+        """按照位置提取子列，新列与原列共享词表
+        """
+        codes = self._codes
+        return DictEncodedColumn(
+            array(CODE_TYPECODE, (codes[p] for p in positions)),
+            self._vocabulary)
+
+    def copy(self):
+        """复制编码数组，新列与原列共享词表
+        """
+        return DictEncodedColumn(array(CODE_TYPECODE, self._codes),
+                                 self._vocabulary)
+
+    def decode(self):
+        """解码为普通列表
+        """
+        return list(self)
+
+    def __repr__(self):
+        return "<DictEncodedColumn size={} cardinality={}>".format(
+            len(self._codes), len(self._vocabulary))
+
+
+class KeyCodec(object):
+
+    """在列值组成的键与编码组成的键之间转换，字典编码列使用整数编码，其它列保持原值，
+       分组以及分区时可以直接对整数编码进行哈希，最后再还原为列值
+    """
+
+    def __init__(self, vocabularies, composite):
+        """
+        :param vocabularies 与各个键列一一对应的词表，没有编码的列为None
+        :param composite 是否为多列组成的元组键
+        """
+        self._vocabularies = vocabularies
+        self._composite = composite
+
+    def encode(self, key):
+        """将列值组成的键转换为编码键，词表中不存在的值返回None
+        """
+        if not self._composite:
+            return self._vocabularies[0].code(key)
+        if not isinstance(key, tuple) or \
+                len(key) != len(self._vocabularies):
+            return None
+        codes = []
+        for vocabulary, value in izip(self._vocabularies, key):
+            if vocabulary is not None:
+                value = vocabulary.code(value)
+                if value is None:
+                    return None
+            codes.append(value)
+        return tuple(codes)
+
+    def decode(self, key):
+        """将编码键还原为列值组成的键
+        """
+        if not self._composite:
+            return self._vocabularies[0].decode(key)
+        return tuple(value if vocabulary is None else vocabulary.decode(value)
+                     for vocabulary, value in izip(self._vocabularies, key))
+
+
+def copy_column(column):
+    """复制列数据，使新表格追加行时不会影响原表格
+    """
+    if isinstance(column, DictEncodedColumn):
+        return column.copy()
+    return column[:]
+
+
+def encode_column(values, threshold=DEFAULT_ENCODE_THRESHOLD):
+    """如果列中只包含字符串（以及None）且唯一值的比例不超过阈值，
+       那么返回编码之后的列，否则返回None
+       :param values 列数据
+       :param threshold 唯一值数目与行数的最大比例
+    """
+    if isinstance(values, DictEncodedColumn):
+        return values
+    if isinstance(values, array):
+        # 数值数组不需要编码，也避免为大数组构建唯一值集合
+        return None
+    if threshold is None or len(values) < MIN_ENCODE_ROWS:
+        return None
+    try:
+        distinct = set(values)
+    except TypeError:
+        # 不可哈希
+        return None
+    if len(distinct) > len(values) * threshold:
+        return None
+    if not all(value is None or isinstance(value, types.StringTypes)
+               for value in distinct):
+        return None
+    vocabulary = Vocabulary()
+    codes = vocabulary._codes
+    # 按照首次出现的顺序编码，保证编码顺序稳定
+    for value in values:
+        if value not in codes:
+            vocabulary.encode(value)
+            if len(codes) == len(distinct):
+                break
+    return DictEncodedColumn(
+        array(CODE_TYPECODE, imap(codes.__getitem__, values)), vocabulary)
+
+
+def factorize(values):
+    """将值序列分解为整数编码序列以及按首次出现顺序排列的唯一值列表，
+       字典编码列直接基于整数编码进行分解，不需要对原始值进行哈希
+    """
+    if isinstance(values, DictEncodedColumn):
+        codes, uniques = _factorize(values.codes)
+        vocabulary_values = values.vocabulary.values
+        return codes, [vocabulary_values[code] for code in uniques]
+    return _factorize(values)
+
+
+def factorize_columns(columns, length=None):
+    """对多个列组成的组合键进行分解，唯一值为元组
+       :param columns 列序列
+       :param length 行数，仅在columns为空时使用
+    """
+    if not columns:
+        return [0] * (length or 0), [()] if length else []
+    if len(columns) == 1:
+        codes, uniques = factorize(columns[0])
+        return codes, [(value,) for value in uniques]
+
+    # 先对每一列单独分解，再对整数编码组成的元组进行分解
+    factorized = [factorize(column) for column in columns]
+    codes, unique_code_tuples = _factorize(
+        izip(*[column_codes for column_codes, _ in factorized]))
+    column_uniques = [values for _, values in factorized]
+    uniques = [
+        tuple(column_uniques[idx][code] for idx, code in enumerate(codes_))
+        for codes_ in unique_code_tuples]
+    return codes, uniques
+
+
+def _factorize(values):
+    code_mapping = {}
+    codes = [code_mapping.setdefault(value, len(code_mapping))
+             for value in values]
+    uniques = [None] * len(code_mapping)
+    for value, code in code_mapping.iteritems():
+        uniques[code] = value
+    return codes, uniques
+
+
+def check_threshold(threshold):
+    if threshold is not None and not 0 < threshold <= 1:
+        raise InvalidArgumentException(u"编码阈值必须在(0, 1]之间")
+    return threshold
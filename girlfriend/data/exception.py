@@ -22,3 +22,21 @@ class InvalidSizeException(GirlFriendSysException):
     """当目标集合的尺寸不符合要求时抛出此异常
     """
     pass
+
+
+class DuplicateKeyException(GirlFriendSysException):
+    """在要求key唯一的结构中出现重复的key时抛出此异常
+    """
+    pass
+
+
+class InvalidTableFileException(GirlFriendSysException):
+    """表格文件格式不正确或者已经损坏时抛出此异常
+    """
+    pass
+
+
+class ConvertException(GirlFriendSysException):
+    """列值无法转换为所声明的类型时抛出此异常
+    """
+    pass
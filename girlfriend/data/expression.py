@@ -0,0 +1,388 @@
+# coding: utf-8
+
+"""表格表达式编译器
+支持Python表达式的一个安全子集，用于描述过滤条件和派生列，例如：
+
+    age > 30 and grade in (1, 2)
+    total = price * qty
+
+表达式只解析一次，列名会根据表格的结构解析为下标、字典键或者属性访问，
+并编译为直接作用于底层行数据的函数，求值时不再经过行对象的__getattr__。
+"""
+
+import re
+import ast
+import copy
+import types
+from itertools import izip
+from girlfriend.data.table import (
+    BaseLocalTable,
+    ListTable,
+    ObjectTable
+)
+from girlfriend.exception import InvalidArgumentException
+
+# 表达式中允许调用的函数
+FUNCTIONS = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "len": len,
+    "round": round,
+    "int": int,
+    "float": float,
+    "str": str,
+    "unicode": unicode,
+    "bool": bool,
+}
+
+CONSTANTS = {
+    "None": None,
+    "True": True,
+    "False": False,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.BinOp, ast.Add,
+    ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UnaryOp, ast.Not, ast.USub, ast.UAdd, ast.Compare, ast.Eq,
+    ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.Is, ast.IsNot, ast.Name, ast.Num, ast.Str, ast.Tuple, ast.List,
+    ast.Load, ast.IfExp, ast.Call,
+)
+
+_ASSIGNMENT_REGEX = re.compile(r"^\s*([A-Za-z_]\w*)\s*=(?!=)(.*)$", re.S)
+
+_ROW_VAR = "__row__"
+
+_COMPARISON_OPERATORS = {
+    ast.Eq: "==",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.In: "in",
+}
+
+_REVERSED_OPERATORS = {
+    ast.Eq: ast.Eq,
+    ast.Lt: ast.Gt,
+    ast.LtE: ast.GtE,
+    ast.Gt: ast.Lt,
+    ast.GtE: ast.LtE,
+}
+
+
+class Expression(object):
+
+    """编译后的表达式
+    """
+
+    def __init__(self, source):
+        """
+        :param source 表达式文本，可以是"a + b"这样的纯表达式，
+                      也可以是"c = a + b"这样的赋值形式，赋值目标通过target属性获取
+        """
+        self._source = source
+        self._target = None
+        match = _ASSIGNMENT_REGEX.match(source)
+        if match:
+            self._target, source = match.group(1), match.group(2)
+        try:
+            self._tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise InvalidArgumentException(
+                u"表达式'{}'存在语法错误：{}".format(self._source, e.msg))
+        self._fields = []
+        self._constants = {}
+        self._validate(self._tree)
+        self._compiled = {}
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def target(self):
+        """赋值形式中等号左边的列名，纯表达式为None
+        """
+        return self._target
+
+    @property
+    def fields(self):
+        """表达式所引用的列名，按照首次出现的顺序排列
+        """
+        return tuple(self._fields)
+
+    def _validate(self, tree):
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise InvalidArgumentException(
+                    u"表达式'{}'中包含不支持的语法：{}".format(
+                        self._source, type(node).__name__))
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or \
+                        node.func.id not in FUNCTIONS or \
+                        node.keywords or node.starargs or node.kwargs:
+                    raise InvalidArgumentException(
+                        u"表达式'{}'中只能以位置参数调用内置函数：{}".format(
+                            self._source, ", ".join(sorted(FUNCTIONS))))
+            elif isinstance(node, ast.Name):
+                if node.id not in FUNCTIONS and node.id not in CONSTANTS \
+                        and node.id not in self._fields:
+                    self._fields.append(node.id)
+
+    def simple_comparison(self):
+        """如果表达式形如"列 运算符 常量"，返回(列名, 运算符, 常量)，否则返回None，
+           运算符为==、<、<=、>、>=、in之一，可用于判断能否借助索引进行查找
+        """
+        node = self._tree.body
+        if self._target is not None or not isinstance(node, ast.Compare) \
+                or len(node.ops) != 1:
+            return None
+        left, op, right = node.left, node.ops[0], node.comparators[0]
+        if not self._is_field(left):
+            if not self._is_field(right) or \
+                    type(op) not in _REVERSED_OPERATORS:
+                return None
+            left, right = right, left
+            op = _REVERSED_OPERATORS[type(op)]()
+        operator_name = _COMPARISON_OPERATORS.get(type(op))
+        if operator_name is None:
+            return None
+        try:
+            value = ast.literal_eval(right)
+        except ValueError:
+            return None
+        if operator_name == "in":
+            if not isinstance(value, (tuple, list)):
+                return None
+            value = frozenset(value)
+        return left.id, operator_name, value
+
+    def _is_field(self, node):
+        return isinstance(node, ast.Name) and node.id in self._fields
+
+    def for_table(self, table):
+        """返回作用于表格底层行数据的求值函数，
+           本地表格接受_data中的原始行对象，其它表格接受行对象
+        """
+        names = set(title.name for title in table.titles)
+        missing = [field for field in self._fields if field not in names]
+        if missing:
+            raise InvalidArgumentException(
+                u"表格'{}'中不存在列：{}".format(
+                    table.name, ", ".join(missing)))
+        if isinstance(table, ListTable):
+            mapping = table._mapping
+            key = ("index", tuple(mapping[f] for f in self._fields))
+            accessor = _IndexAccessor(mapping)
+        elif isinstance(table, ObjectTable):
+            key, accessor = ("attr",), _AttrAccessor()
+        else:
+            # DictTable以及其它表格的行对象都支持按列名取值
+            key, accessor = ("key",), _KeyAccessor()
+        function = self._compiled.get(key)
+        if function is None:
+            function = self._compile_row_function(accessor)
+            self._compiled[key] = function
+        return function
+
+    def evaluate(self, table):
+        """对表格的每一行求值，返回结果列表
+        """
+        function = self.for_table(table)
+        rows = table._data if isinstance(table, BaseLocalTable) else table
+        return map(function, rows)
+
+    def mask(self, table):
+        """对表格的每一行求值，返回布尔列表
+        """
+        function = self.for_table(table)
+        rows = table._data if isinstance(table, BaseLocalTable) else table
+        return [bool(function(row)) for row in rows]
+
+    def evaluate_columns(self, columns, length=None):
+        """以列为单位进行求值
+        :param columns 列名到列数据序列的映射，需要包含表达式引用的所有列
+        :param length 结果长度，仅在表达式不引用任何列时使用
+        """
+        function = self._compiled.get(("columns",))
+        if function is None:
+            function = self._compile_column_function()
+            self._compiled[("columns",)] = function
+        if not self._fields:
+            return function(length or 0)
+        try:
+            return function(*(columns[field] for field in self._fields))
+        except KeyError as e:
+            raise InvalidArgumentException(
+                u"缺少表达式'{}'所需的列：{}".format(self._source, e.args[0]))
+
+    def _compile_row_function(self, accessor):
+        body = _Rewriter(self, accessor).visit(copy.deepcopy(self._tree.body))
+        lambda_node = ast.Lambda(
+            args=ast.arguments(
+                args=[ast.Name(id=_ROW_VAR, ctx=ast.Param())],
+                vararg=None, kwarg=None, defaults=[]),
+            body=body)
+        return self._eval(lambda_node, {})
+
+    def _compile_column_function(self):
+        """生成形如lambda c0, c1: [expr for v0, v1 in izip(c0, c1)]的函数
+        """
+        variables = ["__v%d__" % idx for idx in xrange(len(self._fields))]
+        names = dict(zip(self._fields, variables))
+        body = _Rewriter(self, _LocalAccessor(names)).visit(
+            copy.deepcopy(self._tree.body))
+        if self._fields:
+            column_args = ["__c%d__" % idx
+                           for idx in xrange(len(self._fields))]
+            if len(variables) == 1:
+                target = ast.Name(id=variables[0], ctx=ast.Store())
+                iterable = ast.Name(id=column_args[0], ctx=ast.Load())
+            else:
+                target = ast.Tuple(
+                    elts=[ast.Name(id=v, ctx=ast.Store()) for v in variables],
+                    ctx=ast.Store())
+                iterable = ast.Call(
+                    func=ast.Name(id="__izip__", ctx=ast.Load()),
+                    args=[ast.Name(id=c, ctx=ast.Load())
+                          for c in column_args],
+                    keywords=[], starargs=None, kwargs=None)
+        else:
+            column_args = ["__length__"]
+            target = ast.Name(id="__", ctx=ast.Store())
+            iterable = ast.Call(
+                func=ast.Name(id="xrange", ctx=ast.Load()),
+                args=[ast.Name(id="__length__", ctx=ast.Load())],
+                keywords=[], starargs=None, kwargs=None)
+        comprehension = ast.ListComp(
+            elt=body,
+            generators=[ast.comprehension(target=target, iter=iterable,
+                                          ifs=[])])
+        lambda_node = ast.Lambda(
+            args=ast.arguments(
+                args=[ast.Name(id=c, ctx=ast.Param()) for c in column_args],
+                vararg=None, kwarg=None, defaults=[]),
+            body=comprehension)
+        return self._eval(lambda_node, {"__izip__": izip, "xrange": xrange})
+
+    def _eval(self, lambda_node, extra_globals):
+        tree = ast.fix_missing_locations(ast.Expression(body=lambda_node))
+        code = compile(tree, "<expression: {}>".format(
+            self._source.encode("utf-8")
+            if isinstance(self._source, unicode) else self._source), "eval")
+        env = {"__builtins__": {}}
+        env.update(FUNCTIONS)
+        env.update(CONSTANTS)
+        env.update(self._constants)
+        env.update(extra_globals)
+        return eval(code, env)
+
+    def __repr__(self):
+        return "<Expression {}>".format(repr(self._source))
+
+
+def compile_expression(source):
+    """编译表达式，已经编译过的Expression对象会被直接返回
+    """
+    if isinstance(source, Expression):
+        return source
+    if not isinstance(source, types.StringTypes):
+        raise InvalidArgumentException(u"表达式必须是字符串")
+    return Expression(source)
+
+
+class _IndexAccessor(object):
+
+    """基于列下标访问list/tuple形式的行
+    """
+
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+    def node(self, field):
+        return ast.Subscript(
+            value=ast.Name(id=_ROW_VAR, ctx=ast.Load()),
+            slice=ast.Index(value=ast.Num(n=self._mapping[field])),
+            ctx=ast.Load())
+
+
+class _KeyAccessor(object):
+
+    """基于列名访问字典形式的行或者行对象
+    """
+
+    def node(self, field):
+        return ast.Subscript(
+            value=ast.Name(id=_ROW_VAR, ctx=ast.Load()),
+            slice=ast.Index(value=ast.Str(s=field)),
+            ctx=ast.Load())
+
+
+class _AttrAccessor(object):
+
+    """基于属性访问对象形式的行
+    """
+
+    def node(self, field):
+        return ast.Attribute(
+            value=ast.Name(id=_ROW_VAR, ctx=ast.Load()),
+            attr=field, ctx=ast.Load())
+
+
+class _LocalAccessor(object):
+
+    """将列名替换为局部变量
+    """
+
+    def __init__(self, names):
+        self._names = names
+
+    def node(self, field):
+        return ast.Name(id=self._names[field], ctx=ast.Load())
+
+
+class _Rewriter(ast.NodeTransformer):
+
+    """将列名替换为具体的取值方式，并将in/not in右侧的常量集合替换为frozenset
+    """
+
+    def __init__(self, expression, accessor):
+        self._expression = expression
+        self._accessor = accessor
+
+    def visit_Name(self, node):
+        if node.id in FUNCTIONS or node.id in CONSTANTS:
+            return node
+        return ast.copy_location(self._accessor.node(node.id), node)
+
+    def visit_Call(self, node):
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_Compare(self, node):
+        node.left = self.visit(node.left)
+        comparators = []
+        for op, comparator in zip(node.ops, node.comparators):
+            constant = _literal_collection(comparator)
+            if isinstance(op, (ast.In, ast.NotIn)) and constant is not None:
+                name = "__const%d__" % len(self._expression._constants)
+                self._expression._constants[name] = constant
+                comparators.append(ast.Name(id=name, ctx=ast.Load()))
+            else:
+                comparators.append(self.visit(comparator))
+        node.comparators = comparators
+        return node
+
+
+def _literal_collection(node):
+    """如果节点是由常量组成的元组或列表，那么返回对应的frozenset
+    """
+    if not isinstance(node, (ast.Tuple, ast.List)):
+        return None
+    try:
+        return frozenset(ast.literal_eval(node))
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,221 @@
+# coding: utf-8
+
+"""Table的二级索引，用于对同一张表进行多次按键查找，
+支持普通哈希索引、唯一哈希索引以及可进行范围查询的有序索引。
+
+索引通常不需要手工创建，通过BaseLocalTable.index方法获取即可，
+该方法会在首次使用时构建索引并缓存在表格对象上，表格添加新行后缓存自动失效：
+
+    id_index = table.index("id", kind="unique")
+    row = id_index.row(1)
+
+    grade_index = table.index(("grade", "class"))
+    rows = grade_index.rows((1, 2))
+
+    age_index = table.index("age", kind="sorted")
+    rows = age_index.range_rows(18, 30)
+"""
+
+from bisect import bisect_left, bisect_right
+from abc import ABCMeta, abstractmethod
+from girlfriend.data.exception import DuplicateKeyException
+from girlfriend.exception import InvalidArgumentException
+
+
+class AbstractIndex(object):
+
+    """索引抽象，以行号的形式保存键与行的对应关系
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(self, table, fields, keys=None):
+        """
+        :param table 要建立索引的表格
+        :param fields 索引列，字符串表示单列索引，键为列值；
+                      列表或元组表示组合索引，键为列值组成的元组
+        :param keys 预先计算好的每一行的键，例如字典编码列的整数编码，
+                    不指定时从表格中提取
+        """
+        self._table = table
+        self._fields = fields
+        if keys is None:
+            keys = _index_keys(table, fields)
+        self._build(keys)
+
+    @property
+    def fields(self):
+        return self._fields
+
+    @abstractmethod
+    def _build(self, keys):
+        """根据每行的键构建索引
+        """
+        pass
+
+    @abstractmethod
+    def positions(self, key):
+        """返回键所对应的行号列表
+        """
+        pass
+
+    def rows(self, key):
+        """返回键所对应的行对象列表
+        """
+        table = self._table
+        return [table[position] for position in self.positions(key)]
+
+    def __contains__(self, key):
+        return bool(self.positions(key))
+
+
+class HashIndex(AbstractIndex):
+
+    """非唯一哈希索引，每个键对应若干行
+    """
+
+    def __init__(self, table, fields, keys=None, codec=None):
+        """
+        :param codec 键为字典编码时用于转换键的KeyCodec，查找时先将列值转换为编码，
+                     遍历分组时再还原为列值
+        """
+        self._codec = codec
+        AbstractIndex.__init__(self, table, fields, keys)
+
+    def _build(self, keys):
+        buckets = {}
+        for position, key in enumerate(keys):
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [position]
+            else:
+                bucket.append(position)
+        self._buckets = buckets
+
+    def positions(self, key):
+        if self._codec is not None:
+            key = self._codec.encode(key)
+        return self._buckets.get(key, ())
+
+    def groups(self):
+        """以(键, 行号列表)的形式遍历所有分组
+        """
+        if self._codec is None:
+            return self._buckets.iteritems()
+        decode = self._codec.decode
+        return ((decode(key), positions)
+                for key, positions in self._buckets.iteritems())
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class UniqueHashIndex(AbstractIndex):
+
+    """唯一哈希索引，每个键只对应一行，出现重复的键时会抛出DuplicateKeyException
+    """
+
+    def _build(self, keys):
+        mapping = {}
+        for position, key in enumerate(keys):
+            if mapping.setdefault(key, position) != position:
+                raise DuplicateKeyException(
+                    u"唯一索引{0}中出现了重复的键{1}".format(
+                        self._fields, repr(key)))
+        self._mapping = mapping
+
+    def position(self, key, default=None):
+        return self._mapping.get(key, default)
+
+    def positions(self, key):
+        position = self._mapping.get(key)
+        if position is None:
+            return ()
+        return (position,)
+
+    def row(self, key, default=None):
+        """返回键所对应的行对象，不存在时返回default
+        """
+        position = self._mapping.get(key)
+        if position is None:
+            return default
+        return self._table[position]
+
+    def __len__(self):
+        return len(self._mapping)
+
+
+class SortedIndex(AbstractIndex):
+
+    """有序索引，除了等值查找之外还支持范围查询，结果按照键的顺序排列
+    """
+
+    def _build(self, keys):
+        order = sorted(xrange(len(keys)), key=keys.__getitem__)
+        self._keys = [keys[position] for position in order]
+        self._order = order
+
+    def positions(self, key):
+        begin = bisect_left(self._keys, key)
+        end = bisect_right(self._keys, key, begin)
+        return self._order[begin:end]
+
+    def range(self, low=None, high=None,
+              include_low=True, include_high=False):
+        """范围查询，返回行号列表
+        :param low 下界，为None时表示没有下界
+        :param high 上界，为None时表示没有上界
+        :param include_low 是否包含下界
+        :param include_high 是否包含上界
+        """
+        keys = self._keys
+        if low is None:
+            begin = 0
+        elif include_low:
+            begin = bisect_left(keys, low)
+        else:
+            begin = bisect_right(keys, low)
+        if high is None:
+            end = len(keys)
+        elif include_high:
+            end = bisect_right(keys, high)
+        else:
+            end = bisect_left(keys, high)
+        return self._order[begin:end]
+
+    def range_rows(self, low=None, high=None,
+                   include_low=True, include_high=False):
+        """范围查询，返回行对象列表
+        """
+        table = self._table
+        return [table[position] for position in
+                self.range(low, high, include_low, include_high)]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+INDEX_TYPES = {
+    "hash": HashIndex,
+    "unique": UniqueHashIndex,
+    "sorted": SortedIndex,
+}
+
+
+def index_type(kind):
+    """根据名称获取索引类型
+    """
+    clazz = INDEX_TYPES.get(kind)
+    if clazz is None:
+        raise InvalidArgumentException(
+            u"不支持的索引类型'{}'，只支持hash、unique、sorted".format(kind))
+    return clazz
+
+
+def _index_keys(table, fields):
+    """提取每一行的索引键，优先使用表格自身提供的批量提取方法
+    """
+    extract_keys = getattr(table, "_keys", None)
+    if extract_keys is not None:
+        return extract_keys(fields)
+    return [row[fields] for row in table]
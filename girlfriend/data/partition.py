@@ -0,0 +1,193 @@
+# coding: utf-8
+
+"""表格分区器
+分区器根据每一行的键将行号分配到不同的分区中，只需要对键进行一次遍历，
+分区结果以{分区键: 行号列表}的形式返回：
+
+    HashPartitioner("user_id", 8)          按照键的哈希值分为8个分区，分区键为0~7
+    ValuePartitioner("region")             每个不同的值一个分区，分区键为列值
+    RangePartitioner("age", [18, 30, 60])  按照边界分区，分区键为0~3，分区i包含
+                                           边界i - 1 <= age < 边界i的行
+
+对于较大的表格，可以将键切分成若干连续的块并行分区，之后再按块的顺序合并各个分区：
+
+    partition_table(table, HashPartitioner("user_id", 8), parallel=4,
+                    pool_type=ProcessPoolExecutor)
+
+内置的分区器都是纯Python实现，受GIL限制，线程池无法带来加速，只有分区器释放GIL时才有意义；
+进程池在gevent进行monkey patch之后可能死锁，此时会自动退化为在当前线程中分区。
+"""
+
+import sys
+import types
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from girlfriend.data.index import _index_keys
+from girlfriend.exception import InvalidArgumentException
+
+
+class AbstractPartitioner(object):
+
+    """分区器抽象
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(self, fields):
+        """
+        :param fields 分区列，字符串表示单列，键为列值；列表或元组表示多列，键为元组
+        """
+        if isinstance(fields, types.ListType):
+            fields = tuple(fields)
+        self._fields = fields
+
+    @property
+    def fields(self):
+        return self._fields
+
+    @abstractmethod
+    def partition(self, keys):
+        """对键序列进行分区
+        :return {分区键: 行号列表}
+        """
+        pass
+
+
+class HashPartitioner(AbstractPartitioner):
+
+    """哈希分区，按照键的哈希值将行分配到固定数目的分区中
+    """
+
+    def __init__(self, fields, num):
+        AbstractPartitioner.__init__(self, fields)
+        if num <= 0:
+            raise InvalidArgumentException(u"分区数目必须为正整数")
+        self._num = num
+
+    def partition(self, keys):
+        num = self._num
+        buckets = [[] for _ in xrange(num)]
+        appends = [bucket.append for bucket in buckets]
+        for position, key in enumerate(keys):
+            appends[hash(key) % num](position)
+        return dict(enumerate(buckets))
+
+
+class ValuePartitioner(AbstractPartitioner):
+
+    """值分区，键相同的行分配到同一个分区
+    """
+
+    def partition(self, keys):
+        buckets = {}
+        for position, key in enumerate(keys):
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [position]
+            else:
+                bucket.append(position)
+        return buckets
+
+
+class RangePartitioner(AbstractPartitioner):
+
+    """范围分区，根据有序的边界列表将行分配到len(boundaries) + 1个分区中
+    """
+
+    def __init__(self, fields, boundaries):
+        AbstractPartitioner.__init__(self, fields)
+        boundaries = list(boundaries)
+        if boundaries != sorted(boundaries):
+            raise InvalidArgumentException(u"分区边界必须是有序的")
+        self._boundaries = boundaries
+
+    def partition(self, keys):
+        boundaries = self._boundaries
+        buckets = [[] for _ in xrange(len(boundaries) + 1)]
+        appends = [bucket.append for bucket in buckets]
+        for position, key in enumerate(keys):
+            appends[bisect_right(boundaries, key)](position)
+        return dict(enumerate(buckets))
+
+
+def partition_table(table, partitioner, parallel=None,
+                    pool_type=ThreadPoolExecutor):
+    """对表格进行分区
+    :param table 要分区的表格
+    :param partitioner 分区器
+    :param parallel 并行的块数，为None或者1时在当前线程中分区
+    :param pool_type 并行分区时使用的执行器类型，由于GIL的存在，
+                     CPU密集的分区需要使用ProcessPoolExecutor才能真正并行，
+                     此时分区器与键都需要能够被pickle
+    :return {分区键: 行号列表}，行号按照原表格中的顺序排列
+    """
+    encoded_keys = getattr(table, "_encoded_keys", None)
+    if encoded_keys is not None:
+        keys, codec = encoded_keys(partitioner.fields)
+        if codec is not None:
+            return _partition_encoded(partitioner, keys, codec)
+    else:
+        keys = _index_keys(table, partitioner.fields)
+    if not parallel or parallel <= 1 or len(keys) < parallel or \
+            _gevent_patched():
+        return partitioner.partition(keys)
+
+    chunk_size = (len(keys) + parallel - 1) / parallel
+    offsets = range(0, len(keys), chunk_size)
+    with pool_type(max_workers=parallel) as executor:
+        futures = [
+            executor.submit(_partition, partitioner,
+                            keys[offset:offset + chunk_size])
+            for offset in offsets]
+        chunk_results = [future.result() for future in futures]
+
+    # 按照块的顺序合并，保证每个分区中的行号有序
+    result = {}
+    for offset, chunk_result in zip(offsets, chunk_results):
+        for bucket_key, positions in chunk_result.iteritems():
+            bucket = result.get(bucket_key)
+            if bucket is None:
+                bucket = result[bucket_key] = []
+            if offset:
+                bucket.extend(position + offset for position in positions)
+            else:
+                bucket.extend(positions)
+    return result
+
+
+def _partition_encoded(partitioner, keys, codec):
+    """字典编码的键先对去重之后的编码键分区，再按编码将行分配到各个分区，
+       逐行只需要对整数编码进行哈希，分区结果与直接对列值分区一致
+    """
+    unique_keys = list(set(keys))
+    unique_buckets = partitioner.partition(
+        [codec.decode(key) for key in unique_keys])
+    # 哈希分区、范围分区即使没有行也会包含所有分区
+    result = partitioner.partition([])
+    appends = {}
+    for bucket_key, indexes in unique_buckets.iteritems():
+        if not indexes:
+            continue
+        append = result.setdefault(bucket_key, []).append
+        for idx in indexes:
+            appends[unique_keys[idx]] = append
+    for position, key in enumerate(keys):
+        appends[key](position)
+    return result
+
+
+def _partition(partitioner, keys):
+    # 绑定方法无法被pickle，提交给进程池时需要使用模块级函数
+    return partitioner.partition(keys)
+
+
+def _gevent_patched():
+    """gevent替换了线程模块之后，执行器的内部线程会变成协程，进程池可能因此死锁，
+       只检查已经加载的模块，不会因此引入gevent
+    """
+    monkey = sys.modules.get("gevent.monkey")
+    if monkey is None:
+        return False
+    return monkey.is_module_patched("thread") or \
+        monkey.is_module_patched("threading")
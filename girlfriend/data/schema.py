@@ -0,0 +1,301 @@
+# coding: utf-8
+
+"""表格列的类型定义以及类型转换
+Title可以声明列的类型以及是否允许为空，每一列只编译一次转换函数，
+在读取数据之后按列批量执行转换，不需要在每个record_handler中手工进行类型转换：
+
+    titles = (
+        Title("id", u"编号", type="int", nullable=False),
+        Title("amount", u"金额", type="decimal"),
+        Title("created", u"创建时间", type="datetime",
+              format="%Y/%m/%d %H:%M"),
+    )
+    CSVR("orders.csv", result_wrapper=TableWrapper("orders", titles))
+"""
+
+import types
+from array import array
+from decimal import Decimal
+from datetime import date, datetime
+from itertools import izip
+from girlfriend.data.exception import ConvertException, InvalidSizeException
+from girlfriend.exception import InvalidArgumentException
+from girlfriend.util.lang import SequenceCollectionType
+
+# 支持的列类型
+COLUMN_TYPES = ("int", "float", "decimal", "date", "datetime", "bool", "str")
+
+# 日期类型的默认格式
+DEFAULT_FORMATS = {
+    "date": "%Y-%m-%d",
+    "datetime": "%Y-%m-%d %H:%M:%S",
+}
+
+# 不允许为空的数值列可以使用紧凑的数组存储
+ARRAY_TYPECODES = {
+    "int": "l",
+    "float": "d",
+}
+
+_TRUE_VALUES = frozenset(("1", "true", "t", "yes", "y", "on"))
+_FALSE_VALUES = frozenset(("0", "false", "f", "no", "n", "off"))
+
+
+def check_column_type(column_type):
+    if column_type is not None and column_type not in COLUMN_TYPES:
+        raise InvalidArgumentException(
+            u"不支持的列类型'{}'，只支持{}".format(
+                column_type, u"、".join(COLUMN_TYPES)))
+    return column_type
+
+
+def compile_converter(title):
+    """根据Title的类型声明编译转换函数，没有声明类型时返回None
+    """
+    column_type = title.type
+    if column_type is None:
+        return None
+    convert = _CONVERTER_FACTORIES[column_type](
+        title.format or DEFAULT_FORMATS.get(column_type))
+    name, nullable = title.name, title.nullable
+    # 对于字符串列，空字符串是合法的值
+    allow_empty_string = column_type == "str"
+
+    def converter(value):
+        if value is None or (value == "" and not allow_empty_string):
+            if nullable:
+                return None
+            raise ConvertException(u"列'{}'不允许为空".format(name))
+        try:
+            return convert(value)
+        except (ValueError, TypeError, ArithmeticError):
+            raise ConvertException(
+                u"列'{}'的值{}无法转换为{}类型".format(
+                    name, repr(value), column_type))
+
+    return converter
+
+
+def convert_records(titles, records):
+    """按照Title中声明的类型，以列为单位批量转换记录，
+       记录可以是与titles一一对应的列表或元组，也可以是以列名为键的字典或者
+       ORM实体这类按属性访问的对象，序列记录会被转换为元组，字典与对象记录会被原地修改
+    """
+    converters = [(idx, title.name, title.converter)
+                  for idx, title in enumerate(titles)
+                  if title.converter is not None]
+    if not converters or not records or \
+            not isinstance(records, SequenceCollectionType):
+        return records
+
+    first = records[0]
+    if isinstance(first, types.DictType):
+        for _, name, converter in converters:
+            values = map(converter, [record.get(name) for record in records])
+            for record, value in izip(records, values):
+                record[name] = value
+        return records
+    if isinstance(first, SequenceCollectionType):
+        width = len(titles)
+        for position, record in enumerate(records):
+            if len(record) != width:
+                raise InvalidSizeException(
+                    u"第{0}行的列数为{1}，标题数为{2}，两者不一致".format(
+                        position, len(record), width))
+        columns = zip(*records)
+        for idx, _, converter in converters:
+            columns[idx] = map(converter, columns[idx])
+        return zip(*columns)
+    return _convert_objects(converters, records)
+
+
+def _convert_objects(converters, records):
+    """按属性转换对象记录，无法读取或者设置属性时抛出ConvertException，
+       不会在声明了类型的情况下原样返回未转换的记录
+    """
+    for _, name, converter in converters:
+        try:
+            values = map(converter,
+                         [getattr(record, name) for record in records])
+            for record, value in izip(records, values):
+                setattr(record, name, value)
+        except AttributeError:
+            raise ConvertException(
+                u"类型为{}的记录无法按列'{}'进行转换".format(
+                    type(records[0]).__name__, name))
+    return records
+
+
+def compact_column(title, column):
+    """为不允许为空的数值列选择紧凑的数组存储，无法转换时返回None
+    """
+    typecode = ARRAY_TYPECODES.get(title.type)
+    if typecode is None or title.nullable or isinstance(column, array):
+        return None
+    try:
+        return array(typecode, column)
+    except (TypeError, OverflowError):
+        return None
+
+
+class ColumnBuilder(object):
+
+    """按批追加值的列构建器，整数列与浮点数列直接写入array，不保留每个值的对象，
+       遇到None或者其它类型的值时退化为列表存储
+    """
+
+    def __init__(self, title=None):
+        """
+        :param title 列标题，声明了类型时先按批转换，不允许为空的数值列固定使用数组
+        """
+        self._converter = None if title is None else title.converter
+        self._typecode = None
+        self._values = None
+        if title is not None and not title.nullable:
+            self._typecode = ARRAY_TYPECODES.get(title.type)
+            if self._typecode is not None:
+                self._values = array(self._typecode)
+
+    def extend(self, values):
+        if not values:
+            return
+        if self._converter is not None:
+            values = map(self._converter, values)
+        if self._values is None:
+            # 根据第一批值选择存储方式
+            self._typecode = _array_typecode(values)
+            self._values = [] if self._typecode is None \
+                else array(self._typecode)
+        if self._typecode is not None:
+            if _array_typecode(values) == self._typecode:
+                self._values.extend(values)
+                return
+            self._values, self._typecode = self._values.tolist(), None
+        self._values.extend(values)
+
+    def build(self):
+        return [] if self._values is None else self._values
+
+
+_ARRAY_VALUE_TYPES = {
+    types.IntType: "l",
+    types.LongType: "l",
+    types.FloatType: "d",
+}
+
+# 'l'数组可以保存的整数范围，MySQLdb等驱动返回的整数通常是long
+_ARRAY_LONG_MAX = 2 ** (array("l").itemsize * 8 - 1) - 1
+_ARRAY_LONG_MIN = -_ARRAY_LONG_MAX - 1
+
+
+def array_accepts(typecode, value):
+    """判断值能否原样写入指定类型码的数组，数组列追加值之前用于检查
+    """
+    if _ARRAY_VALUE_TYPES.get(type(value)) != typecode:
+        return False
+    return typecode != "l" or _ARRAY_LONG_MIN <= value <= _ARRAY_LONG_MAX
+
+
+def _array_typecode(values):
+    """值全部为整数（在数组范围内）或者全部为float时返回对应的数组类型码，否则返回None
+    """
+    if not values:
+        return None
+    typecode = _ARRAY_VALUE_TYPES.get(type(values[0]))
+    if typecode is None:
+        return None
+    if typecode == "d":
+        for value in values:
+            if type(value) is not float:
+                return None
+        return typecode
+    for value in values:
+        value_type = type(value)
+        if value_type is int:
+            continue
+        if value_type is not long or \
+                not _ARRAY_LONG_MIN <= value <= _ARRAY_LONG_MAX:
+            return None
+    return typecode
+
+
+def _int_converter(fmt):
+    def convert(value):
+        # int会直接截断小数部分，只接受值为整数的浮点数与Decimal
+        if isinstance(value, float):
+            if not value.is_integer():
+                raise ValueError(value)
+        elif isinstance(value, Decimal):
+            if value != value.to_integral_value():
+                raise ValueError(value)
+        return int(value)
+    return convert
+
+
+def _float_converter(fmt):
+    return float
+
+
+def _decimal_converter(fmt):
+    def convert(value):
+        if isinstance(value, Decimal):
+            return value
+        if isinstance(value, float):
+            # 避免二进制浮点数的误差被带入Decimal
+            return Decimal(repr(value))
+        if isinstance(value, types.StringTypes):
+            value = value.strip()
+        return Decimal(value)
+    return convert
+
+
+def _date_converter(fmt):
+    def convert(value):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return datetime.strptime(value, fmt).date()
+    return convert
+
+
+def _datetime_converter(fmt):
+    def convert(value):
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        return datetime.strptime(value, fmt)
+    return convert
+
+
+def _bool_converter(fmt):
+    def convert(value):
+        if not isinstance(value, types.StringTypes):
+            return bool(value)
+        lowered = value.strip().lower()
+        if lowered in _TRUE_VALUES:
+            return True
+        if lowered in _FALSE_VALUES:
+            return False
+        raise ValueError(value)
+    return convert
+
+
+def _str_converter(fmt):
+    def convert(value):
+        if isinstance(value, types.StringTypes):
+            return value
+        return unicode(value)
+    return convert
+
+
+_CONVERTER_FACTORIES = {
+    "int": _int_converter,
+    "float": _float_converter,
+    "decimal": _decimal_converter,
+    "date": _date_converter,
+    "datetime": _datetime_converter,
+    "bool": _bool_converter,
+    "str": _str_converter,
+}
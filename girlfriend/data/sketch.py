@@ -0,0 +1,377 @@
+# coding: utf-8
+
+"""流式近似统计
+以有界的内存对大量数据进行单遍统计：
+
+    HyperLogLog     近似唯一值计数，内存为2^precision字节
+    TDigest         近似分位数，质心数目与compression成正比
+    ReservoirSample 固定大小的均匀随机样本
+    ColumnStats     组合以上结构，计算单列的计数、空值、最值、均值、标准差等
+"""
+
+import math
+import random
+import types
+from bisect import bisect_right
+from itertools import islice
+from decimal import Decimal
+from girlfriend.exception import InvalidArgumentException
+
+_MASK64 = (1 << 64) - 1
+
+_NUMBER_TYPES = (types.IntType, types.LongType, types.FloatType, Decimal)
+
+
+def _hash64(value):
+    """对内置hash的结果进行混淆，使得连续的整数也能均匀分布
+    """
+    h = hash(value) & _MASK64
+    h ^= h >> 33
+    h = (h * 0xff51afd7ed558ccd) & _MASK64
+    h ^= h >> 33
+    h = (h * 0xc4ceb9fe1a85ec53) & _MASK64
+    h ^= h >> 33
+    return h
+
+
+class HyperLogLog(object):
+
+    """HyperLogLog唯一值计数，相对误差约为1.04 / sqrt(2^precision)
+    """
+
+    def __init__(self, precision=14):
+        """
+        :param precision 精度，取值范围为4~16
+        """
+        if not 4 <= precision <= 16:
+            raise InvalidArgumentException(u"HyperLogLog的精度必须在4~16之间")
+        self._precision = precision
+        self._registers = bytearray(1 << precision)
+
+    @property
+    def precision(self):
+        return self._precision
+
+    def add(self, value):
+        self.update((value,))
+
+    def update(self, values):
+        registers, precision = self._registers, self._precision
+        shift, max_rank = 64 - precision, 64 - precision + 1
+        for value in values:
+            h = _hash64(value)
+            index = h >> shift
+            w = (h << precision) & _MASK64
+            rank = 64 - w.bit_length() + 1 if w else max_rank
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other):
+        """合并另一个精度相同的HyperLogLog
+        """
+        if other.precision != self._precision:
+            raise InvalidArgumentException(u"只能合并精度相同的HyperLogLog")
+        registers = self._registers
+        for index, rank in enumerate(other._registers):
+            if rank > registers[index]:
+                registers[index] = rank
+        return self
+
+    def count(self):
+        m = len(self._registers)
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank
+                                       for rank in self._registers)
+        if estimate <= 2.5 * m:
+            zeros = self._registers.count("\x00")
+            if zeros:
+                estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+
+class TDigest(object):
+
+    """t-digest近似分位数，在两端的分位数上精度更高
+    """
+
+    def __init__(self, compression=100):
+        """
+        :param compression 压缩参数，越大越精确，质心数目与其成正比
+        """
+        if compression <= 0:
+            raise InvalidArgumentException(u"compression必须为正数")
+        self._compression = compression
+        self._means = []
+        self._weights = []
+        self._buffer = []
+        self._buffer_size = int(compression) * 5
+        self._total = 0
+        self._min = None
+        self._max = None
+
+    def add(self, value):
+        self._buffer.append(value)
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    @property
+    def count(self):
+        return self._total + len(self._buffer)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        buffer_ = self._buffer
+        buffer_min, buffer_max = min(buffer_), max(buffer_)
+        if self._min is None or buffer_min < self._min:
+            self._min = buffer_min
+        if self._max is None or buffer_max > self._max:
+            self._max = buffer_max
+        points = sorted(zip(self._means, self._weights) +
+                        [(value, 1) for value in buffer_])
+        self._buffer = []
+        total = self._total + len(buffer_)
+        scale = 4.0 * total / self._compression
+
+        means, weights = [], []
+        current_mean, current_weight = points[0]
+        weight_before = 0
+        for mean, weight in points[1:]:
+            merged_weight = current_weight + weight
+            q = (weight_before + merged_weight / 2.0) / total
+            if merged_weight <= max(1, scale * q * (1 - q)):
+                current_mean += (mean - current_mean) * weight / merged_weight
+                current_weight = merged_weight
+            else:
+                means.append(current_mean)
+                weights.append(current_weight)
+                weight_before += current_weight
+                current_mean, current_weight = mean, weight
+        means.append(current_mean)
+        weights.append(current_weight)
+        self._means, self._weights, self._total = means, weights, total
+
+    def quantile(self, q):
+        """计算近似分位数
+        :param q 0~1之间的分位点
+        """
+        if not 0 <= q <= 1:
+            raise InvalidArgumentException(u"分位点必须在0~1之间")
+        self._compress()
+        means, weights = self._means, self._weights
+        if not means:
+            return None
+        if len(means) == 1:
+            return means[0]
+
+        target = q * self._total
+        # 质心的中心位置
+        centers, cumulative = [], 0
+        for weight in weights:
+            centers.append(cumulative + weight / 2.0)
+            cumulative += weight
+        if target <= centers[0]:
+            return _interpolate(target, 0, centers[0], self._min, means[0])
+        if target >= centers[-1]:
+            return _interpolate(target, centers[-1], self._total,
+                                means[-1], self._max)
+        index = bisect_right(centers, target)
+        return _interpolate(target, centers[index - 1], centers[index],
+                            means[index - 1], means[index])
+
+
+def _interpolate(x, x0, x1, y0, y1):
+    if x1 == x0:
+        return y0
+    return y0 + (y1 - y0) * (x - x0) / float(x1 - x0)
+
+
+class ReservoirSample(object):
+
+    """蓄水池抽样，使用跳跃式的算法，只有被选中的元素才需要生成随机数
+    """
+
+    def __init__(self, size, seed=None):
+        """
+        :param size 样本大小
+        :param seed 随机数种子
+        """
+        if size <= 0:
+            raise InvalidArgumentException(u"样本大小必须为正整数")
+        self._size = size
+        self._random = random.Random(seed)
+        self._sample = []
+        self._count = 0
+        self._weight = None
+        self._next = None
+
+    def _uniform(self):
+        # (0, 1)之间的随机数，避免对0取对数
+        return self._random.random() or 1e-300
+
+    def _skip(self):
+        self._next += int(math.log(self._uniform()) /
+                          math.log(1 - self._weight)) + 1
+
+    def add(self, value):
+        self.update((value,))
+
+    def update(self, values):
+        sample, size = self._sample, self._size
+        for value in values:
+            self._count += 1
+            if self._count <= size:
+                sample.append(value)
+                if self._count == size:
+                    self._weight = math.exp(
+                        math.log(self._uniform()) / size)
+                    self._next = size
+                    self._skip()
+            elif self._count == self._next:
+                sample[self._random.randrange(size)] = value
+                self._weight *= math.exp(math.log(self._uniform()) / size)
+                self._skip()
+
+    @property
+    def sample(self):
+        return list(self._sample)
+
+    @property
+    def count(self):
+        return self._count
+
+
+class ColumnStats(object):
+
+    """单列的流式统计，内存占用只与精度参数有关，与数据量无关
+    """
+
+    def __init__(self, name, precision=14, compression=100,
+                 sample_size=20, seed=None):
+        """
+        :param name 列名
+        :param precision HyperLogLog的精度
+        :param compression t-digest的压缩参数
+        :param sample_size 蓄水池样本大小
+        :param seed 抽样的随机数种子
+        """
+        self._name = name
+        self._count = 0
+        self._nulls = 0
+        self._min = None
+        self._max = None
+        # Welford算法计算均值与方差
+        self._numbers = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._hll = HyperLogLog(precision)
+        self._digest = TDigest(compression)
+        self._reservoir = ReservoirSample(sample_size, seed)
+
+    @property
+    def name(self):
+        return self._name
+
+    # 每批处理的值数目，批量更新各个统计结构，同时保证内存有界
+    BATCH_SIZE = 4096
+
+    def update(self, values):
+        """统计一系列值，None被视为空值，只有数值参与均值、标准差以及分位数的计算
+        """
+        values = iter(values)
+        while True:
+            batch = list(islice(values, self.BATCH_SIZE))
+            if not batch:
+                break
+            self._update_batch(batch)
+
+    def _update_batch(self, values):
+        non_nulls = []
+        append = non_nulls.append
+        digest_add = self._digest.add
+        count, nulls = 0, 0
+        numbers, mean, m2 = self._numbers, self._mean, self._m2
+        for value in values:
+            count += 1
+            if value is None:
+                nulls += 1
+                continue
+            append(value)
+            if isinstance(value, _NUMBER_TYPES) and \
+                    not isinstance(value, types.BooleanType):
+                numbers += 1
+                value = float(value)
+                delta = value - mean
+                mean += delta / numbers
+                m2 += delta * (value - mean)
+                digest_add(value)
+        self._count += count
+        self._nulls += nulls
+        self._numbers, self._mean, self._m2 = numbers, mean, m2
+
+        if non_nulls:
+            batch_min, batch_max = min(non_nulls), max(non_nulls)
+            if self._min is None or batch_min < self._min:
+                self._min = batch_min
+            if self._max is None or batch_max > self._max:
+                self._max = batch_max
+            self._hll.update(non_nulls)
+            self._reservoir.update(non_nulls)
+
+    def add(self, value):
+        self.update((value,))
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def nulls(self):
+        return self._nulls
+
+    @property
+    def min(self):
+        return self._min
+
+    @property
+    def max(self):
+        return self._max
+
+    @property
+    def mean(self):
+        return self._mean if self._numbers else None
+
+    @property
+    def stddev(self):
+        """样本标准差
+        """
+        if self._numbers < 2:
+            return None
+        return math.sqrt(self._m2 / (self._numbers - 1))
+
+    @property
+    def distinct(self):
+        """近似唯一值数目
+        """
+        return self._hll.count()
+
+    def quantile(self, q):
+        return self._digest.quantile(q)
+
+    @property
+    def sample(self):
+        return self._reservoir.sample
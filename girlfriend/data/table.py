@@ -5,7 +5,9 @@
 """
 
 import types
-import prettytable
+import operator
+from array import array
+from itertools import izip, islice
 from abc import (
     ABCMeta,
     abstractproperty,
@@ -17,6 +19,23 @@ from girlfriend.data.exception import (
     MissingKeyException,
     InvalidSizeException
 )
+from girlfriend.data.index import index_type, HashIndex
+from girlfriend.data.encoding import (
+    DictEncodedColumn,
+    KeyCodec,
+    DEFAULT_ENCODE_THRESHOLD,
+    encode_column,
+    check_threshold
+)
+from girlfriend.data.schema import (
+    check_column_type,
+    compile_converter,
+    compact_column,
+    convert_records,
+    array_accepts,
+    ColumnBuilder
+)
+from girlfriend.data.console import format_table
 from girlfriend.util.lang import SequenceCollectionType
 
 
@@ -82,21 +101,40 @@ class AbstractTable(object):
     def __iter__(self):
         pass
 
+    def column(self, name):
+        """获取某一列的数据序列，默认逐行提取，子类可以提供更高效的实现
+        """
+        return [row[name] for row in self]
+
+    def columns(self, names):
+        """获取多个列的数据序列，结果与names一一对应
+        """
+        return [self.column(name) for name in names]
+
 
 class Title(object):
 
     """表格标题"""
 
-    def __init__(self, name, title=None):
+    def __init__(self, name, title=None, type=None, nullable=True,
+                 format=None):
         """
         :param name: 标题名,可以方便用来进行变量引用,比如id、age、grade等等
         :param title: 供显示的标题名,比如编号/年龄/等级,可以不指定,默认为name的值
+        :param type: 列类型,可以是int、float、decimal、date、datetime、bool、str,
+                     不指定时不进行类型转换
+        :param nullable: 是否允许为空,None以及空字符串都被视为空值
+        :param format: date与datetime类型所使用的格式
         """
         self._name = name
         if title is None:
             self._title = name
         else:
             self._title = title
+        self._type = check_column_type(type)
+        self._nullable = nullable
+        self._format = format
+        self._converter = None
 
     @property
     def name(self):
@@ -106,6 +144,26 @@ class Title(object):
     def title(self):
         return self._title
 
+    @property
+    def type(self):
+        return self._type
+
+    @property
+    def nullable(self):
+        return self._nullable
+
+    @property
+    def format(self):
+        return self._format
+
+    @property
+    def converter(self):
+        """根据类型声明编译的转换函数，没有声明类型时为None
+        """
+        if self._converter is None and self._type is not None:
+            self._converter = compile_converter(self)
+        return self._converter
+
     def __repr__(self):
         return self._title
 
@@ -150,11 +208,62 @@ class BaseLocalTable(AbstractTable):
             self._data = data
         self._row_type = row_type
         self._mapping = self._gen_mapping()
+        self._indexes = {}
+        self._column_cache = {}
 
     @abstractmethod
     def _gen_mapping(self):
         pass
 
+    def column(self, name):
+        """获取某一列的数据序列，首次访问时一次性提取并缓存，添加新行后自动失效，
+           不允许为空的int、float列以array存储，返回的序列是共享的，调用方不应修改
+        """
+        column = self._column_cache.get(name)
+        if column is None:
+            title = None
+            for each_title in self._titles:
+                if each_title.name == name:
+                    title = each_title
+                    break
+            if title is None:
+                raise MissingKeyException(u"找不到列{}".format(name))
+            column = self._extract_column(name)
+            compact = compact_column(title, column)
+            if compact is not None:
+                column = compact
+            self._column_cache[name] = column
+        return column
+
+    def _extract_column(self, name):
+        return [row[name] for row in self]
+
+    def index(self, fields, kind="hash"):
+        """获取列上的索引，索引会在首次使用时构建并缓存，添加新行后自动失效
+        :param fields 索引列，字符串表示单列索引，列表或元组表示组合索引
+        :param kind 索引类型，hash - 哈希索引 unique - 唯一哈希索引
+                    sorted - 支持范围查询的有序索引
+        """
+        if isinstance(fields, types.ListType):
+            fields = tuple(fields)
+        cache_key = (kind, fields)
+        index = self._indexes.get(cache_key)
+        if index is None:
+            index = index_type(kind)(self, fields)
+            self._indexes[cache_key] = index
+        return index
+
+    def _keys(self, fields):
+        """批量提取每一行的键，fields为字符串时键为列值，为序列时键为元组
+        """
+        return [row[fields] for row in self]
+
+    def _invalidate(self):
+        """表格数据发生变化时，清除基于数据构建的缓存
+        """
+        self._indexes.clear()
+        self._column_cache.clear()
+
     @property
     def name(self):
         return self._name
@@ -199,10 +308,10 @@ class BaseLocalTable(AbstractTable):
             yield self._row_type(row, self._mapping)
 
     def __str__(self):
-        ptable = prettytable.PrettyTable(title.title for title in self.titles)
-        for row in self:
-            ptable.add_row(row)
-        return str(ptable)
+        return unicode(self).encode("utf-8")
+
+    def __unicode__(self):
+        return format_table(self, sample_size=None)
 
 
 class BaseLocalRow(Row):
@@ -244,12 +353,27 @@ class TableWrapper(object):
     """表格包装器，能够根据列表中元素的类型，自动选择对应的表格类型进行包装
     """
 
-    def __init__(self, name, titles, table_type=None, auto_title_name=False):
+    def __init__(self, name, titles, table_type=None, auto_title_name=False,
+                 convert=True):
+        """
+        :param name 表格名称
+        :param titles 表格标题
+        :param table_type 表格类型，不指定时根据数据自动推断
+        :param auto_title_name 是否自动生成标题名
+        :param convert 是否按照Title中声明的类型对数据进行批量转换
+        """
         self._name = name
         self._titles = self._handle_titles(titles, auto_title_name)
         self._table_type = table_type
+        self._convert = convert
+
+    @property
+    def titles(self):
+        return self._titles
 
     def __call__(self, data):
+        if self._convert:
+            data = convert_records(self._titles, data)
         table_type = self._get_table_type(data)
         return table_type(
             name=self._name,
@@ -295,6 +419,58 @@ class TableWrapper(object):
             return ObjectTable
 
 
+class ColumnTableWrapper(object):
+
+    """将查询结果直接按列物化为ColumnTable，通常与流式查询配合使用：
+
+       SQL("report", "orders", "select id, amount from orders", stream=True,
+           result_wrapper=ColumnTableWrapper("orders"))
+
+       每批行按列追加到各列的构建器中，整数、浮点数列写入array，
+       低基数的字符串列进行字典编码，物化过程中不会为每一行保留元组。
+    """
+
+    # 数据不是按批次提供时，每批转换的行数
+    BATCH_SIZE = 1000
+
+    def __init__(self, name, titles=None,
+                 encode_threshold=DEFAULT_ENCODE_THRESHOLD):
+        """
+        :param name 表格名称
+        :param titles 表格标题，不指定时使用查询结果的列名
+        :param encode_threshold 字符串列进行字典编码的阈值，为None时不进行编码
+        """
+        self._name = name
+        self._titles = titles
+        self._encode_threshold = encode_threshold
+
+    def __call__(self, data):
+        titles = self._titles
+        if titles is None:
+            keys = getattr(data, "keys", None)
+            if keys is None:
+                raise InvalidTypeException(
+                    u"数据中没有列名信息，必须指定titles")
+            titles = [Title(key) for key in keys]
+        builders = [ColumnBuilder(title) for title in titles]
+        for batch in self._batches(data):
+            if not batch:
+                continue
+            for builder, column in izip(builders, izip(*batch)):
+                builder.extend(column)
+        return ColumnTable(
+            self._name, titles,
+            columns=[builder.build() for builder in builders],
+            encode_threshold=self._encode_threshold)
+
+    def _batches(self, data):
+        batches = getattr(data, "batches", None)
+        if batches is not None:
+            return batches()
+        data = iter(data)
+        return iter(lambda: list(islice(data, self.BATCH_SIZE)), [])
+
+
 class ListTable(BaseLocalTable):
 
     """基于二维list的Table实现
@@ -312,6 +488,18 @@ class ListTable(BaseLocalTable):
     def _gen_mapping(self):
         return {title.name: idx for idx, title in enumerate(self.titles)}
 
+    def _extract_column(self, name):
+        return map(operator.itemgetter(self._mapping[name]), self._data)
+
+    def _keys(self, fields):
+        if isinstance(fields, types.StringTypes):
+            return map(operator.itemgetter(self._mapping[fields]), self._data)
+        if len(fields) == 1:
+            index = self._mapping[fields[0]]
+            return [(row[index],) for row in self._data]
+        return map(operator.itemgetter(
+            *(self._mapping[field] for field in fields)), self._data)
+
     def cell(self, row_index, column_index):
         self._check_row_index(row_index)
         self._check_col_index(column_index)
@@ -329,6 +517,7 @@ class ListTable(BaseLocalTable):
                     self.column_num
                 ))
         self._data.append(row)
+        self._invalidate()
 
 
 class ListRow(BaseLocalRow):
@@ -373,6 +562,9 @@ class ObjectTable(BaseLocalTable):
     def _gen_mapping(self):
         return [title.name for title in self.titles]
 
+    def _extract_column(self, name):
+        return map(operator.attrgetter(name), self._data)
+
     def cell(self, row_index, column_index):
         self._check_row_index(row_index)
         self._check_col_index(column_index)
@@ -382,6 +574,7 @@ class ObjectTable(BaseLocalTable):
 
     def append(self, row):
         self._data.append(row)
+        self._invalidate()
 
 
 class ObjectRow(BaseLocalRow):
@@ -417,6 +610,9 @@ class DictTable(BaseLocalTable):
     def _gen_mapping(self):
         return [title.name for title in self._titles]
 
+    def _extract_column(self, name):
+        return map(operator.itemgetter(name), self._data)
+
     def cell(self, row_index, column_index):
         self._check_row_index(row_index)
         self._check_col_index(column_index)
@@ -432,6 +628,7 @@ class DictTable(BaseLocalTable):
                 u"新行的列数为{0}，表格的列数为{1}，两者不一致".format(len(row), self.column_num)
             )
         self._data.append(row)
+        self._invalidate()
 
 
 class DictRow(BaseLocalRow):
@@ -454,3 +651,189 @@ class DictRow(BaseLocalRow):
     def __iter__(self):
         for i in xrange(len(self._mapping)):
             yield self._row[self._mapping[i]]
+
+
+def _column_accepts(column, value):
+    """判断值能否直接追加到列中
+    """
+    if isinstance(column, array):
+        return array_accepts(column.typecode, value)
+    if isinstance(column, DictEncodedColumn):
+        try:
+            hash(value)
+        except TypeError:
+            return False
+    return True
+
+
+class ColumnTable(AbstractTable):
+
+    """按列存储的Table实现，每一列都是一个独立的序列，
+       可以是list、array.array或者字典编码列DictEncodedColumn。
+       对于大量重复的低基数字符串列，构建时会自动进行字典编码，以减少内存占用，
+       哈希索引、分组以及分区直接使用字典编码列的整数编码。
+       读取插件不会自动生成ColumnTable，需要通过table_type或者ColumnTableWrapper指定。
+       行对象为基于元组的ListRow，因此可以与其它Table实现互换使用。
+    """
+
+    def __init__(self, name, titles, data=None, columns=None,
+                 encode_threshold=DEFAULT_ENCODE_THRESHOLD):
+        """
+        :param name 表格名称
+        :param titles 表格标题
+        :param data 按行组织的数据，会被转换为列
+        :param columns 按列组织的数据，与titles一一对应，指定columns时会忽略data
+        :param encode_threshold 字符串列唯一值数目与行数的比例不超过该值时进行字典编码，
+                                为None时不进行编码
+        """
+        self._name = name
+        self._titles = titles
+        self._encode_threshold = check_threshold(encode_threshold)
+        if columns is None:
+            if data:
+                columns = [list(column) for column in izip(*data)]
+            else:
+                columns = [[] for _ in titles]
+        if len(columns) != len(titles):
+            raise InvalidSizeException(
+                u"列数为{0}，标题数为{1}，两者不一致".format(
+                    len(columns), len(titles)))
+        self._columns = [self._encode(title, column)
+                         for title, column in izip(titles, columns)]
+        self._mapping = {title.name: idx for idx, title in enumerate(titles)}
+        self._indexes = {}
+
+    def _encode(self, title, column):
+        # 声明了类型且不允许为空的数值列使用数组存储
+        compacted = compact_column(title, column)
+        if compacted is not None:
+            return compacted
+        encoded = encode_column(column, self._encode_threshold)
+        return column if encoded is None else encoded
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def titles(self):
+        return self._titles
+
+    @property
+    def row_num(self):
+        if not self._columns:
+            return 0
+        return len(self._columns[0])
+
+    @property
+    def column_num(self):
+        return len(self._titles)
+
+    def column(self, name):
+        """获取某一列的数据序列
+        """
+        index = self._mapping.get(name)
+        if index is None:
+            raise MissingKeyException(u"找不到列{}".format(name))
+        return self._columns[index]
+
+    def cell(self, row_index, column_index):
+        return self._columns[column_index][row_index]
+
+    def row(self, row_index):
+        if row_index >= self.row_num:
+            raise IndexOutOfBoundsException(
+                u"row_index={0}超出了边界，row_num={1}".format(
+                    row_index,
+                    self.row_num
+                ))
+        return ListRow(tuple(column[row_index] for column in self._columns),
+                       self._mapping)
+
+    def __getitem__(self, row_index):
+        return self.row(row_index)
+
+    def __iter__(self):
+        mapping = self._mapping
+        for values in izip(*self._columns):
+            yield ListRow(values, mapping)
+
+    def append(self, row):
+        if not isinstance(row, SequenceCollectionType):
+            raise InvalidTypeException(u"新行的类型必须是list或者tuple类型")
+        if len(row) != self.column_num:
+            raise InvalidSizeException(
+                u"新行的列数为{0}，表格的列数为{1}，两者不一致".format(
+                    len(row),
+                    self.column_num
+                ))
+        # 先检查整行，数组列或者字典编码列无法保存的值会使该列退化为列表，
+        # 避免追加到一半时出错导致各列长度不一致
+        columns = self._columns
+        for idx, value in enumerate(row):
+            if not _column_accepts(columns[idx], value):
+                columns[idx] = list(columns[idx])
+        for column, value in izip(columns, row):
+            column.append(value)
+        self._invalidate()
+
+    def take(self, positions, name=None):
+        """按照位置提取若干行，生成新的ColumnTable，字典编码列会共享原来的词表
+        """
+        columns = []
+        for column in self._columns:
+            if isinstance(column, DictEncodedColumn):
+                columns.append(column.take(positions))
+            else:
+                columns.append([column[p] for p in positions])
+        return ColumnTable(self._name if name is None else name,
+                           self._titles, columns=columns,
+                           encode_threshold=None)
+
+    def index(self, fields, kind="hash"):
+        """获取列上的索引，用法与BaseLocalTable.index一致
+        """
+        if isinstance(fields, types.ListType):
+            fields = tuple(fields)
+        cache_key = (kind, fields)
+        index = self._indexes.get(cache_key)
+        if index is None:
+            if kind == "hash":
+                keys, codec = self._encoded_keys(fields)
+                index = HashIndex(self, fields, keys, codec)
+            else:
+                index = index_type(kind)(self, fields)
+            self._indexes[cache_key] = index
+        return index
+
+    def _keys(self, fields):
+        if isinstance(fields, types.StringTypes):
+            return list(self.column(fields))
+        return zip(*[self.column(field) for field in fields])
+
+    def _encoded_keys(self, fields):
+        """提取分组与分区使用的键，字典编码列直接使用整数编码
+        :return (每一行的键, KeyCodec)，没有字典编码列时KeyCodec为None
+        """
+        single = isinstance(fields, types.StringTypes)
+        columns = [self.column(fields)] if single \
+            else [self.column(field) for field in fields]
+        vocabularies = [column.vocabulary
+                        if isinstance(column, DictEncodedColumn) else None
+                        for column in columns]
+        if all(vocabulary is None for vocabulary in vocabularies):
+            return self._keys(fields), None
+        key_columns = [column.codes
+                       if isinstance(column, DictEncodedColumn) else column
+                       for column in columns]
+        keys = list(key_columns[0]) if single else zip(*key_columns)
+        return keys, KeyCodec(vocabularies, not single)
+
+    def _invalidate(self):
+        self._indexes.clear()
+
+    def __str__(self):
+        return unicode(self).encode("utf-8")
+
+    def __unicode__(self):
+        return format_table(self, sample_size=None)
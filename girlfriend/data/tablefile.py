@@ -0,0 +1,544 @@
+# coding: utf-8
+
+"""表格文件格式
+按列存储的二进制表格文件，用于在工作流之间传递大型的中间表格，
+相比pickle和CSV，加载时不需要对整个文件进行解析和复制，而是将文件映射到内存，
+只有在访问某一列的时候才会读取和解码这一列的数据。
+
+文件结构：
+
+    文件头    "GFTB" + 版本号，共8字节
+    数据块    每一列对应一个或多个连续的数据块，按8字节对齐，可以使用zlib压缩
+    元信息    JSON格式，包含表名、行数、标题（包括声明的列类型）以及每一列的存储类型和数据块位置
+    文件尾    元信息长度 + "GFTB"，共8字节
+
+列类型：
+
+    int     64位整数
+    float   双精度浮点数
+    dict    字典编码列，整数编码块 + 词表块
+    object  其它类型，以pickle格式保存，因此不要读取来源不可信的表格文件
+
+    write_table(table, "/tmp/orders.gft", compression="zlib")
+    table = read_table("/tmp/orders.gft", columns=("id", "amount"))
+
+流式写入的文件（版本2）中，每一批行的每一列单独作为一个分块，分块有各自的存储类型，
+字典编码的分块共享列的词表，读取时将所有分块拼接为一列：
+
+    with TableFileWriter("/tmp/orders.gft", "orders", titles) as writer:
+        for batch in result_stream.batches():
+            writer.write_rows(batch)
+"""
+
+import sys
+import types
+import mmap
+import zlib
+import json
+import struct
+import cPickle as pickle
+from array import array
+from itertools import izip, imap
+from girlfriend.data.table import (
+    Title,
+    ListRow,
+    BaseLocalTable,
+    ColumnTable
+)
+from girlfriend.data.encoding import (
+    Vocabulary,
+    DictEncodedColumn,
+    DEFAULT_ENCODE_THRESHOLD,
+    CODE_TYPECODE,
+    MIN_ENCODE_ROWS,
+    encode_column,
+    check_threshold
+)
+from girlfriend.data.exception import (
+    MissingKeyException,
+    InvalidTableFileException
+)
+from girlfriend.exception import InvalidArgumentException
+
+MAGIC = "GFTB"
+VERSION = 2
+
+_HEADER = struct.Struct("<4sH2x")
+_TRAILER = struct.Struct("<I4s")
+_ALIGNMENT = 8
+
+COMPRESSIONS = (None, "zlib")
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _int64_typecode():
+    for typecode in ("l", "q"):
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+
+_INT64_TYPECODE = _int64_typecode()
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+class MappedTable(ColumnTable):
+
+    """从表格文件中加载的ColumnTable，列数据在首次访问时才从映射的文件中读取，
+       除此之外与ColumnTable完全一致，同样可以追加行、建立索引
+    """
+
+    def __init__(self, name, titles, row_num, loaders):
+        """
+        :param name 表格名称
+        :param titles 表格标题
+        :param row_num 文件中记录的行数
+        :param loaders 与titles一一对应的列加载函数
+        """
+        self._name = name
+        self._titles = titles
+        self._encode_threshold = None
+        self._columns = _LazyColumns(loaders)
+        self._mapping = {title.name: idx for idx, title in enumerate(titles)}
+        self._indexes = {}
+        self._row_num = row_num
+
+    @property
+    def row_num(self):
+        if not self._columns:
+            return self._row_num
+        first_column = self._columns.loaded(0)
+        if first_column is None:
+            return self._row_num
+        return len(first_column)
+
+    def load(self):
+        """加载所有的列
+        """
+        for _ in self._columns:
+            pass
+        return self
+
+    def is_loaded(self, name):
+        """判断某一列是否已经被加载
+        """
+        index = self._mapping.get(name)
+        if index is None:
+            raise MissingKeyException(u"找不到列{}".format(name))
+        return self._columns.loaded(index) is not None
+
+
+class _LazyColumns(object):
+
+    """按需加载的列序列，所有列加载完毕之后不再持有对映射文件的引用
+    """
+
+    def __init__(self, loaders):
+        self._loaders = list(loaders)
+        self._columns = [None] * len(self._loaders)
+
+    def loaded(self, index):
+        return self._columns[index]
+
+    def __getitem__(self, index):
+        column = self._columns[index]
+        if column is None:
+            column = self._loaders[index]()
+            self._columns[index] = column
+            self._loaders[index] = None
+        return column
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __iter__(self):
+        for index in xrange(len(self._columns)):
+            yield self[index]
+
+
+def write_table(table, path, compression=None,
+                encode_threshold=DEFAULT_ENCODE_THRESHOLD):
+    """将表格写入表格文件
+    :param table 任意AbstractTable对象
+    :param path 文件路径
+    :param compression 压缩方式，None表示不压缩，"zlib"表示使用zlib压缩每一个数据块
+    :param encode_threshold 对于没有编码的字符串列，唯一值比例不超过该值时以字典编码的形式保存，
+                            为None时不进行编码
+    """
+    if compression not in COMPRESSIONS:
+        raise InvalidArgumentException(
+            u"不支持的压缩方式'{}'，只支持zlib".format(compression))
+    check_threshold(encode_threshold)
+
+    columns = _table_columns(table)
+    column_metas = []
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION))
+        for title, column in izip(table.titles, columns):
+            column_type, blocks = _encode_column(column, encode_threshold)
+            column_metas.append({
+                "name": title.name,
+                "title": title.title,
+                "schema": {
+                    "type": title.type,
+                    "nullable": title.nullable,
+                    "format": title.format,
+                },
+                "type": column_type,
+                "compression": compression,
+                "blocks": [_write_block(f, block, compression)
+                           for block in blocks],
+            })
+        footer = json.dumps({
+            "name": table.name,
+            "row_num": len(table),
+            "columns": column_metas,
+        })
+        f.write(footer)
+        f.write(_TRAILER.pack(len(footer), MAGIC))
+    return path
+
+
+class TableFileWriter(object):
+
+    """流式写入表格文件，每次追加一批行，内存中只保留当前批次以及字符串列的词表
+    """
+
+    def __init__(self, path, name, titles, compression=None,
+                 encode_threshold=DEFAULT_ENCODE_THRESHOLD):
+        """
+        :param path 文件路径
+        :param name 表格名称
+        :param titles 表格标题
+        :param compression 压缩方式，None表示不压缩，"zlib"表示使用zlib压缩每一个数据块
+        :param encode_threshold 字符串列唯一值数目与已写入行数的比例不超过该值时进行字典编码，
+                                为None时不进行编码
+        """
+        if compression not in COMPRESSIONS:
+            raise InvalidArgumentException(
+                u"不支持的压缩方式'{}'，只支持zlib".format(compression))
+        self._name = name
+        self._titles = titles
+        self._compression = compression
+        self._columns = [_ChunkedColumn(check_threshold(encode_threshold))
+                         for _ in titles]
+        self._row_num = 0
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION))
+
+    @property
+    def row_num(self):
+        return self._row_num
+
+    def write_rows(self, rows):
+        """追加一批行，行为与titles一一对应的序列
+        """
+        if not rows:
+            return
+        self._row_num += len(rows)
+        for column, values in izip(self._columns, izip(*rows)):
+            column.write(self._file, values, self._compression,
+                         self._row_num)
+
+    def close(self):
+        if self._file is None:
+            return
+        f, self._file = self._file, None
+        try:
+            column_metas = []
+            for title, column in izip(self._titles, self._columns):
+                meta = column.meta(f, self._compression)
+                meta.update({
+                    "name": title.name,
+                    "title": title.title,
+                    "schema": {
+                        "type": title.type,
+                        "nullable": title.nullable,
+                        "format": title.format,
+                    },
+                })
+                column_metas.append(meta)
+            footer = json.dumps({
+                "name": self._name,
+                "row_num": self._row_num,
+                "columns": column_metas,
+            })
+            f.write(footer)
+            f.write(_TRAILER.pack(len(footer), MAGIC))
+        finally:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _ChunkedColumn(object):
+
+    """流式写入的列，每次写入一个分块
+    """
+
+    def __init__(self, encode_threshold):
+        self._encode_threshold = encode_threshold
+        self._vocabulary = Vocabulary()
+        # 唯一值过多时不再进行字典编码
+        self._encoding = encode_threshold is not None
+        self._chunks = []
+
+    def write(self, f, values, compression, row_num):
+        chunk_type = _column_type(values)
+        if chunk_type == "object" and self._encoding and \
+                all(value is None or isinstance(value, types.StringTypes)
+                    for value in values):
+            codes = array(CODE_TYPECODE,
+                          imap(self._vocabulary.encode, values))
+            chunk_type, blocks = "dict", [_pack_numbers(codes, "i")]
+            if len(self._vocabulary) > max(
+                    MIN_ENCODE_ROWS, row_num * self._encode_threshold):
+                self._encoding = False
+        elif chunk_type == "int":
+            blocks = [_pack_numbers(values, "q")]
+        elif chunk_type == "float":
+            blocks = [_pack_numbers(values, "d")]
+        else:
+            chunk_type = "object"
+            blocks = [pickle.dumps(list(values), pickle.HIGHEST_PROTOCOL)]
+        self._chunks.append({
+            "type": chunk_type,
+            "rows": len(values),
+            "blocks": [_write_block(f, block, compression)
+                       for block in blocks],
+        })
+
+    def meta(self, f, compression):
+        chunk_types = set(chunk["type"] for chunk in self._chunks)
+        column_type = chunk_types.pop() if len(chunk_types) == 1 \
+            else "object"
+        vocabulary = None
+        if len(self._vocabulary):
+            vocabulary = _write_block(f, pickle.dumps(
+                self._vocabulary.values, pickle.HIGHEST_PROTOCOL),
+                compression)
+        return {
+            "type": column_type,
+            "compression": compression,
+            "chunks": self._chunks,
+            "vocabulary": vocabulary,
+        }
+
+
+def read_table(path, columns=None, lazy=True):
+    """读取表格文件，文件会被映射到内存中，列数据在首次访问时才会被解码
+    :param path 文件路径
+    :param columns 要读取的列名列表，为None时读取所有列
+    :param lazy 为False时立即加载所有列
+    """
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise InvalidTableFileException(u"表格文件'{}'为空".format(path))
+
+    footer = _read_footer(buf, path)
+    column_metas = footer["columns"]
+    for meta in column_metas:
+        # json解析出的列名为unicode，而行对象只接受str类型的列名
+        meta["name"] = meta["name"].encode("utf-8")
+    if columns is not None:
+        metas = {meta["name"]: meta for meta in column_metas}
+        try:
+            column_metas = [metas[name] for name in columns]
+        except KeyError as e:
+            raise MissingKeyException(
+                u"表格文件'{}'中不存在列'{}'".format(path, e.args[0]))
+
+    table = MappedTable(
+        footer["name"],
+        [Title(meta["name"], meta["title"], **meta.get("schema", {}))
+         for meta in column_metas],
+        footer["row_num"],
+        [_column_loader(buf, meta) for meta in column_metas]
+    )
+    if not lazy:
+        table.load()
+    return table
+
+
+def _read_footer(buf, path):
+    size = len(buf)
+    if size < _HEADER.size + _TRAILER.size:
+        raise InvalidTableFileException(
+            u"'{}'不是合法的表格文件".format(path))
+    magic, version = _HEADER.unpack(buf[:_HEADER.size])
+    footer_size, tail_magic = _TRAILER.unpack(buf[size - _TRAILER.size:])
+    if magic != MAGIC or tail_magic != MAGIC:
+        raise InvalidTableFileException(
+            u"'{}'不是合法的表格文件".format(path))
+    if version > VERSION:
+        raise InvalidTableFileException(
+            u"不支持的表格文件版本{}".format(version))
+    footer_end = size - _TRAILER.size
+    return json.loads(buf[footer_end - footer_size:footer_end])
+
+
+def _table_columns(table):
+    """按列提取表格数据
+    """
+    if isinstance(table, ColumnTable):
+        return [table.column(title.name) for title in table.titles]
+    if isinstance(table, BaseLocalTable) and table._row_type is ListRow:
+        if not table._data:
+            return [[] for _ in table.titles]
+        return [list(column) for column in izip(*table._data)]
+    return [[row[title.name] for row in table] for title in table.titles]
+
+
+def _column_type(column):
+    if isinstance(column, DictEncodedColumn):
+        return "dict"
+    if not len(column):
+        return "object"
+    value_types = set(type(value) for value in column)
+    if value_types <= {int, long}:
+        if _INT64_MIN <= min(column) and max(column) <= _INT64_MAX:
+            return "int"
+    elif value_types == {float}:
+        return "float"
+    return "object"
+
+
+def _encode_column(column, encode_threshold):
+    """将列编码为(类型, 数据块列表)
+    """
+    column_type = _column_type(column)
+    if column_type == "object":
+        encoded = encode_column(column, encode_threshold)
+        if encoded is not None:
+            column, column_type = encoded, "dict"
+
+    if column_type == "int":
+        return column_type, [_pack_numbers(column, "q")]
+    if column_type == "float":
+        return column_type, [_pack_numbers(column, "d")]
+    if column_type == "dict":
+        return column_type, [
+            _pack_numbers(column.codes, "i"),
+            pickle.dumps(column.vocabulary.values, pickle.HIGHEST_PROTOCOL)
+        ]
+    return column_type, [
+        pickle.dumps(list(column), pickle.HIGHEST_PROTOCOL)]
+
+
+def _write_block(f, data, compression):
+    if compression == "zlib":
+        data = zlib.compress(data)
+    offset = f.tell()
+    f.write(data)
+    padding = -len(data) % _ALIGNMENT
+    if padding:
+        f.write("\x00" * padding)
+    return {"offset": offset, "size": len(data)}
+
+
+def _read_block(buf, block, compression):
+    offset = block["offset"]
+    data = buf[offset:offset + block["size"]]
+    if compression == "zlib":
+        data = zlib.decompress(data)
+    return data
+
+
+def _column_loader(buf, meta):
+    if "chunks" in meta:
+        return _chunked_column_loader(buf, meta)
+    column_type, compression = meta["type"], meta["compression"]
+    blocks = meta["blocks"]
+
+    def load():
+        data = [_read_block(buf, block, compression) for block in blocks]
+        if column_type == "dict":
+            return DictEncodedColumn(
+                _unpack_numbers(data[0], "i"),
+                Vocabulary(pickle.loads(data[1])))
+        return _decode_block(column_type, data[0])
+
+    return load
+
+
+def _decode_block(column_type, data):
+    if column_type == "int":
+        return _unpack_numbers(data, "q")
+    if column_type == "float":
+        return _unpack_numbers(data, "d")
+    if column_type == "dict":
+        return _unpack_numbers(data, "i")
+    if column_type == "object":
+        return pickle.loads(data)
+    raise InvalidTableFileException(
+        u"不支持的列类型'{}'".format(column_type))
+
+
+def _chunked_column_loader(buf, meta):
+    column_type, compression = meta["type"], meta["compression"]
+
+    def load():
+        vocabulary = None
+        if meta.get("vocabulary"):
+            vocabulary = Vocabulary(pickle.loads(
+                _read_block(buf, meta["vocabulary"], compression)))
+        chunks = [(chunk["type"], _decode_block(
+            chunk["type"], _read_block(buf, chunk["blocks"][0], compression)))
+            for chunk in meta["chunks"]]
+        if not chunks:
+            return []
+        if column_type in ("int", "float", "dict"):
+            # 所有分块的类型相同，直接拼接数组
+            column = chunks[0][1]
+            for _, values in chunks[1:]:
+                column.extend(values)
+            if column_type == "dict":
+                return DictEncodedColumn(column, vocabulary)
+            return column
+        column = []
+        for chunk_type, values in chunks:
+            if chunk_type == "dict":
+                column.extend(imap(vocabulary.values.__getitem__, values))
+            else:
+                column.extend(values)
+        return column
+
+    return load
+
+
+# 数据块中的数值统一使用小端序
+_TYPECODES = {"q": _INT64_TYPECODE, "d": "d", "i": CODE_TYPECODE}
+
+
+def _pack_numbers(values, fmt):
+    typecode = _TYPECODES[fmt]
+    if typecode is None:
+        return struct.pack("<{}{}".format(len(values), fmt), *values)
+    numbers = values if isinstance(values, array) and \
+        values.typecode == typecode else array(typecode, values)
+    if _BIG_ENDIAN:
+        numbers = array(typecode, numbers)
+        numbers.byteswap()
+    return numbers.tostring()
+
+
+def _unpack_numbers(data, fmt):
+    typecode = _TYPECODES[fmt]
+    if typecode is None:
+        return list(struct.unpack(
+            "<{}{}".format(len(data) / struct.calcsize(fmt), fmt), data))
+    numbers = array(typecode)
+    numbers.fromstring(data)
+    if _BIG_ENDIAN:
+        numbers.byteswap()
+    return numbers
@@ -0,0 +1,321 @@
+# coding: utf-8
+
+"""惰性表格视图
+视图本身不复制任何行数据，只保存对源表格的引用以及变换规则，只有在被迭代或者按索引访问时才会求值。
+视图之间可以相互组合，组合时同样不会产生中间结果，需要真实数据时通过materialize方法生成ListTable：
+
+    view = FilterView(students, lambda row: row.age > 18)
+    view = view.select("id", "name").slice(0, 10)
+    table = view.materialize()
+"""
+
+import types
+from itertools import islice
+from abc import ABCMeta, abstractmethod
+from girlfriend.data.table import (
+    AbstractTable,
+    BaseLocalTable,
+    ListTable,
+    ListRow
+)
+from girlfriend.data.exception import IndexOutOfBoundsException
+from girlfriend.exception import (
+    InvalidArgumentException,
+    UnsupportMethodException
+)
+from girlfriend.util.lang import SequenceCollectionType
+
+
+class TableView(AbstractTable):
+
+    """视图基类，视图都是只读的
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(self, source, name=None):
+        self._source = source
+        self._name = name
+
+    @property
+    def name(self):
+        if self._name is None:
+            return self._source.name
+        return self._name
+
+    @property
+    def source(self):
+        """被包装的表格或视图
+        """
+        return self._source
+
+    @property
+    def titles(self):
+        return self._source.titles
+
+    @property
+    def column_num(self):
+        return len(self.titles)
+
+    @abstractmethod
+    def __iter__(self):
+        pass
+
+    def __getitem__(self, index):
+        return self.row(index)
+
+    def append(self, row):
+        raise UnsupportMethodException(u"视图是只读的，不能添加行")
+
+    def _normalize_index(self, index):
+        row_num = self.row_num
+        if index < 0:
+            index += row_num
+        if index < 0 or index >= row_num:
+            raise IndexOutOfBoundsException(
+                u"row_index={0}超出了边界，row_num={1}".format(index, row_num))
+        return index
+
+    def filter(self, predicate, name=None):
+        return FilterView(self, predicate, name)
+
+    def select(self, *fields):
+        return ProjectView(self, fields)
+
+    def slice(self, start=0, stop=None):
+        return SliceView(self, start, stop)
+
+    def materialize(self, name=None):
+        """对视图求值，生成包含全部数据的ListTable
+        """
+        return ListTable(
+            self.name if name is None else name,
+            list(self.titles),
+            [tuple(row) for row in self]
+        )
+
+    def __str__(self):
+        return str(self.materialize())
+
+
+class FilterView(TableView):
+
+    """过滤视图，只包含满足条件的行
+    """
+
+    def __init__(self, source, predicate, name=None):
+        """
+        :param source 源表格
+        :param predicate 接受行对象，返回True或False
+        :param name 视图名称，默认与源表格相同
+        """
+        TableView.__init__(self, source, name)
+        self._predicate = predicate
+        self._positions = None
+        self._positions_source_len = -1
+
+    def __iter__(self):
+        predicate = self._predicate
+        for row in self._source:
+            if predicate(row):
+                yield row
+
+    def positions(self):
+        """满足条件的行在源表格中的位置，随机访问时才会计算，源表格长度变化后重新计算
+        """
+        source_len = len(self._source)
+        if self._positions is None or \
+                self._positions_source_len != source_len:
+            predicate = self._predicate
+            self._positions = [idx for idx, row in enumerate(self._source)
+                               if predicate(row)]
+            self._positions_source_len = source_len
+        return self._positions
+
+    @property
+    def row_num(self):
+        return len(self.positions())
+
+    def row(self, index):
+        positions = self.positions()
+        return self._source[positions[self._normalize_index(index)]]
+
+
+class PositionView(TableView):
+
+    """位置视图，由源表格中指定位置的行组成，多用于分组、索引查询的结果
+    """
+
+    def __init__(self, source, positions, name=None):
+        TableView.__init__(self, source, name)
+        self._positions = positions
+
+    def __iter__(self):
+        source = self._source
+        if isinstance(source, BaseLocalTable):
+            data, row_type, mapping = \
+                source._data, source._row_type, source._mapping
+            for position in self._positions:
+                yield row_type(data[position], mapping)
+        else:
+            for position in self._positions:
+                yield source[position]
+
+    def positions(self):
+        return self._positions
+
+    def column(self, name):
+        column = self._source.column(name)
+        return [column[position] for position in self._positions]
+
+    @property
+    def row_num(self):
+        return len(self._positions)
+
+    def row(self, index):
+        return self._source[self._positions[self._normalize_index(index)]]
+
+
+class ProjectView(TableView):
+
+    """投影视图，只包含指定的列
+    """
+
+    def __init__(self, source, fields, name=None):
+        """
+        :param source 源表格
+        :param fields 列名列表
+        """
+        TableView.__init__(self, source, name)
+        if not fields:
+            raise InvalidArgumentException(u"投影视图至少需要包含一列")
+        self._fields = tuple(fields)
+        source_titles = {title.name: title for title in source.titles}
+        try:
+            self._titles = [source_titles[field] for field in self._fields]
+        except KeyError as e:
+            raise InvalidArgumentException(
+                u"源表格中不存在列'{}'".format(e.args[0]))
+        self._mapping = {field: idx for idx, field in enumerate(self._fields)}
+
+    @property
+    def titles(self):
+        return self._titles
+
+    def _project(self, row):
+        if len(self._fields) == 1:
+            return (row[self._fields[0]],)
+        return row[self._fields]
+
+    def __iter__(self):
+        mapping, project = self._mapping, self._project
+        for row in self._source:
+            yield ListRow(project(row), mapping)
+
+    @property
+    def row_num(self):
+        return len(self._source)
+
+    def row(self, index):
+        return ListRow(self._project(self._source[index]), self._mapping)
+
+
+class SliceView(TableView):
+
+    """切片视图，包含源表格[start, stop)区间内的行
+    """
+
+    def __init__(self, source, start=0, stop=None, name=None):
+        TableView.__init__(self, source, name)
+        if start < 0 or (stop is not None and stop < start):
+            raise InvalidArgumentException(
+                u"不合法的切片区间[{}, {})".format(start, stop))
+        self._start, self._stop = start, stop
+
+    def _bounds(self):
+        source_len = len(self._source)
+        stop = source_len if self._stop is None \
+            else min(self._stop, source_len)
+        return min(self._start, stop), stop
+
+    def __iter__(self):
+        start, stop = self._bounds()
+        return islice(self._source, start, stop)
+
+    @property
+    def row_num(self):
+        start, stop = self._bounds()
+        return stop - start
+
+    def row(self, index):
+        start, _ = self._bounds()
+        return self._source[start + self._normalize_index(index)]
+
+
+class ConcatView(TableView):
+
+    """拼接视图，按纵轴依次连接多个表格，类似于关系数据库中的union all
+    """
+
+    def __init__(self, tables, name, titles=0):
+        """
+        :param tables 要拼接的表格，元素可以是表格，
+                      也可以是元组，第一个元素为表格，后面为要拼接的列名
+        :param name 视图名称
+        :param titles 标题，可以是Title对象列表，也可以是数字，如果是数字那么将
+                      使用对应的拼接表标题
+        """
+        parts = []
+        for table in tables:
+            if isinstance(table, AbstractTable):
+                parts.append((table, None))
+            elif isinstance(table, SequenceCollectionType):
+                parts.append((table[0], tuple(table[1:])))
+            else:
+                raise InvalidArgumentException(
+                    u"不支持的拼接对象类型：{}".format(type(table).__name__))
+        if not parts:
+            raise InvalidArgumentException(u"至少需要一个要拼接的表格")
+        TableView.__init__(self, parts[0][0], name)
+
+        if isinstance(titles, (types.IntType, types.LongType)):
+            title_table, title_fields = parts[titles]
+            titles = [title for title in title_table.titles
+                      if title_fields is None or title.name in title_fields]
+        self._titles = titles
+        self._mapping = {title.name: idx for idx, title in enumerate(titles)}
+        self._parts = [
+            (table if fields is None else ProjectView(table, fields))
+            for table, fields in parts]
+
+    @property
+    def titles(self):
+        return self._titles
+
+    @property
+    def tables(self):
+        return self._parts
+
+    def __iter__(self):
+        mapping = self._mapping
+        for table in self._parts:
+            if isinstance(table, BaseLocalTable) and \
+                    table._row_type is ListRow:
+                # 直接复用底层的行数据
+                for row in table._data:
+                    yield ListRow(row, mapping)
+            else:
+                for row in table:
+                    yield ListRow(tuple(row), mapping)
+
+    @property
+    def row_num(self):
+        return sum(len(table) for table in self._parts)
+
+    def row(self, index):
+        index = self._normalize_index(index)
+        for table in self._parts:
+            table_len = len(table)
+            if index < table_len:
+                return ListRow(tuple(table[index]), self._mapping)
+            index -= table_len
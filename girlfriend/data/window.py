@@ -0,0 +1,317 @@
+# coding: utf-8
+
+"""分组Top N以及窗口函数
+Top N为每个分组维护一个大小为N的堆，只需要遍历一次表格；
+窗口函数作用于已经按照分区列、排序列排好序的数据，每个分区是连续的一段行，
+所有函数都在一次遍历中完成计算，滚动聚合在窗口滑动时增量更新，不会重复累加窗口内的行：
+
+    rn = row_number()
+    rk = rank()
+    prev_amount = lag(amount, 1)
+    next_amount = lead(amount)
+    amount_7 = rolling_sum(amount, 7)        最近7行（包括当前行）
+    avg_7d = rolling_avg(amount, "7d")       排序列在(当前值 - 7天, 当前值]之间的行
+
+时间跨度支持d(天)、h(小时)、m(分钟)、s(秒)几种单位。
+"""
+
+import re
+import ast
+import heapq
+import types
+from datetime import timedelta
+from collections import deque
+from itertools import izip
+from girlfriend.exception import InvalidArgumentException
+
+_ASSIGNMENT_REGEX = re.compile(r"^\s*([A-Za-z_]\w*)\s*=(?!=)(.*)$", re.S)
+
+_SPAN_REGEX = re.compile(r"^\s*(\d+)\s*([dhms])\s*$")
+
+_SPAN_UNITS = {
+    "d": "days",
+    "h": "hours",
+    "m": "minutes",
+    "s": "seconds",
+}
+
+
+def top_positions(keys, n, groups=None, ascending=False):
+    """计算每个分组中排序键最大（或最小）的N行
+    :param keys 每一行的排序键
+    :param n 每个分组保留的行数
+    :param groups 每一行的分组键，为None时整个表格作为一个分组
+    :param ascending 为True时保留排序键最小的N行
+    :return 行号列表，分组按照首次出现的顺序排列，组内按照排序键排列，
+            排序键相同时先出现的行优先
+    """
+    if n <= 0:
+        raise InvalidArgumentException(u"N必须为正整数")
+    heaps = {}
+    order = []
+    if groups is None:
+        groups = _repeat_none(len(keys))
+    wrap = _Descending if ascending else _identity
+    for position, (key, group) in enumerate(izip(keys, groups)):
+        heap = heaps.get(group)
+        if heap is None:
+            heap = heaps[group] = []
+            order.append(group)
+        # 堆顶为当前最应该被淘汰的行：排序键最差，排序键相同时位置最靠后
+        entry = (wrap(key), -position)
+        if len(heap) < n:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    positions = []
+    for group in order:
+        positions.extend(-position for _, position in
+                         sorted(heaps[group], reverse=True))
+    return positions
+
+
+def _repeat_none(size):
+    for _ in xrange(size):
+        yield None
+
+
+def _identity(value):
+    return value
+
+
+class _Descending(object):
+
+    """反转比较顺序，使得最小堆可以用来保留最小的N个值
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return other.value > self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __le__(self, other):
+        return other.value <= self.value
+
+    def __ge__(self, other):
+        return other.value >= self.value
+
+
+class WindowFunction(object):
+
+    """编译后的窗口函数
+    """
+
+    def __init__(self, target, function, args, source):
+        self._target = target
+        self._function = function
+        self._args = args
+        self._source = source
+
+    @property
+    def target(self):
+        return self._target
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def fields(self):
+        """引用的列名
+        """
+        return [arg.name for arg in self._args if isinstance(arg, _Field)]
+
+    def evaluate(self, columns, order_values, bounds):
+        """计算整列结果
+        :param columns {列名: 列数据}
+        :param order_values 排序列
+        :param bounds 各个分区的(起始行号, 结束行号)
+        """
+        args = [columns[arg.name] if isinstance(arg, _Field) else arg
+                for arg in self._args]
+        result = [None] * len(order_values)
+        for start, end in bounds:
+            self._function(result, start, end, order_values, *args)
+        return result
+
+
+class _Field(object):
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+def compile_window_function(source):
+    """编译"target = function(args)"形式的窗口函数
+    """
+    match = _ASSIGNMENT_REGEX.match(source)
+    if match is None:
+        raise InvalidArgumentException(
+            u"窗口函数'{}'缺少赋值目标".format(source))
+    target, call = match.group(1), match.group(2).strip()
+    try:
+        node = ast.parse(call, mode="eval").body
+    except SyntaxError:
+        raise InvalidArgumentException(
+            u"窗口函数'{}'格式不合法".format(source))
+    if not isinstance(node, ast.Call) or \
+            not isinstance(node.func, ast.Name) or \
+            node.keywords or node.starargs or node.kwargs:
+        raise InvalidArgumentException(
+            u"窗口函数'{}'格式不合法".format(source))
+    function = WINDOW_FUNCTIONS.get(node.func.id)
+    if function is None:
+        raise InvalidArgumentException(
+            u"不支持的窗口函数'{}'，只支持{}".format(
+                node.func.id, u"、".join(sorted(WINDOW_FUNCTIONS))))
+    args = [_argument(arg, source) for arg in node.args]
+    return WindowFunction(target, function, args, source)
+
+
+def _argument(node, source):
+    if isinstance(node, ast.Name):
+        if node.id == "None":
+            return None
+        return _Field(node.id)
+    if isinstance(node, ast.Num):
+        return node.n
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) \
+            and isinstance(node.operand, ast.Num):
+        return -node.operand.n
+    if isinstance(node, ast.Str):
+        match = _SPAN_REGEX.match(node.s)
+        if match is None:
+            raise InvalidArgumentException(
+                u"窗口函数'{}'中的时间跨度'{}'不合法".format(source, node.s))
+        return timedelta(**{_SPAN_UNITS[match.group(2)]:
+                            int(match.group(1))})
+    raise InvalidArgumentException(
+        u"窗口函数'{}'的参数不合法".format(source))
+
+
+def partition_bounds(partition_keys):
+    """根据已排序的分区键计算各个分区的(起始行号, 结束行号)
+    """
+    bounds = []
+    start, previous = 0, None
+    for position, key in enumerate(partition_keys):
+        if position and key != previous:
+            bounds.append((start, position))
+            start = position
+        previous = key
+    if partition_keys:
+        bounds.append((start, len(partition_keys)))
+    return bounds
+
+
+def _row_number(result, start, end, order):
+    result[start:end] = xrange(1, end - start + 1)
+
+
+def _rank(result, start, end, order):
+    rank = 1
+    for position in xrange(start, end):
+        if position > start and order[position] != order[position - 1]:
+            rank = position - start + 1
+        result[position] = rank
+
+
+def _dense_rank(result, start, end, order):
+    rank = 1
+    for position in xrange(start, end):
+        if position > start and order[position] != order[position - 1]:
+            rank += 1
+        result[position] = rank
+
+
+def _lag(result, start, end, order, column, offset=1, default=None):
+    for position in xrange(start, end):
+        source = position - offset
+        result[position] = column[source] \
+            if start <= source < end else default
+
+
+def _lead(result, start, end, order, column, offset=1, default=None):
+    _lag(result, start, end, order, column, -offset, default)
+
+
+def _rolling(start, end, order, column, window):
+    """滑动窗口，逐行生成窗口内非空值的(和, 数目)
+       window为整数时表示行数，为timedelta时表示排序列上的跨度
+    """
+    if isinstance(window, timedelta):
+        in_window = _span_checker(order, window)
+    elif isinstance(window, (types.IntType, types.LongType)) and window > 0:
+        def in_window(first, position):
+            return position - first < window
+    else:
+        raise InvalidArgumentException(
+            u"滚动窗口必须是正整数或者时间跨度")
+
+    total, count = 0, 0
+    values = deque()
+    first = start
+    for position in xrange(start, end):
+        value = column[position]
+        values.append(value)
+        if value is not None:
+            total += value
+            count += 1
+        while not in_window(first, position):
+            expired = values.popleft()
+            if expired is not None:
+                total -= expired
+                count -= 1
+            first += 1
+        yield total, count
+
+
+def _span_checker(order, span):
+    def in_window(first, position):
+        return order[position] - order[first] < span
+    return in_window
+
+
+def _rolling_sum(result, start, end, order, column, window):
+    for position, (total, count) in izip(
+            xrange(start, end), _rolling(start, end, order, column, window)):
+        result[position] = total if count else None
+
+
+def _rolling_avg(result, start, end, order, column, window):
+    for position, (total, count) in izip(
+            xrange(start, end), _rolling(start, end, order, column, window)):
+        result[position] = float(total) / count if count else None
+
+
+def _rolling_count(result, start, end, order, column, window):
+    for position, (_, count) in izip(
+            xrange(start, end), _rolling(start, end, order, column, window)):
+        result[position] = count
+
+
+WINDOW_FUNCTIONS = {
+    "row_number": _row_number,
+    "rank": _rank,
+    "dense_rank": _dense_rank,
+    "lag": _lag,
+    "lead": _lead,
+    "rolling_sum": _rolling_sum,
+    "rolling_avg": _rolling_avg,
+    "rolling_count": _rolling_count,
+}
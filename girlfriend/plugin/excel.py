@@ -56,18 +56,30 @@ class ExcelWriterPlugin(object):
 
     name = "write_excel"
 
-    def execute(self, context, filepath, sheets=None, workbook_handler=None):
+    def execute(self, context, filepath, sheets=None, workbook_handler=None,
+                constant_memory=False):
+        """
+        :param context 上下文对象
+        :param filepath 输出文件路径，以memory:开头时输出到上下文变量中
+        :param sheets SheetW列表
+        :param workbook_handler 接受workbook对象的回调函数
+        :param constant_memory 为True时逐行刷出数据，内存中只保留当前行，
+                               适合写入流式查询结果等大数据量的表格，
+                               此时每个sheet的行必须按顺序写入
+        """
+        options = {"constant_memory": True} if constant_memory else {}
         if filepath is None:
             # 不指定则随机生成文件名
             filepath = "/tmp/{}_{}.xlsx".format(
                 int(time.time()), random.randint(100, 999))
-            workbook = xlsxwriter.Workbook(filepath)
+            workbook = xlsxwriter.Workbook(filepath, options)
         elif filepath.startswith("memory:"):
             output = StringIO()
+            # 内存模式下无法使用临时文件逐行刷出
             workbook = xlsxwriter.Workbook(output, {'in_memory': True})
             context[filepath[len("memory:"):]] = output
         else:
-            workbook = xlsxwriter.Workbook(filepath)
+            workbook = xlsxwriter.Workbook(filepath, options)
 
         for sheet in sheets:
             sheet(context, workbook)
@@ -132,7 +144,8 @@ class SheetW(object):
         if self._sheet_name:
             sheet_name = self._sheet_name
         else:
-            sheet_name = self._table.name
+            # 序列以及流式查询结果没有名称，使用默认的Sheet名称
+            sheet_name = getattr(self._table, "name", None)
         if sheet_name is None:
             return workbook.add_worksheet()
         else:
@@ -148,8 +148,14 @@ class JSONW(AbstractDataWriter):
         pass
 
     def __call__(self, context):
+        if isinstance(self._object, types.FunctionType):
+            self._object = self._object(context)
+        elif isinstance(self._object, types.StringTypes):
+            self._object = context[self._object]
+
         if (self._style == "line" and self._path and
                 not self._path.startswith(HTTP_SCHEMA)):
+            # 逐行写入，可以直接消费迭代器或者流式查询结果
             with open(self._path, "w") as f:
                 for row in self._object:
                     row = self._handle_record(row)
@@ -159,11 +165,6 @@ class JSONW(AbstractDataWriter):
         # json文本
         json_text = ""
 
-        if isinstance(self._object, types.FunctionType):
-            self._object = self._object(context)
-        elif isinstance(self._object, types.StringTypes):
-            self._object = context[self._object]
-
         if self._style == "object":
             json_text = ujson.dumps(self._object)
 
@@ -3,18 +3,59 @@
 """基于SQLAlchemy的ORM插件
 """
 
+from __future__ import absolute_import
+
+import os
 import re
+import csv
+import gzip
+import time
 import ujson
 import types
+import sqlite3
+import Queue
+import hashlib
 import threading
 import collections
-from sqlalchemy import create_engine, text
+import cPickle as pickle
+from decimal import Decimal
+from datetime import date, time as time_
+from itertools import islice, izip
+from sqlalchemy import (
+    event,
+    create_engine,
+    text,
+    MetaData,
+    select,
+    and_,
+    func,
+    literal_column
+)
+from sqlalchemy.sql import table as table_clause, column as column_clause
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.query import Query as ORMQuery
-from sqlalchemy.pool import Pool, QueuePool, NullPool
+from sqlalchemy.pool import Pool, QueuePool, NullPool, SingletonThreadPool
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.ext.automap import automap_base
-from girlfriend.exception import InvalidStatusException
+from girlfriend.data.table import AbstractTable, ListTable, Title
+from girlfriend.data.tablefile import TableFileWriter
+from girlfriend.data.encoding import DEFAULT_ENCODE_THRESHOLD
+from girlfriend.plugin.data import AbstractDataWriter
+from girlfriend.exception import (
+    GirlFriendSysException,
+    InvalidStatusException,
+    InvalidArgumentException
+)
 from girlfriend.util.validating import Rule, be_json
+from girlfriend.util.concurrent import CountDownLatch
+from girlfriend.util.time import parse_time_unit
+from girlfriend.util.cache import (
+    MemoryCache,
+    SQLiteCache,
+    FileCache,
+    TieredCache
+)
 from girlfriend.util.lang import (
     args2fields,
     SequenceCollectionType,
@@ -48,7 +89,21 @@ class EngineManager(object):
              logic=be_json("connect_args")),
         # 该数据源使用的连接池策略
         Rule("pool_policy", required=False,
-             type=types.StringTypes, default=None)
+             type=types.StringTypes, default=None),
+        # automap反射结果的磁盘缓存目录，不配置时每个进程都需要重新反射
+        Rule("metadata_cache", required=False,
+             type=types.StringTypes, default=None),
+        # 反射结果缓存的过期时间，比如1d，不配置时只在schema_version变化时失效
+        Rule("metadata_cache_ttl", required=False,
+             type=(int, types.StringTypes), regex=r"^\d+[dhmsDHMS]?$",
+             default=None),
+        # 表结构版本，变更表结构之后修改此项即可使缓存的反射结果失效
+        Rule("schema_version", required=False,
+             type=types.StringTypes + (int,), default=None),
+        # 是否在sys_prepare阶段创建引擎并预先并发建立连接池中的连接，
+        # 否则引擎在第一次使用时才创建
+        Rule("warmup", required=False, type=(bool,) + types.StringTypes,
+             regex=r"^(?i)(true|false|yes|no|on|off|1|0)$", default=False)
     )
 
     # 连接池的配置项验证规则，section名称皆以dbpool_开头
@@ -70,6 +125,9 @@ class EngineManager(object):
         self._engines = {}
         self._status = EngineManager.STATUS_UNINIT
         self._validated = False
+        self._config = None
+        self._pool_config = None
+        self._lock = threading.Lock()
 
     def validate_config(self, config):
         """统一对配置进行验证，避免各个插件单独验证
@@ -95,16 +153,16 @@ class EngineManager(object):
                 config[section][rule.name] = rule.default
 
     def init_all(self, config):
-        """统一初始化
+        """统一初始化，引擎在第一次使用时才会创建，配置了warmup的引擎除外
         """
         if self._status != EngineManager.STATUS_UNINIT:
             return
-        all_pool_config = self._load_db_pool_config(config)
-        for section in config.prefix("db_"):
-            engine_name = section.split("_", 1)[1]
-            engine = self._create_engine(config, section, all_pool_config)
-            self._engines[engine_name] = EngineContainer(engine)
+        self._config = config
+        self._pool_config = self._load_db_pool_config(config)
         self._status = EngineManager.STATUS_OK
+        for section in config.prefix("db_"):
+            if _is_true(config[section].get("warmup")):
+                self.engine(section.split("_", 1)[1]).warmup()
 
     def _load_db_pool_config(self, config):
         """对连接池进行初始化
@@ -147,11 +205,36 @@ class EngineManager(object):
         )
 
     def engine(self, engine_name):
-        """根据引擎名字来获取引擎
+        """根据引擎名字来获取引擎，第一次获取时创建
         """
         if self._status != EngineManager.STATUS_OK:
             raise InvalidStatusException(u"Engine尚未初始化")
-        return self._engines[engine_name]
+        engine_container = self._engines.get(engine_name)
+        if engine_container is not None:
+            return engine_container
+        with self._lock:
+            engine_container = self._engines.get(engine_name)
+            if engine_container is None:
+                section = "db_" + engine_name
+                if self._config is None or section not in self._config:
+                    raise KeyError(engine_name)
+                engine = self._create_engine(
+                    self._config, section, self._pool_config)
+                config_items = self._config[section]
+                engine_container = EngineContainer(
+                    engine,
+                    metadata_cache=config_items.get("metadata_cache"),
+                    metadata_cache_ttl=config_items.get("metadata_cache_ttl"),
+                    schema_version=config_items.get("schema_version"))
+                self._engines[engine_name] = engine_container
+            return engine_container
+
+    def pool_stats(self):
+        """已经创建的引擎的连接池指标
+        :return {引擎名称: 指标字典}
+        """
+        return {engine_name: engine_container.pool_stats()
+                for engine_name, engine_container in self._engines.items()}
 
     def dispose_all(self):
         """统一对引擎进行销毁
@@ -165,20 +248,195 @@ class EngineManager(object):
 _engine_manager = EngineManager()
 
 
+def _is_true(value):
+    if isinstance(value, types.StringTypes):
+        return value.lower() in ("true", "yes", "on", "1")
+    return bool(value)
+
+
+class PoolMetrics(object):
+
+    """连接池指标，通过连接池事件记录连接的借出与归还，
+       并对获取连接的过程计时，QueuePool中没有空闲连接并且溢出已达上限时记为一次等待。
+       指标绑定在引擎上，engine.dispose()重建连接池之后继续统计新的连接池
+    """
+
+    def __init__(self, engine):
+        self._lock = threading.Lock()
+        self.connects = 0  # 新建的DBAPI连接数目
+        self.checkouts = 0  # 借出连接的次数
+        self.checked_out = 0  # 当前借出的连接数目
+        self.max_checked_out = 0  # 同时借出连接数目的最大值
+        self.waits = 0  # 需要等待其它连接归还的次数
+        self.wait_time = 0.0  # 累计等待时间，单位为秒
+        self.max_wait_time = 0.0  # 最长的一次等待时间
+        self.timeouts = 0  # 等待超时的次数
+        self.max_overflow = 0  # 溢出连接数目的最大值
+        self._engine = engine
+        # 连接池事件注册在引擎上，重建的连接池会沿用这些监听器
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "engine_disposed", self._on_engine_disposed)
+        self._instrument(engine.pool)
+
+    def _instrument(self, pool):
+        # 连接池没有在等待连接之前触发的事件，只能包装内部方法_do_get进行计时，
+        # 依赖SQLAlchemy的私有接口，没有该方法的连接池只统计事件类指标
+        do_get = getattr(pool, "_do_get", None)
+        if do_get is None:
+            return
+
+        def timed_do_get():
+            saturated = self._saturated(pool)
+            start = time.time()
+            try:
+                return do_get()
+            except Exception:
+                if saturated:
+                    with self._lock:
+                        self.timeouts += 1
+                raise
+            finally:
+                elapsed = time.time() - start
+                with self._lock:
+                    if saturated:
+                        self.waits += 1
+                        self.wait_time += elapsed
+                        if elapsed > self.max_wait_time:
+                            self.max_wait_time = elapsed
+                    if isinstance(pool, QueuePool) and \
+                            pool.overflow() > self.max_overflow:
+                        self.max_overflow = pool.overflow()
+
+        pool._do_get = timed_do_get
+
+    def _saturated(self, pool):
+        if not isinstance(pool, QueuePool):
+            return False
+        # QueuePool没有公开溢出上限，读取私有属性_max_overflow，-1表示不限制
+        max_overflow = getattr(pool, "_max_overflow", -1)
+        return pool.checkedin() == 0 and \
+            max_overflow > -1 and pool.overflow() >= max_overflow
+
+    def _on_engine_disposed(self, engine):
+        self._instrument(engine.pool)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record,
+                     connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            if self.checked_out > self.max_checked_out:
+                self.max_checked_out = self.checked_out
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            if self.checked_out > 0:
+                self.checked_out -= 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+                "max_wait_time": self.max_wait_time,
+                "timeouts": self.timeouts,
+                "max_overflow": self.max_overflow,
+            }
+        pool = self._engine.pool
+        if isinstance(pool, QueuePool):
+            stats["pool_size"] = pool.size()
+            stats["checked_in"] = pool.checkedin()
+            stats["overflow"] = max(pool.overflow(), 0)
+        return stats
+
+
 class EngineContainer(object):
 
     """存储engine对象，并封装/代理一些与engine对象有关的操作
     """
 
-    def __init__(self, engine):
+    def __init__(self, engine, metadata_cache=None, metadata_cache_ttl=None,
+                 schema_version=None):
+        """
+        :param engine SQLAlchemy引擎
+        :param metadata_cache 反射结果的磁盘缓存目录
+        :param metadata_cache_ttl 反射结果缓存的过期时间
+        :param schema_version 表结构版本，与缓存中的版本不一致时重新反射
+        """
         self.engine = engine
         self.sessionmaker = sessionmaker(bind=engine)
         self._base_model_class = None
         self._base_model_class_sem = threading.Lock()
+        self._metadata_cache = None
+        if metadata_cache:
+            self._metadata_cache = FileCache(metadata_cache)
+        self._metadata_cache_ttl = None
+        if metadata_cache_ttl is not None:
+            self._metadata_cache_ttl = _ttl_seconds(metadata_cache_ttl)
+        self._schema_version = schema_version
+        self._metadata = None
+        self._metadata_expire_time = None
+        self._automap_base = None
+        self._pool_metrics = PoolMetrics(engine)
 
     def session(self):
         return self.sessionmaker()
 
+    @property
+    def concurrency(self):
+        """并发查询的上限，QueuePool与连接池大小一致，
+           SingletonThreadPool中每个线程独占连接（比如SQLite内存数据库），返回0表示只能在当前线程中执行
+        """
+        pool = self.engine.pool
+        if isinstance(pool, QueuePool):
+            return pool.size()
+        if isinstance(pool, SingletonThreadPool):
+            return 0
+        return DEFAULT_CONCURRENCY
+
+    def warmup(self, size=None):
+        """并发建立连接并归还到连接池中，避免第一批查询承担建立连接的开销
+        :param size 建立的连接数目，默认为连接池大小
+        :return 建立的连接数目
+        """
+        if size is None:
+            pool = self.engine.pool
+            size = pool.size() if isinstance(pool, QueuePool) else 1
+        if size <= 0:
+            return 0
+        # 所有线程都借到连接之后才归还，保证每次借出的都是不同的连接；
+        # 在借出连接的线程中归还，某些驱动（比如SQLite）的连接不能跨线程使用
+        latch = CountDownLatch(size)
+
+        def connect():
+            try:
+                connection = self.engine.raw_connection()
+            finally:
+                latch.count_down()
+            latch.await()
+            connection.close()
+
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            futures = [executor.submit(connect) for _ in xrange(size)]
+        for future in futures:
+            future.result()
+        return size
+
+    def pool_stats(self):
+        """连接池指标：当前借出的连接、等待次数与时间、溢出数目等
+        """
+        return self._pool_metrics.snapshot()
+
     @property
     def base_model_class(self):
         if self._base_model_class is not None:
@@ -192,6 +450,65 @@ class EngineContainer(object):
             self._base_model_class.prepare(self.engine, reflect=True)
             return self._base_model_class
 
+    def automap_class(self, table_name):
+        """获取表对应的automap映射类，只反射用到的表（以及其外键引用的表），
+           配置了反射结果缓存时，已经反射过的表在进程重启之后无需再次反射
+        :return 映射类，表不存在或者没有主键时返回None
+        """
+        with self._base_model_class_sem:
+            if self._metadata is None:
+                self._load_metadata()
+            if table_name not in self._metadata.tables:
+                try:
+                    self._metadata.reflect(self.engine, only=[table_name])
+                except InvalidRequestError:
+                    # 表不存在
+                    return None
+                self._save_metadata()
+                self._automap_base = None
+            if self._automap_base is None:
+                base = automap_base(metadata=self._metadata)
+                base.prepare()
+                self._automap_base = base
+            return getattr(self._automap_base.classes, table_name, None)
+
+    def invalidate_metadata(self):
+        """丢弃已经反射以及缓存的表结构
+        """
+        with self._base_model_class_sem:
+            self._metadata, self._automap_base = MetaData(), None
+            self._metadata_expire_time = None
+            if self._metadata_cache is not None:
+                self._metadata_cache.delete(self._metadata_cache_key())
+
+    def _metadata_cache_key(self):
+        return "metadata:{}".format(self.engine.url)
+
+    def _load_metadata(self):
+        self._metadata = MetaData()
+        if self._metadata_cache is None:
+            return
+        entry = self._metadata_cache.get_entry(self._metadata_cache_key())
+        if entry is None:
+            return
+        (schema_version, metadata), expire_time, _ = entry
+        if schema_version == self._schema_version:
+            self._metadata, self._metadata_expire_time = metadata, expire_time
+
+    def _save_metadata(self):
+        if self._metadata_cache is None:
+            return
+        # 新增反射的表不会延长已缓存的表结构的过期时间
+        if self._metadata_expire_time is not None:
+            ttl = max(self._metadata_expire_time - time.time(), 1)
+        else:
+            ttl = self._metadata_cache_ttl
+            if ttl is not None:
+                self._metadata_expire_time = time.time() + ttl
+        self._metadata_cache.set(
+            self._metadata_cache_key(),
+            (self._schema_version, self._metadata), ttl)
+
 
 class OrmQueryPlugin(object):
 
@@ -201,26 +518,303 @@ class OrmQueryPlugin(object):
     def config_validator(config):
         """配置验证器
         """
-        global _engine_manager
+        global _engine_manager, _query_cache_manager
         _engine_manager.validate_config(config)
+        _query_cache_manager.validate_config(config)
 
     def __init__(self):
         self._engines = {}
 
     def sys_prepare(self, config):
-        global _engine_manager
+        global _engine_manager, _query_cache_manager
         _engine_manager.init_all(config)
+        _query_cache_manager.init(config)
 
-    def execute(self, context, *exec_list):
-        # 按顺序执行exec_list
-        return [exec_(context) for exec_ in exec_list]
+    def execute(self, context, *exec_list, **options):
+        """
+        :param context 上下文对象
+        :param exec_list 要执行的Query、SQL对象
+        :param options 以字典形式传递参数时可以指定：
+                       queries 要执行的Query、SQL对象列表，追加在exec_list之后
+                       parallel 为True时并发执行，每个引擎的并发数不超过连接池大小，
+                                结果仍然与查询的顺序一致，所有失败的查询会汇总为
+                                QueryExecutionException抛出
+        """
+        exec_list = list(exec_list) + list(options.pop("queries", ()))
+        parallel = options.pop("parallel", False)
+        if options:
+            raise InvalidArgumentException(
+                u"不支持的参数：{}".format(u"、".join(options)))
+        if not parallel or len(exec_list) <= 1:
+            # 按顺序执行exec_list
+            return [exec_(context) for exec_ in exec_list]
+        return self._execute_parallel(context, exec_list)
 
-    def sys_cleanup(self, config):
+    def _execute_parallel(self, context, exec_list):
         global _engine_manager
+
+        # 按照引擎分组，每个引擎使用独立的、与连接池大小一致的线程池
+        groups, inline = collections.OrderedDict(), []
+        for idx, exec_ in enumerate(exec_list):
+            engine_name = getattr(exec_, "_engine_name", None)
+            if engine_name is None or \
+                    not _engine_manager.engine(engine_name).concurrency:
+                inline.append((idx, exec_))
+            else:
+                groups.setdefault(engine_name, []).append((idx, exec_))
+
+        results, errors = [None] * len(exec_list), []
+        executors, futures = [], []
+        try:
+            for engine_name, items in groups.iteritems():
+                max_workers = min(
+                    _engine_manager.engine(engine_name).concurrency,
+                    len(items))
+                executor = ThreadPoolExecutor(max_workers=max_workers)
+                executors.append(executor)
+                futures.extend((idx, executor.submit(exec_, context))
+                               for idx, exec_ in items)
+            for idx, exec_ in inline:
+                try:
+                    results[idx] = exec_(context)
+                except Exception as e:
+                    errors.append((idx, e))
+            for idx, future in futures:
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    errors.append((idx, e))
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+
+        if errors:
+            raise QueryExecutionException(sorted(errors))
+        return results
+
+    def sys_cleanup(self, config):
+        global _engine_manager, _query_cache_manager
         _engine_manager.dispose_all()
+        _query_cache_manager.dispose()
+
+
+class QueryExecutionException(GirlFriendSysException):
+
+    """并发执行查询时，汇总所有失败的查询
+    """
+
+    def __init__(self, errors):
+        """
+        :param errors (查询序号, 异常对象)列表
+        """
+        self.errors = errors
+        GirlFriendSysException.__init__(
+            self, u"{}个查询执行失败：{}".format(len(errors), u"；".join(
+                u"第{}个查询：{}".format(idx, _error_message(error))
+                for idx, error in errors)))
+
+
+def _error_message(error):
+    try:
+        return unicode(error)
+    except UnicodeError:
+        return str(error).decode("utf-8", "replace")
+
+
+class QueryCacheManager(object):
+
+    """查询结果缓存管理，缓存键由引擎名、规范化的SQL文本以及绑定参数计算得出，
+       可以在查询上通过cache_ttl单独开启，也可以通过query_cache配置节统一开启：
+
+       [query_cache]
+       store = memory,sqlite          memory、sqlite、file，以逗号分隔时组合为多级缓存
+       path = /tmp/gf_query_cache.db  sqlite的文件路径或者file缓存的目录
+       max_entries = 1024             内存缓存的容量
+       ttl = 5m                       默认过期时间，配置后查询默认开启缓存
+       engines = replica,report       默认开启缓存的引擎，不配置表示所有引擎
+    """
+
+    SECTION = "query_cache"
+
+    config_rules = (
+        Rule("store", required=False, type=types.StringTypes,
+             regex=r"^\s*(memory|sqlite|file)"
+                   r"(\s*,\s*(memory|sqlite|file))*\s*$",
+             default="memory"),
+        Rule("path", required=False, type=types.StringTypes, default=None),
+        Rule("max_entries", required=False, type=(int, types.StringTypes),
+             regex=r"^\d+$", default=1024),
+        Rule("ttl", required=False, type=(int, types.StringTypes),
+             regex=r"^\d+[dhmsDHMS]?$", default=None),
+        Rule("engines", required=False, type=types.StringTypes, default=None),
+    )
+
+    def __init__(self):
+        self._cache = None
+        self._ttl = None
+        self._engines = None
+        self._lock = threading.Lock()
+
+    def validate_config(self, config):
+        if QueryCacheManager.SECTION not in config:
+            return
+        config_items = config[QueryCacheManager.SECTION]
+        for rule in QueryCacheManager.config_rules:
+            item_value = config_items.get(rule.name)
+            rule.validate(item_value)
+            if item_value is None and not rule.required:
+                config_items[rule.name] = rule.default
+        stores = _split_names(config_items["store"])
+        if len(stores) != len(set(stores)) or \
+                "sqlite" in stores and "file" in stores:
+            raise InvalidArgumentException(
+                u"query_cache的store不能重复，并且sqlite与file只能选择一种")
+        if ("sqlite" in stores or "file" in stores) and \
+                not config_items["path"]:
+            raise InvalidArgumentException(
+                u"query_cache使用sqlite或者file存储时必须指定path")
+
+    def init(self, config):
+        if self._cache is not None or \
+                QueryCacheManager.SECTION not in config:
+            return
+        self.validate_config(config)
+        config_items = config[QueryCacheManager.SECTION]
+        caches = []
+        for store in _split_names(config_items["store"]):
+            if store == "memory":
+                caches.append(MemoryCache(int(config_items["max_entries"])))
+            elif store == "sqlite":
+                caches.append(SQLiteCache(config_items["path"]))
+            else:
+                caches.append(FileCache(config_items["path"]))
+        self._cache = caches[0] if len(caches) == 1 else TieredCache(*caches)
+        if config_items["ttl"] is not None:
+            self._ttl = _ttl_seconds(config_items["ttl"])
+        if config_items["engines"]:
+            self._engines = set(_split_names(config_items["engines"]))
+
+    @property
+    def cache(self):
+        """全局的查询缓存，没有配置时使用进程内的MemoryCache
+        """
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = MemoryCache()
+        return self._cache
+
+    def resolve(self, engine_name, cache=None, cache_ttl=None):
+        """确定查询所使用的缓存以及过期时间
+        :param engine_name 引擎名称
+        :param cache 查询单独指定的缓存对象
+        :param cache_ttl 查询单独指定的过期时间，为None时遵循配置，为0时不使用缓存
+        :return (缓存对象, 过期时间)，不使用缓存时返回(None, None)
+        """
+        if cache_ttl is None:
+            if self._ttl is None or (self._engines is not None and
+                                     engine_name not in self._engines):
+                return None, None
+            ttl = self._ttl
+        elif not cache_ttl:
+            return None, None
+        else:
+            ttl = _ttl_seconds(cache_ttl)
+        return (self.cache if cache is None else cache), ttl
+
+    def invalidate(self, engine_name=None, sql=None, params=None):
+        """失效缓存
+        :param engine_name 引擎名称，只指定引擎时失效该引擎的全部缓存，都不指定时清空缓存
+        :param sql 失效某条语句的缓存，此时必须同时指定引擎名称
+        :param params 语句的绑定参数
+        """
+        if self._cache is None:
+            return
+        if sql is None:
+            self._cache.invalidate(engine_name)
+            return
+        if engine_name is None:
+            raise InvalidArgumentException(u"按语句失效缓存时必须指定引擎名称")
+        self._cache.delete(query_cache_key(engine_name, sql, params))
+
+    def dispose(self):
+        with self._lock:
+            if self._cache is not None:
+                self._cache.close()
+            self._cache, self._ttl, self._engines = None, None, None
+
+
+_query_cache_manager = QueryCacheManager()
+
+
+# SQL中的字符串常量以及带引号的标识符
+_SQL_QUOTED_REGEX = re.compile(
+    r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")""", re.S)
+
+_WHITESPACE_REGEX = re.compile(r"\s+")
+
+
+def query_cache_key(engine_name, sql, params=None):
+    """查询缓存键：引擎名、合并空白之后的SQL文本以及按名称排序的参数的摘要
+    """
+    if params:
+        params = sorted(params.iteritems())
+    if isinstance(sql, unicode):
+        sql = sql.encode("utf-8")
+    return hashlib.sha1(repr(
+        (engine_name, _normalize_sql(sql), params))).hexdigest()
+
+
+def _normalize_sql(sql):
+    """合并引号之外的连续空白，引号内的字符串常量保持原样
+    """
+    parts = _SQL_QUOTED_REGEX.split(sql)
+    # split的结果中奇数位置为引号内的部分
+    for idx in xrange(0, len(parts), 2):
+        parts[idx] = _WHITESPACE_REGEX.sub(" ", parts[idx])
+    return "".join(parts).strip()
+
+
+def invalidate_query_cache(engine_name=None, sql=None, params=None):
+    """显式失效查询缓存，参数含义同QueryCacheManager.invalidate
+    """
+    global _query_cache_manager
+    _query_cache_manager.invalidate(engine_name, sql, params)
+
+
+def _split_names(names):
+    return [name.strip() for name in names.split(",") if name.strip()]
+
+
+def _ttl_seconds(ttl):
+    if isinstance(ttl, types.StringTypes):
+        if ttl.isdigit():
+            return int(ttl)
+        return parse_time_unit(ttl)
+    return ttl
+
+
+def _cached_rows(cache, ttl, engine_name, key, loader):
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+    rows = loader()
+    try:
+        cache.set(key, rows, ttl, engine_name)
+    except (pickle.PicklingError, TypeError):
+        # 无法序列化的结果（比如automap动态生成的类）不进入持久化缓存
+        pass
+    return rows
+
 
 _SELECT_STATEMENT_REGEX = re.compile("^select ", re.IGNORECASE)
 
+# 流式查询时默认每批读取的行数
+DEFAULT_FETCH_SIZE = 1000
+
+# 无法从连接池得知大小时，每个引擎默认的并发查询数目
+DEFAULT_CONCURRENCY = 4
+
 
 class Query(object):
 
@@ -230,7 +824,9 @@ class Query(object):
     @args2fields()
     def __init__(self, engine_name, variable_name,
                  query_items, query=None, order_by=None, group_by=None,
-                 params=None, row_handler=None, result_wrapper=None):
+                 params=None, row_handler=None, result_wrapper=None,
+                 stream=False, fetch_size=DEFAULT_FETCH_SIZE,
+                 cache=None, cache_ttl=None):
         """
         :param engine_name   使用的引擎名称
         :param variable_name 查询的结果将以此为变量名写入context
@@ -239,8 +835,18 @@ class Query(object):
         :param query         接受回调函数或者是SQL以及字符串描述的查询条件
         :param params        如果基于文本或者SQL查询，那么可以通过此字段来传递参数
         :param row_handler   行处理器，针对每一行做格式转换操作
-        :param result_wrapper 用于对查询结果进行包装，比如将查询结果包装成table对象
+        :param result_wrapper 用于对查询结果进行包装，比如将查询结果包装成table对象，
+                              流式模式下接受的是ResultStream对象
+        :param stream        为True时使用服务端游标，结果为按批次读取的ResultStream，
+                             不会一次性将全部结果加载到内存中
+        :param fetch_size    流式模式下每批读取的行数
+        :param cache         缓存查询结果所使用的缓存对象，默认使用全局的查询缓存
+        :param cache_ttl     缓存过期时间，秒数或者"5m"这样的时间单位，
+                             为None时遵循query_cache配置，为0时不使用缓存，
+                             缓存的是行处理之前的查询结果，不能与stream同时使用
         """
+        if stream and cache_ttl:
+            raise InvalidArgumentException(u"流式查询不能使用结果缓存")
         if isinstance(order_by, str):
             self._order_by = text(order_by)
 
@@ -267,6 +873,7 @@ class Query(object):
                 for key in self._params}
 
         session = engine.session()
+        streaming = False
         try:
             query = None
             if isinstance(self._query, types.StringTypes):
@@ -293,20 +900,25 @@ class Query(object):
             else:
                 query = self._build_query(engine, session, query_items)
 
-            result = self._build_result(query)
+            if self._stream:
+                result = self._build_stream(query, session)
+                streaming = True
+            else:
+                result = self._build_result(query, engine)
             context[self._variable_name] = result
             return result
         finally:
-            session.close()
+            # 流式结果在遍历结束或者关闭时才释放会话
+            if not streaming:
+                session.close()
 
     def automap(self, engine, query_item_str):
-        base = engine.base_model_class
         if "." in query_item_str:
             table_name, field_name = query_item_str.split(".", 1)
-            clazz = getattr(base.classes, table_name, None)
+            clazz = engine.automap_class(table_name)
             return getattr(clazz, field_name, None)
         else:
-            return getattr(base.classes, query_item_str, None)
+            return engine.automap_class(query_item_str)
 
     def _build_query(self, engine, session, query_items):
         query = session.query(*query_items)
@@ -325,15 +937,39 @@ class Query(object):
             query = query.params(**self._params)
         return query
 
-    def _build_result(self, query):
+    def _build_result(self, query, engine):
+        global _query_cache_manager
+        cache, ttl = _query_cache_manager.resolve(
+            self._engine_name, self._cache, self._cache_ttl)
+        if cache is not None:
+            compiled = query.statement.compile(dialect=engine.engine.dialect)
+            params = dict(compiled.params)
+            params.update(self._params or {})
+            key = query_cache_key(self._engine_name, unicode(compiled), params)
+            query = _cached_rows(cache, ttl, self._engine_name, key,
+                                 lambda: tuple(query))
         if self._row_handler:
             result = tuple(self._row_handler(row) for row in query)
+        elif cache is not None:
+            result = list(query)
         else:
             result = query.all()
         if self._result_wrapper is not None:
             return self._result_wrapper(result)
         return result
 
+    def _build_stream(self, query, session):
+        rows = iter(query.yield_per(self._fetch_size))
+        fetch_size = self._fetch_size
+        batches = iter(lambda: list(islice(rows, fetch_size)), [])
+        keys = None if self._row_handler else \
+            [column["name"] for column in query.column_descriptions]
+        result = ResultStream(batches, self._row_handler, session.close,
+                              keys=keys)
+        if self._result_wrapper is not None:
+            return self._result_wrapper(result)
+        return result
+
 
 class SQL(object):
 
@@ -342,7 +978,24 @@ class SQL(object):
 
     @args2fields()
     def __init__(self, engine_name, variable_name, sql, params=None,
-                 row_handler=None, result_wrapper=None):
+                 row_handler=None, result_wrapper=None,
+                 stream=False, fetch_size=DEFAULT_FETCH_SIZE,
+                 cache=None, cache_ttl=None):
+        """
+        :param engine_name 使用的引擎名称
+        :param variable_name 查询的结果将以此为变量名写入context
+        :param sql SQL语句，非查询语句可以是语句列表，进行批量执行
+        :param params SQL参数，批量执行时为与语句一一对应的参数列表
+        :param row_handler 行处理器，针对每一行做格式转换操作
+        :param result_wrapper 用于对查询结果进行包装，比如将查询结果包装成table对象
+        :param stream 为True时查询语句使用服务端游标，结果为按批次读取的ResultStream
+        :param fetch_size 流式模式下每批读取的行数
+        :param cache 缓存查询结果所使用的缓存对象，默认使用全局的查询缓存
+        :param cache_ttl 查询语句的缓存过期时间，秒数或者"5m"这样的时间单位，
+                         为None时遵循query_cache配置，为0时不使用缓存
+        """
+        if stream and cache_ttl:
+            raise InvalidArgumentException(u"流式查询不能使用结果缓存")
         if params is None:
             self._params = {}
 
@@ -372,21 +1025,973 @@ class SQL(object):
                 session.close()
 
     def _execute_select_statement(self, session, context):
-        try:
-            result_proxy = session.execute(self._sql, self._params)
-            result = None
+        global _query_cache_manager
+        if self._stream:
+            return self._execute_streaming_statement(session, context)
+        cache, ttl = _query_cache_manager.resolve(
+            self._engine_name, self._cache, self._cache_ttl)
+        if cache is not None:
+            key = query_cache_key(self._engine_name, self._sql, self._params)
+            try:
+                # 会话在执行语句时才获取连接，缓存命中时不会占用连接
+                keys, rows = _cached_rows(
+                    cache, ttl, self._engine_name, key,
+                    lambda: self._fetch_rows(session))
+            finally:
+                session.close()
             if self._row_handler is not None:
-                result = tuple(self._row_handler(row) for row in result_proxy)
+                row_class = _cached_row_class(keys)
+                result = tuple(self._row_handler(row_class(row))
+                               for row in rows)
             else:
-                result = tuple(tuple(row) for row in result_proxy)
-            if self._result_wrapper is not None:
-                result = self._result_wrapper(result)
-            context[self._variable_name] = result
+                result = rows
+        else:
+            try:
+                result_proxy = session.execute(self._sql, self._params)
+                result = None
+                if self._row_handler is not None:
+                    result = tuple(self._row_handler(row)
+                                   for row in result_proxy)
+                else:
+                    result = tuple(tuple(row) for row in result_proxy)
+                result_proxy.close()
+            finally:
+                session.close()
+        if self._result_wrapper is not None:
+            result = self._result_wrapper(result)
+        context[self._variable_name] = result
+        return result
+
+    def _fetch_rows(self, session):
+        """读取(列名, 行元组)，用于写入缓存
+        """
+        result_proxy = session.execute(self._sql, self._params)
+        keys = tuple(result_proxy.keys())
+        rows = tuple(tuple(row) for row in result_proxy)
+        result_proxy.close()
+        return keys, rows
+
+    def _execute_streaming_statement(self, session, context):
+        try:
+            statement = text(self._sql).execution_options(stream_results=True)
+            result_proxy = session.execute(statement, self._params)
+        except Exception:
+            session.close()
+            raise
+        fetch_size = self._fetch_size
+
+        def close():
             result_proxy.close()
-            return result
-        finally:
             session.close()
 
+        result = ResultStream(
+            iter(lambda: result_proxy.fetchmany(fetch_size), []),
+            self._row_handler or tuple, close,
+            keys=None if self._row_handler else list(result_proxy.keys()))
+        if self._result_wrapper is not None:
+            result = self._result_wrapper(result)
+        context[self._variable_name] = result
+        return result
+
+
+class KeysetQuery(object):
+
+    """按照主键分页读取大表，每一页为一条独立的语句：
+       SELECT ... WHERE key > :last ORDER BY key LIMIT :page_size
+       与OFFSET分页不同，越往后的页并不会越慢，也不会持有长时间运行的事务。
+       partitions大于1时先查询主键的最小、最大值，将主键范围均分为多个分区，
+       每个分区在独立的连接上并发读取，结果仍然按照主键的顺序合并：
+
+       KeysetQuery("mysql", "orders", "orders", "id",
+                   columns=["id", "shop_id", "amount"],
+                   where="created_at >= :day", params={"day": "$day"},
+                   page_size=5000, partitions=4,
+                   result_wrapper=TableWrapper("orders", titles=[...]))
+    """
+
+    @args2fields()
+    def __init__(self, engine_name, variable_name, table, key, columns=None,
+                 where=None, params=None, page_size=DEFAULT_FETCH_SIZE,
+                 partitions=1, row_handler=None, result_wrapper=None,
+                 stream=False, prefetch=2):
+        """
+        :param engine_name 使用的引擎名称
+        :param variable_name 查询的结果将以此为变量名写入context
+        :param table 表名
+        :param key 分页使用的主键列，必须唯一，并发读取时必须为整数
+        :param columns 查询的列，默认为全部列
+        :param where 额外的过滤条件，可以使用:name形式的参数
+        :param params 过滤条件的参数，可以引用context变量
+        :param page_size 每页读取的行数
+        :param partitions 并发读取的分区数目
+        :param row_handler 行处理器，针对每一行做格式转换操作
+        :param result_wrapper 用于对查询结果进行包装，比如将查询结果包装成table对象，
+                              流式模式下接受的是ResultStream对象
+        :param stream 为True时返回按页读取的ResultStream，不会一次性加载全部结果
+        :param prefetch 并发读取时每个分区预先读取的页数
+        """
+        if page_size <= 0 or partitions <= 0 or prefetch <= 0:
+            raise InvalidArgumentException(
+                u"page_size、partitions以及prefetch必须为正整数")
+
+    def __call__(self, context):
+        global _engine_manager
+        engine = _engine_manager.engine(self._engine_name).engine
+        params = {key: parse_context_var(context, value)
+                  for key, value in (self._params or {}).iteritems()}
+        batches = self._batches(engine, params)
+        result = ResultStream(batches, self._row_handler or tuple,
+                              batches.close,
+                              keys=None if self._row_handler is not None
+                              else self._columns)
+        if not self._stream:
+            result = tuple(result)
+        if self._result_wrapper is not None:
+            result = self._result_wrapper(result)
+        context[self._variable_name] = result
+        return result
+
+    def _ranges(self, connection, table, key_column, where, params):
+        """将主键范围均分为[下界, 上界)的分区，None表示没有边界
+        """
+        if self._partitions == 1:
+            return [(None, None)]
+        statement = select([func.min(key_column), func.max(key_column)])\
+            .select_from(table)
+        if where is not None:
+            statement = statement.where(where)
+        min_key, max_key = connection.execute(statement, params).first()
+        if min_key is None:
+            return [(None, None)]
+        if not isinstance(min_key, (types.IntType, types.LongType)):
+            raise InvalidArgumentException(
+                u"只有整数主键才能分区并发读取，'{}'的类型为{}".format(
+                    self._key, type(min_key).__name__))
+        step = (max_key - min_key) / self._partitions + 1
+        bounds = [min_key + step * idx for idx in xrange(1, self._partitions)
+                  if min_key + step * idx <= max_key]
+        return zip([None] + bounds, bounds + [None])
+
+    def _batches(self, engine, params):
+        table, columns, extras = _selectable(
+            self._table, self._columns, (self._key,))
+        key_column, extra_key = table.c[self._key], bool(extras)
+        where = text(self._where) if self._where else None
+        connection = engine.connect()
+        try:
+            ranges = self._ranges(connection, table, key_column, where, params)
+        finally:
+            connection.close()
+
+        def pages(lower, upper, stopped):
+            return self._pages(engine, table, key_column, columns, extra_key,
+                               where, params, lower, upper, stopped)
+
+        if len(ranges) == 1:
+            for batch in pages(ranges[0][0], ranges[0][1], None):
+                yield batch
+            return
+
+        # 每个分区一个有界队列，按分区顺序消费即可保证主键有序，同时限制预读的内存
+        stopped = threading.Event()
+        queues = [Queue.Queue(self._prefetch) for _ in ranges]
+        executor = ThreadPoolExecutor(max_workers=len(ranges))
+        try:
+            for (lower, upper), queue in izip(ranges, queues):
+                executor.submit(_fill_queue, queue, stopped,
+                                pages(lower, upper, stopped))
+            for queue in queues:
+                while True:
+                    item = queue.get()
+                    if item is _END_OF_PARTITION:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+        finally:
+            stopped.set()
+            executor.shutdown(wait=True)
+
+    def _pages(self, engine, table, key_column, columns, extra_key, where,
+               params, lower, upper, stopped):
+        key_index = None if self._columns is None else \
+            [column.name for column in columns].index(self._key)
+        last = None
+        connection = engine.connect()
+        try:
+            while stopped is None or not stopped.is_set():
+                conditions = []
+                if last is not None:
+                    conditions.append(key_column > last)
+                elif lower is not None:
+                    conditions.append(key_column >= lower)
+                if upper is not None:
+                    conditions.append(key_column < upper)
+                if where is not None:
+                    conditions.append(where)
+                statement = select(columns).select_from(table)
+                if conditions:
+                    statement = statement.where(and_(*conditions))
+                statement = statement.order_by(key_column)\
+                    .limit(self._page_size)
+                result_proxy = connection.execute(statement, params)
+                if key_index is None:
+                    key_index = result_proxy.keys().index(self._key)
+                rows = result_proxy.fetchall()
+                result_proxy.close()
+                if not rows:
+                    return
+                last = rows[-1][key_index]
+                if extra_key:
+                    rows = [tuple(row)[:-1] for row in rows]
+                yield rows
+                if len(rows) < self._page_size:
+                    return
+        finally:
+            connection.close()
+
+
+class IncrementalQuery(object):
+
+    """基于水位线的增量查询，每次只读取水位线列大于上次最大值的行：
+       SELECT ... WHERE watermark > :last ORDER BY watermark
+       水位线以及合并后的基础表保存在状态存储中，
+       interval模式下每次运行只需要读取新增或者更新过的行：
+
+       IncrementalQuery("mysql", "orders", "orders", "updated_at",
+                        key="id", merge=True, inclusive=True,
+                        state="/var/lib/gf/orders_state.db")
+
+       合并只能反映新增与更新，源表中删除的行不会从基础表中去掉。
+    """
+
+    @args2fields()
+    def __init__(self, engine_name, variable_name, table, watermark,
+                 columns=None, where=None, params=None, key=None,
+                 merge=False, inclusive=False, initial=None, state=None,
+                 state_key=None, fetch_size=DEFAULT_FETCH_SIZE,
+                 row_handler=None, result_wrapper=None):
+        """
+        :param engine_name 使用的引擎名称
+        :param variable_name 查询的结果将以此为变量名写入context
+        :param table 表名
+        :param watermark 水位线列，比如updated_at或者自增id
+        :param columns 查询的列，默认为全部列
+        :param where 额外的过滤条件，可以使用:name形式的参数
+        :param params 过滤条件的参数，可以引用context变量
+        :param key 主键列，合并时相同主键的行以新读取的为准
+        :param merge 为True时将新读取的行合并到缓存的基础表中，结果为合并后的全部行，
+                     否则结果只包含本次新读取的行
+        :param inclusive 为True时读取水位线大于等于上次最大值的行，
+                         适用于时间戳这类可能重复的水位线，需要配合key去重，
+                         上次水位线上已经读取过的主键会被记录在状态中，不会重复返回
+        :param initial 首次运行时的水位线，为None时读取全部行
+        :param state 状态存储，可以是缓存对象或者SQLite文件路径，默认保存在进程内存中
+        :param state_key 状态键，默认由引擎名、表名、水位线列、过滤条件以及参数计算得出
+        :param fetch_size 每批读取的行数
+        :param row_handler 行处理器，针对每一行做格式转换操作
+        :param result_wrapper 用于对查询结果进行包装，比如将查询结果包装成table对象
+        """
+        if merge and key is None:
+            raise InvalidArgumentException(u"合并增量结果时必须指定key")
+        if inclusive and key is None:
+            raise InvalidArgumentException(u"包含上次水位线的增量查询必须指定key去重")
+
+    def __call__(self, context):
+        global _engine_manager
+        engine = _engine_manager.engine(self._engine_name).engine
+        params = {name: parse_context_var(context, value)
+                  for name, value in (self._params or {}).iteritems()}
+        state, state_key = self._state_store(), self._state_key_of(params)
+        entry = state.get(state_key)
+        if entry is None:
+            last, base, seen = self._initial, None, frozenset()
+        else:
+            last, base = entry[:2]
+            seen = entry[2] if len(entry) > 2 else frozenset()
+
+        rows, new_last = self._fetch(engine, params, last)
+        if self._inclusive and rows:
+            # 记录新水位线上的主键，下次运行时过滤掉重复读取的行
+            new_seen = frozenset(row_key for row_key, watermark, _ in rows
+                                 if watermark == new_last)
+        else:
+            new_seen = seen
+        if self._merge:
+            if base is None:
+                base = collections.OrderedDict()
+            # 已有的行原地更新，新增的行追加在末尾
+            for row_key, _, row in rows:
+                base[row_key] = row
+            result = tuple(base.itervalues())
+        else:
+            result = tuple(
+                row for row_key, watermark, row in rows
+                if not (self._inclusive and watermark == last and
+                        row_key in seen))
+        state.set(state_key,
+                  (new_last, base if self._merge else None, new_seen))
+
+        if self._row_handler is not None:
+            result = tuple(self._row_handler(row) for row in result)
+        if self._result_wrapper is not None:
+            result = self._result_wrapper(result)
+        context[self._variable_name] = result
+        return result
+
+    def reset(self, context=None):
+        """清除保存的水位线以及基础表，下次运行时重新全量读取
+        """
+        params = {name: parse_context_var(context or {}, value)
+                  for name, value in (self._params or {}).iteritems()}
+        self._state_store().delete(self._state_key_of(params))
+
+    def _state_store(self):
+        if self._state is None:
+            return _default_incremental_state
+        if isinstance(self._state, types.StringTypes):
+            with _incremental_state_lock:
+                store = _incremental_state_stores.get(self._state)
+                if store is None:
+                    store = _incremental_state_stores[self._state] = \
+                        SQLiteCache(self._state)
+                return store
+        return self._state
+
+    def _state_key_of(self, params):
+        if self._state_key is not None:
+            return self._state_key
+        return "incremental:" + query_cache_key(
+            self._engine_name, u"{} {} {} {}".format(
+                self._table, self._watermark, self._columns, self._where),
+            params)
+
+    def _fetch(self, engine, params, last):
+        """读取水位线之后的行
+        :return ([(主键, 水位线, 行)], 新的水位线)
+        """
+        required = (self._watermark,) if self._key is None \
+            else (self._watermark, self._key)
+        table, columns, extras = _selectable(
+            self._table, self._columns, required)
+        watermark_column = table.c[self._watermark]
+        conditions = []
+        if last is not None:
+            conditions.append(watermark_column >= last if self._inclusive
+                              else watermark_column > last)
+        if self._where:
+            conditions.append(text(self._where))
+        statement = select(columns).select_from(table)
+        if conditions:
+            statement = statement.where(and_(*conditions))
+        statement = statement.order_by(watermark_column)
+
+        rows = []
+        connection = engine.connect()
+        try:
+            result_proxy = connection.execute(statement, params)
+            names = list(result_proxy.keys())
+            watermark_index = names.index(self._watermark)
+            key_index = None if self._key is None \
+                else names.index(self._key)
+            width = len(names) - extras
+            for batch in iter(
+                    lambda: result_proxy.fetchmany(self._fetch_size), []):
+                for row in batch:
+                    row = tuple(row)
+                    last = row[watermark_index]
+                    rows.append((None if key_index is None
+                                 else row[key_index], last, row[:width]))
+            result_proxy.close()
+        finally:
+            connection.close()
+        return rows, last
+
+
+# 没有指定状态存储时，增量查询的状态保存在进程内存中
+_default_incremental_state = MemoryCache(max_entries=65536)
+
+_incremental_state_stores = {}
+
+_incremental_state_lock = threading.Lock()
+
+
+def _selectable(table_name, columns, required_columns):
+    """构造查询的表与列，columns为None时查询全部列
+    :return (表, 查询的列, 为了分页或者合并而额外查询、需要从结果中去掉的列数)
+    """
+    if columns is None:
+        table = table_clause(
+            table_name, *[column_clause(name) for name in required_columns])
+        return table, [literal_column("*")], 0
+    names = list(columns)
+    extras = [name for name in required_columns if name not in names]
+    names.extend(extras)
+    table = table_clause(table_name, *[column_clause(name) for name in names])
+    return table, [table.c[name] for name in names], len(extras)
+
+
+_END_OF_PARTITION = object()
+
+
+def _fill_queue(queue, stopped, batches):
+    """在工作线程中读取一个分区，消费者提前结束时放弃剩余的分页
+    """
+    try:
+        for batch in batches:
+            if not _put(queue, batch, stopped):
+                return
+        _put(queue, _END_OF_PARTITION, stopped)
+    except Exception as e:
+        _put(queue, e, stopped)
+
+
+def _put(queue, item, stopped):
+    while not stopped.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Queue.Full:
+            continue
+    return False
+
+
+def _cached_row_class(keys):
+    """从缓存中读取的行与RowProxy一样，支持下标、列名以及属性访问
+    """
+    positions = {key: idx for idx, key in enumerate(keys)}
+
+    class CachedRow(tuple):
+
+        __slots__ = ()
+
+        def __getitem__(self, key):
+            if isinstance(key, types.StringTypes):
+                key = positions[key]
+            return tuple.__getitem__(self, key)
+
+        def __getattr__(self, name):
+            try:
+                return tuple.__getitem__(self, positions[name])
+            except KeyError:
+                raise AttributeError(name)
+
+        def keys(self):
+            return list(keys)
+
+    return CachedRow
+
+
+class ResultStream(object):
+
+    """流式查询结果，按批次从服务端游标中读取数据，只能遍历一次，
+       遍历结束、出错或者调用close之后释放数据库会话，
+       write_csv、write_json（line格式）、write_excel等写插件可以直接逐行消费
+    """
+
+    def __init__(self, batches, row_handler=None, on_close=None, keys=None):
+        """
+        :param batches 批次迭代器，每个元素为一批行
+        :param row_handler 行处理器
+        :param on_close 释放资源的回调函数
+        :param keys 结果的列名，ColumnTableWrapper没有指定标题时使用
+        """
+        self._batches = batches
+        self._row_handler = row_handler
+        self._on_close = on_close
+        self._consumed = False
+        self.keys = keys
+
+    def batches(self):
+        """按批次遍历结果，每个批次为一个列表
+        """
+        if self._consumed:
+            raise InvalidStatusException(u"流式查询结果只能遍历一次")
+        self._consumed = True
+        row_handler = self._row_handler
+        try:
+            for batch in self._batches:
+                if row_handler is not None:
+                    batch = [row_handler(row) for row in batch]
+                yield batch
+        finally:
+            self.close()
+
+    def __iter__(self):
+        for batch in self.batches():
+            for row in batch:
+                yield row
+
+    def close(self):
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close()
+
+
+class DBWriterPlugin(object):
+
+    """将表格或者记录批量写入数据库表，例如：
+
+       Job("write_db", args=[
+            DBW("report", "daily_sales", "sales", mode="upsert",
+                keys=("day", "shop_id"), batch_size=5000)
+       ])
+    """
+
+    name = "write_db"
+
+    @staticmethod
+    def config_validator(config):
+        global _engine_manager
+        _engine_manager.validate_config(config)
+
+    def sys_prepare(self, config):
+        global _engine_manager
+        _engine_manager.init_all(config)
+
+    def execute(self, context, *db_writers):
+        return [writer(context) for writer in db_writers]
+
+    def sys_cleanup(self, config):
+        global _engine_manager
+        _engine_manager.dispose_all()
+
+
+# 支持upsert的数据库方言
+_UPSERT_DIALECTS = ("sqlite", "mysql", "postgresql")
+
+
+class DBW(AbstractDataWriter):
+
+    """数据库写单元，以单个目标表为单位，按批次使用executemany写入
+    """
+
+    @args2fields()
+    def __init__(self, engine_name, table_name, object, columns=None,
+                 mode="insert", keys=None, batch_size=1000,
+                 commit_batches=10, record_handler=None, record_filter=None,
+                 variable=None):
+        """
+        :param engine_name 使用的引擎名称
+        :param table_name 目标表名
+        :param object 要写入的数据，可以是表格对象、记录迭代器或者上下文变量名，
+                      记录可以是字典，也可以是与columns一一对应的序列
+        :param columns 要写入的列名，表格默认为全部列，字典记录默认为第一条记录的键
+        :param mode 写入方式，insert - 插入 upsert - 主键或唯一键冲突时更新，
+                    upsert支持SQLite、MySQL、PostgreSQL
+        :param keys 冲突判断的键，SQLite与PostgreSQL进行upsert时需要指定，
+                    MySQL使用表上的主键和唯一索引
+        :param batch_size 每批executemany的行数
+        :param commit_batches 每写入多少批提交一次事务
+        :param record_handler 行对象转换，在写入之前对记录进行转换
+        :param record_filter 行过滤器，对记录进行过滤
+        :param variable 写入统计信息所保存到的上下文变量
+        """
+        if mode not in ("insert", "upsert"):
+            raise InvalidArgumentException(
+                u"不合法的写入方式'{}'，只支持insert和upsert".format(mode))
+        if batch_size <= 0 or commit_batches <= 0:
+            raise InvalidArgumentException(
+                u"batch_size和commit_batches必须为正整数")
+        if isinstance(keys, types.StringTypes):
+            self._keys = (keys,)
+
+    def __call__(self, context):
+        global _engine_manager
+
+        records = self._object
+        if isinstance(records, types.StringTypes):
+            records = context[records]
+        columns, records = self._records(records)
+        engine = _engine_manager.engine(self._engine_name).engine
+        statement = text(self._statement(engine.dialect, columns))
+
+        start = time.time()
+        rows = batches = 0
+        connection = engine.connect()
+        try:
+            transaction = connection.begin()
+            try:
+                while True:
+                    batch = list(islice(records, self._batch_size))
+                    if not batch:
+                        break
+                    connection.execute(statement, batch)
+                    rows += len(batch)
+                    batches += 1
+                    if batches % self._commit_batches == 0:
+                        transaction.commit()
+                        transaction = connection.begin()
+                transaction.commit()
+            except Exception:
+                transaction.rollback()
+                raise
+        finally:
+            connection.close()
+
+        seconds = time.time() - start
+        result = {
+            "rows": rows,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds else float(rows),
+        }
+        logger = getattr(context, "logger", None)
+        if logger is not None:
+            logger.info(u"写入表{}共{}行，耗时{:.2f}秒，每秒{:.0f}行".format(
+                self._table_name, rows, seconds, result["rows_per_second"]))
+        if self._variable:
+            context[self._variable] = result
+        return result
+
+    def _records(self, records):
+        """将数据整理为列名以及以列名为键的字典记录迭代器
+        """
+        columns = self._columns
+        if isinstance(records, AbstractTable):
+            if columns is None:
+                columns = [title.name for title in records.titles]
+            if isinstance(records, ListTable) and \
+                    self._record_handler is None and \
+                    self._record_filter is None and \
+                    columns == [title.name for title in records.titles]:
+                # 直接使用底层数据，不需要构建行对象
+                records = records._data
+            else:
+                records = (row[columns] for row in records)
+        records = self._handled_records(iter(records))
+
+        first = next(records, None)
+        if first is None:
+            return columns or [], iter(())
+        if isinstance(first, types.DictType):
+            if columns is None:
+                columns = first.keys()
+            records = _chain_first(first, records)
+        else:
+            if columns is None:
+                raise InvalidArgumentException(
+                    u"写入序列记录时需要通过columns指定列名")
+            records = (dict(izip(columns, record)) for record in
+                       _chain_first(first, records))
+        return columns, records
+
+    def _handled_records(self, records):
+        if self._record_handler is None and self._record_filter is None:
+            return records
+        return (record for record in
+                (self._handle_record(record) for record in records)
+                if record is not None)
+
+    def _statement(self, dialect, columns):
+        quote = dialect.identifier_preparer.quote
+        table = dialect.identifier_preparer.quote(self._table_name)
+        column_list = u", ".join(quote(column) for column in columns)
+        value_list = u", ".join(u":" + column for column in columns)
+        insert = u"INSERT INTO {} ({}) VALUES ({})".format(
+            table, column_list, value_list)
+        if self._mode == "insert":
+            return insert
+
+        if dialect.name not in _UPSERT_DIALECTS:
+            raise InvalidArgumentException(
+                u"数据库'{}'不支持upsert，只支持{}".format(
+                    dialect.name, u"、".join(_UPSERT_DIALECTS)))
+        keys = self._keys or ()
+        updates = [column for column in columns if column not in keys]
+        if dialect.name == "mysql":
+            if not updates:
+                return u"INSERT IGNORE" + insert[len(u"INSERT"):]
+            return u"{} ON DUPLICATE KEY UPDATE {}".format(
+                insert, u", ".join(u"{0} = VALUES({0})".format(quote(column))
+                                   for column in updates))
+        if not keys:
+            if dialect.name == "sqlite":
+                return u"INSERT OR REPLACE" + insert[len(u"INSERT"):]
+            raise InvalidArgumentException(u"PostgreSQL进行upsert时需要指定keys")
+        if dialect.name == "sqlite" and sqlite3.sqlite_version_info < (3, 24):
+            # 旧版本的SQLite不支持ON CONFLICT DO UPDATE
+            return u"INSERT OR REPLACE" + insert[len(u"INSERT"):]
+        conflict = u", ".join(quote(key) for key in keys)
+        if not updates:
+            return u"{} ON CONFLICT ({}) DO NOTHING".format(insert, conflict)
+        return u"{} ON CONFLICT ({}) DO UPDATE SET {}".format(
+            insert, conflict,
+            u", ".join(u"{0} = excluded.{0}".format(quote(column))
+                       for column in updates))
+
+
+def _chain_first(first, records):
+    yield first
+    for record in records:
+        yield record
+
+
+class SQLExportPlugin(object):
+
+    """将查询结果按批次直接写入文件，结果不会在内存中物化，例如：
+
+       Job("export_sql", args=[
+            SQLExport("report", "select * from orders where day = :day",
+                      "orders.csv.gz", params={"day": "$day"})
+       ])
+
+       支持csv、json（line格式）以及表格文件三种格式，
+       csv与json可以进行gzip压缩，压缩在后台线程中进行，不阻塞数据库读取。
+    """
+
+    name = "export_sql"
+
+    @staticmethod
+    def config_validator(config):
+        global _engine_manager
+        _engine_manager.validate_config(config)
+
+    def sys_prepare(self, config):
+        global _engine_manager
+        _engine_manager.init_all(config)
+
+    def execute(self, context, *exports):
+        return [export(context) for export in exports]
+
+    def sys_cleanup(self, config):
+        global _engine_manager
+        _engine_manager.dispose_all()
+
+
+EXPORT_FORMATS = ("csv", "json", "table")
+
+# 后台压缩时每个数据块的大小
+GZIP_CHUNK_SIZE = 256 * 1024
+
+
+class SQLExport(object):
+
+    """导出单元，以单个查询为单位，先写入临时文件，成功后再重命名为目标文件
+    """
+
+    @args2fields()
+    def __init__(self, engine_name, sql, path, params=None, format="csv",
+                 titles=None, header=True, fetch_size=DEFAULT_FETCH_SIZE,
+                 compress=None, row_handler=None, dialect="excel",
+                 compression=None, encode_threshold=DEFAULT_ENCODE_THRESHOLD,
+                 variable=None):
+        """
+        :param engine_name 使用的引擎名称
+        :param sql 查询语句
+        :param path 导出文件路径
+        :param params SQL参数，值可以引用上下文变量，比如"$day"
+        :param format 导出格式，csv、json（每行一个对象）或者table（表格文件）
+        :param titles 列标题，可以是字符串或者Title对象，默认使用查询结果的列名
+        :param header csv格式是否输出标题行
+        :param fetch_size 每批读取的行数
+        :param compress 是否进行gzip压缩，为None时根据path是否以.gz结尾决定，
+                        表格文件不支持gzip，请使用compression
+        :param row_handler 行处理器，json格式下可以返回字典
+        :param dialect csv方言
+        :param compression 表格文件的压缩方式，None或者"zlib"
+        :param encode_threshold 表格文件中低基数字符串列进行字典编码的阈值
+        :param variable 导出统计信息所保存到的上下文变量
+        """
+        if format not in EXPORT_FORMATS:
+            raise InvalidArgumentException(
+                u"不支持的导出格式'{}'，只支持{}".format(
+                    format, u"、".join(EXPORT_FORMATS)))
+        if fetch_size <= 0:
+            raise InvalidArgumentException(u"fetch_size必须为正整数")
+        if compress is None:
+            self._compress = path.endswith(".gz")
+        if self._compress and format == "table":
+            raise InvalidArgumentException(
+                u"表格文件不支持gzip压缩，请使用compression参数")
+
+    def __call__(self, context):
+        global _engine_manager
+
+        params = {key: parse_context_var(context, value)
+                  for key, value in (self._params or {}).iteritems()}
+        engine = _engine_manager.engine(self._engine_name).engine
+        temp_path = self._path + ".tmp"
+
+        start = time.time()
+        connection = engine.connect()
+        try:
+            result_proxy = connection.execution_options(
+                stream_results=True).execute(text(self._sql), params)
+            try:
+                keys = list(result_proxy.keys())
+                fetch_size = self._fetch_size
+                batches = iter(lambda: result_proxy.fetchmany(fetch_size), [])
+                if self._row_handler is not None:
+                    row_handler = self._row_handler
+                    batches = ([row_handler(row) for row in batch]
+                               for batch in batches)
+                rows = self._export(temp_path, keys, batches)
+            finally:
+                result_proxy.close()
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        finally:
+            connection.close()
+        os.rename(temp_path, self._path)
+
+        seconds = time.time() - start
+        result = {
+            "path": self._path,
+            "rows": rows,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds else float(rows),
+        }
+        logger = getattr(context, "logger", None)
+        if logger is not None:
+            logger.info(u"导出{}共{}行，耗时{:.2f}秒，每秒{:.0f}行".format(
+                self._path, rows, seconds, result["rows_per_second"]))
+        if self._variable:
+            context[self._variable] = result
+        return result
+
+    def _export_titles(self, keys):
+        if self._titles is None:
+            return [Title(key) for key in keys]
+        return [Title(title) if isinstance(title, types.StringTypes)
+                else title for title in self._titles]
+
+    def _export(self, path, keys, batches):
+        """写入全部批次，返回行数
+        """
+        titles = self._export_titles(keys)
+        if self._format == "table":
+            with TableFileWriter(path, os.path.basename(self._path), titles,
+                                 self._compression,
+                                 self._encode_threshold) as writer:
+                for batch in batches:
+                    writer.write_rows(batch)
+            return writer.row_num
+
+        if self._compress:
+            f = _BackgroundGzipFile(path)
+        else:
+            f = open(path, "wb")
+        with f:
+            if self._format == "csv":
+                return self._write_csv(f, titles, batches)
+            return self._write_json(f, titles, batches)
+
+    def _write_csv(self, f, titles, batches):
+        dialect = self._dialect
+        if isinstance(dialect, types.StringTypes):
+            dialect = csv.get_dialect(dialect)
+        writer = csv.writer(f, dialect=dialect)
+        if self._header:
+            writer.writerow([_utf8(title.title) for title in titles])
+        rows = 0
+        for batch in batches:
+            writer.writerows([_utf8(value) for value in row]
+                             for row in batch)
+            rows += len(batch)
+        return rows
+
+    def _write_json(self, f, titles, batches):
+        names = [title.name for title in titles]
+        rows = 0
+        for batch in batches:
+            lines = []
+            for row in batch:
+                if not isinstance(row, types.DictType):
+                    row = dict(izip(names, row))
+                try:
+                    lines.append(ujson.dumps(row))
+                except TypeError:
+                    lines.append(ujson.dumps(
+                        {key: _json_value(value)
+                         for key, value in row.iteritems()}))
+            if lines:
+                f.write("\n".join(lines) + "\n")
+            rows += len(batch)
+        return rows
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+
+def _json_value(value):
+    """将ujson无法序列化的值转换为字符串或者数字
+    """
+    if isinstance(value, (date, time_)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, str):
+        return value.decode("utf-8", "replace")
+    return value
+
+
+_END_OF_GZIP = object()
+
+
+class _BackgroundGzipFile(object):
+
+    """在后台线程中进行gzip压缩的文件，写入的数据攒够一个数据块后交给压缩线程，
+       压缩出错时继续取走数据块避免写入方阻塞，并在close时抛出异常
+    """
+
+    def __init__(self, path, chunk_size=GZIP_CHUNK_SIZE, queue_size=4):
+        self._path = path
+        self._chunk_size = chunk_size
+        self._buffer = []
+        self._buffered = 0
+        self._error = None
+        self._queue = Queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._compress)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _compress(self):
+        finished = False
+        try:
+            with gzip.open(self._path, "wb") as f:
+                while not finished:
+                    chunk = self._queue.get()
+                    if chunk is _END_OF_GZIP:
+                        finished = True
+                    else:
+                        f.write(chunk)
+        except Exception as e:
+            self._error = e
+            while not finished:
+                finished = self._queue.get() is _END_OF_GZIP
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self._chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._queue.put("".join(self._buffer))
+            self._buffer, self._buffered = [], 0
+
+    def close(self):
+        if self._thread is None:
+            return
+        thread, self._thread = self._thread, None
+        self._flush()
+        self._queue.put(_END_OF_GZIP)
+        thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 
 class KeyExtractWrapper(object):
 
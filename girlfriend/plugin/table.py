@@ -1,19 +1,54 @@
 # coding: utf-8
 
 import re
+import io
+import sys
+import cgi
+import time
 import types
-import prettytable
+import operator
+import threading
+from itertools import izip, imap, islice
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from girlfriend.data.table import (
     AbstractTable,
+    BaseLocalTable,
+    ColumnTable,
     TableWrapper,
     Title,
     ListTable
 )
+from girlfriend.data.encoding import (
+    DictEncodedColumn,
+    copy_column,
+    factorize,
+    factorize_columns
+)
+from girlfriend.data.index import HashIndex
+from girlfriend.data.partition import (
+    AbstractPartitioner,
+    ValuePartitioner,
+    partition_table
+)
+from girlfriend.data.view import ConcatView, PositionView
+from girlfriend.data.console import (
+    ConsoleTableRenderer,
+    DEFAULT_SAMPLE_SIZE
+)
+from girlfriend.data.expression import compile_expression
+from girlfriend.data.sketch import ColumnStats
+from girlfriend.data.diff import diff_table
+from girlfriend.data.window import (
+    compile_window_function,
+    partition_bounds,
+    top_positions
+)
 from girlfriend.util.lang import (
     args2fields,
     SequenceCollectionType
 )
+from girlfriend.util.time import parse_time_unit
 from girlfriend.exception import (
     InvalidTypeException,
     InvalidArgumentException
@@ -122,72 +157,216 @@ class TableColumn2TitlePlugin(object):
     def execute(self, context, from_table, to_table,
                 title_column, value_column, title_generator=Title,
                 new_title_sort=sorted, new_table_name=None, default=None,
-                sum_title=None, avg_title=None):
+                sum_title=None, avg_title=None, aggregate=None):
         """
         :param context  上下文对象
         :param from_table  要转换的表，可以是具体的table对象，也可以是上下文变量名
         :param to_table  转换结果所保存的变量名
         :param title_column  要转换为标题的列，比如上例中的week
-        :param value_column  为新列提供数据的列，比如上例中的score
+        :param value_column  为新列提供数据的列，比如上例中的score，
+                             也可以是多个列名组成的列表，每个值列都会生成一组新列
         :param title_generator 新列生成器，接受一个列值作为参数，返回Title对象
                          例如: lambda week: Title("week_" + week, u"星期" + week)
+                         当存在多个值列时，会接受列值和值列名两个参数
         :param new_title_sort 新标题排序，接受新标题值的列表，返回排序后的结果
         :param sum_title 接受一个Title对象，如果不为None，那么将用此列保存合计
-        :param avg_title 平均值
+                         多个值列时需要传递与值列一一对应的Title列表
+        :param avg_title 平均值，规则同sum_title
+        :param aggregate 同一单元格出现多个值时的聚合方式，可以是sum、avg、count、
+                         min、max、first、last，也可以是接受值列表的函数，
+                         默认为None，即后出现的值覆盖先出现的值
         """
         if isinstance(from_table, types.StringTypes):
             from_table = context[from_table]
 
-        title_column_values = set()
+        if isinstance(value_column, types.StringTypes):
+            value_columns = (value_column,)
+        else:
+            value_columns = tuple(value_column)
+        if len(value_columns) > 1 and title_generator is Title:
+            title_generator = ValueColumnTitleGenerator
+        sum_titles = self._per_value_titles(sum_title, value_columns)
+        avg_titles = self._per_value_titles(avg_title, value_columns)
 
         # 将title_column和value_column之外的列作为唯一列
-        unique_fields = tuple(title.name for title in from_table.titles
-                              if title.name != title_column and
-                              title.name != value_column)
-
-        tmp_result = defaultdict(dict)
-        for row in from_table:
-            unique_columns = row[unique_fields]
-            title_column_value = row[title_column]
-            new_column_value = row[value_column]
-            tmp_result[unique_columns][title_column_value] = new_column_value
-            title_column_values.add(title_column_value)
-
-        # 生成标题列表
-        title_column_values = new_title_sort(title_column_values)
-        titles = [title for title in from_table.titles
-                  if title.name != title_column and
-                  title.name != value_column]
-        titles.extend(title_generator(v) for v in title_column_values)
-
-        if sum_title:
-            titles.append(sum_title)
-        if avg_title:
-            titles.append(avg_title)
-
-        table_name = (from_table.name
-                      if new_table_name is None else new_table_name)
+        pivot_fields = set(value_columns)
+        pivot_fields.add(title_column)
+        unique_titles = [title for title in from_table.titles
+                         if title.name not in pivot_fields]
+        unique_fields = tuple(title.name for title in unique_titles)
+
+        # 对唯一列和标题列进行整数编码，后续所有操作都基于编码进行
+        if isinstance(from_table, ColumnTable):
+            # 字典编码列可以直接基于已有的编码进行分解
+            key_codes, keys = factorize_columns(
+                [from_table.column(field) for field in unique_fields],
+                len(from_table))
+        else:
+            key_codes, keys = factorize(_columns(from_table, unique_fields))
+        title_codes, title_values = factorize(
+            _column(from_table, title_column))
+
+        # 生成标题列表，并计算每个标题值在新表中的位置
+        sorted_title_values = new_title_sort(title_values)
+        positions = {value: idx for idx, value in
+                     enumerate(sorted_title_values)}
+        title_positions = [positions.get(value, -1) for value in title_values]
+        width, height = len(sorted_title_values), len(keys)
+
+        # 每个行列组合在稠密二维数组中的偏移，不参与展示的标题值标记为-1
+        cells = [
+            key_code * width + title_positions[title_code]
+            if title_positions[title_code] >= 0 else -1
+            for key_code, title_code in izip(key_codes, title_codes)
+        ]
+
+        grids = [
+            _scatter(cells, _column(from_table, column), width * height,
+                     default, aggregate)
+            for column in value_columns
+        ]
+
+        titles = list(unique_titles)
+        for column in value_columns:
+            if len(value_columns) > 1:
+                titles.extend(title_generator(v, column)
+                              for v in sorted_title_values)
+            else:
+                titles.extend(title_generator(v) for v in sorted_title_values)
+        if sum_titles:
+            titles.extend(sum_titles)
+        if avg_titles:
+            titles.extend(avg_titles)
+
+        # 合计与平均值按照二维数组的行进行归约
+        sums, avgs = [], []
+        if sum_titles or avg_titles:
+            sums = [[sum(grid[offset:offset + width])
+                     for offset in xrange(0, width * height, width)]
+                    for grid in grids]
+        if avg_titles:
+            avgs = [[s / width for s in column_sums]
+                    for column_sums in sums]
 
         data = []
-        for unique_columns in tmp_result:
-            row = []
-            row.extend(unique_columns)
-            series = tuple(tmp_result[unique_columns].get(col, default)
-                           for col in title_column_values)
-            row.extend(series)
-            sum_value = None
-            if sum_title:
-                sum_value = sum(series)
-                row.append(sum_value)
-            if avg_title:
-                if sum_value is None:
-                    sum_value = sum(series)
-                avg_value = sum_value / len(series)
-                row.append(avg_value)
+        for key_code, key in enumerate(keys):
+            row = list(key)
+            offset = key_code * width
+            for grid in grids:
+                row.extend(grid[offset:offset + width])
+            if sum_titles:
+                row.extend(column_sums[key_code] for column_sums in sums)
+            if avg_titles:
+                row.extend(column_avgs[key_code] for column_avgs in avgs)
             data.append(row)
 
+        table_name = (from_table.name
+                      if new_table_name is None else new_table_name)
         context[to_table] = ListTable(table_name, titles, data)
 
+    def _per_value_titles(self, title, value_columns):
+        """将合计、平均值标题整理为与值列一一对应的列表
+        """
+        if not title:
+            return []
+        if isinstance(title, Title):
+            title = [title]
+        if len(title) != len(value_columns):
+            raise InvalidArgumentException(
+                u"合计/平均值标题的数目必须与值列的数目一致")
+        return list(title)
+
+
+_MISSING = object()
+
+_AGGREGATE_OPERATORS = {
+    "sum": operator.add,
+    "avg": operator.add,
+    "min": min,
+    "max": max,
+}
+
+
+def _column(table, field):
+    """一次性提取表格中的某一列，本地表格会复用缓存在表格上的列数据
+    """
+    return table.column(field)
+
+
+def _columns(table, fields):
+    """一次性提取表格中的多个列，每行的结果为一个元组
+    """
+    if not fields:
+        return [()] * len(table)
+    if len(fields) == 1:
+        return [(value,) for value in _column(table, fields[0])]
+    if isinstance(table, ListTable):
+        return map(operator.itemgetter(
+            *(table._mapping[field] for field in fields)), table._data)
+    return [row[fields] for row in table]
+
+
+def _scatter(cells, values, size, default, aggregate):
+    """将值按照偏移散布到长度为size的一维数组中（以行优先的方式表示二维数组）
+       :param cells 每个值对应的偏移，小于0的偏移将被忽略
+       :param aggregate 同一偏移出现多个值时的聚合方式
+    """
+    if aggregate is None or aggregate == "last":
+        grid = [default] * size
+        for cell, value in izip(cells, values):
+            if cell >= 0:
+                grid[cell] = value
+        return grid
+
+    if aggregate == "first":
+        grid = [_MISSING] * size
+        for cell, value in izip(cells, values):
+            if cell >= 0 and grid[cell] is _MISSING:
+                grid[cell] = value
+        return [default if v is _MISSING else v for v in grid]
+
+    if aggregate == "count":
+        grid = [0] * size
+        for cell in cells:
+            if cell >= 0:
+                grid[cell] += 1
+        return [count if count else default for count in grid]
+
+    if callable(aggregate):
+        buckets = defaultdict(list)
+        for cell, value in izip(cells, values):
+            if cell >= 0:
+                buckets[cell].append(value)
+        grid = [default] * size
+        for cell, bucket in buckets.iteritems():
+            grid[cell] = aggregate(bucket)
+        return grid
+
+    op = _AGGREGATE_OPERATORS.get(aggregate)
+    if op is None:
+        raise InvalidArgumentException(
+            u"不支持的聚合方式'{}'".format(aggregate))
+    grid = [_MISSING] * size
+    for cell, value in izip(cells, values):
+        if cell < 0:
+            continue
+        acc = grid[cell]
+        grid[cell] = value if acc is _MISSING else op(acc, value)
+    if aggregate == "avg":
+        counts = [0] * size
+        for cell in cells:
+            if cell >= 0:
+                counts[cell] += 1
+        return [default if total is _MISSING else total / count
+                for total, count in izip(grid, counts)]
+    return [default if total is _MISSING else total for total in grid]
+
+
+def ValueColumnTitleGenerator(value, value_column):
+    """多值列转换时默认的标题生成器，例如score_1、score_2
+    """
+    return Title(u"{}_{}".format(value_column, value))
+
 
 ZH_MONTHS = (u"一", u"二", u"三", u"四", u"五", u"六",
              u"七", u"八", u"九", u"十", u"十一", u"十二")
@@ -205,17 +384,57 @@ class PrintTablePlugin(object):
     name = "print_table"
 
     def execute(self, context, *tables):
+        """
+        :param context 上下文对象
+        :param tables 要打印的表格，可以是表格对象、上下文变量名，
+                      也可以是指定了打印选项的PrintTable对象
+        """
         for table in tables:
-            if isinstance(table, types.StringTypes):
-                table = context[table]
-            # 居中显示表格名称
-            print table.name.center(100, "-")
-            print "\n"
-            ptable = prettytable.PrettyTable([t.title for t in table.titles])
-            for row in table:
-                ptable.add_row(row)
-            print str(ptable)
-            print "\n\n"
+            if not isinstance(table, PrintTable):
+                table = PrintTable(table)
+            table(context)
+
+
+class PrintTable(object):
+
+    """表格打印单元，逐块输出到标准输出
+    """
+
+    @args2fields()
+    def __init__(self, table, max_rows=None, head=None, tail=None,
+                 sample_size=DEFAULT_SAMPLE_SIZE):
+        """
+        :param table 要打印的表格，可以是表格对象，也可以是上下文变量名
+        :param max_rows 最多打印的行数，超出时打印开头和结尾各一半
+        :param head 打印开头的行数，与tail一起指定时会忽略max_rows
+        :param tail 打印结尾的行数
+        :param sample_size 用于计算列宽的采样行数，为None时扫描所有要打印的行
+        """
+        pass
+
+    def __call__(self, context):
+        table = self._table
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+
+        encoding = getattr(sys.stdout, "encoding", None) or "utf-8"
+
+        def write(chunk):
+            sys.stdout.write(chunk.encode(encoding, "replace"))
+
+        # 居中显示表格名称
+        write(u"{}\n\n\n".format(_text(table.name).center(100, u"-")))
+        ConsoleTableRenderer(
+            table, self._max_rows, self._head, self._tail, self._sample_size
+        ).render(write)
+        write(u"\n\n\n")
+        sys.stdout.flush()
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value.decode("utf-8", "replace")
+    return unicode(value)
 
 
 class HTMLTablePlugin(object):
@@ -232,7 +451,20 @@ class HTMLTable(object):
     """
 
     @args2fields()
-    def __init__(self, table, variable=None, property=None):
+    def __init__(self, table, variable=None, property=None, sink=None,
+                 max_rows=None, escape=True, encoding=None):
+        """
+        :param table 要渲染的表格，可以是表格对象，也可以是上下文变量名
+        :param variable 保存结果的上下文变量
+        :param property 各元素的属性，可以是字符串，也可以是返回字符串的函数
+        :param sink 输出目标，为None时返回完整的HTML字符串；
+                    可以是文件路径，也可以是拥有write方法的对象，比如文件或者StringIO，
+                    此时HTML会被分块写入，不在内存中拼接完整的内容
+        :param max_rows 最多渲染的行数，超出的部分会被截断，适用于邮件正文
+        :param escape 是否对标题和单元格内容进行HTML转义
+        :param encoding 写入sink时使用的编码，为None时直接写入unicode，
+                        sink为文件路径时默认使用utf-8
+        """
         pass
 
     def __call__(self, context):
@@ -240,92 +472,172 @@ class HTMLTable(object):
         if isinstance(self._table, types.StringTypes):
             self._table = context[self._table]
 
-        # table element
-        html_buffer = [u"<table {prop}>".format(
-            prop=self._extract_properties("table", value=self._table)
-        )]
-
-        # thead element
-        html_buffer.append(u"<thead>")
-
-        # thead -> tr
-        html_buffer.append(
-            u"<tr {prop}>".format(
-                prop=self._extract_properties("title-row", value=self._table)
-            )
-        )
-
-        # thead -> tr -> td
-        for column_index, title in enumerate(self._table.titles):
-            html_buffer.append(
-                u"<th {prop}>{t}</th>".format(
-                    t=title.title,
-                    prop=self._extract_properties(
-                        "title-cell", column_index=column_index, value=title)
-                )
-            )
-
-        # close thead
-        html_buffer.append(u"</tr></thead>")
-
-        # tbody
-        html_buffer.append(u"<tbody>")
-
-        # tbody tr
-        for row_index, row in enumerate(self._table):
-            html_buffer.append(
-                u"<tr {prop}>".format(
-                    prop=self._extract_properties(
-                        "data-row", row_index=row_index, value=row)
-                )
-            )
-            for column_index, title in enumerate(self._table.titles):
-                col_value = row[title.name]
-                html_buffer.append(
-                    u"<td {prop}>{col}</td>".format(
-                        prop=self._extract_properties(
-                            "data-cell", row_index=row_index,
-                            column_index=column_index,
-                            field_name=title.name,
-                            value=col_value),
-                        col=col_value
-                    )
-                )
-            html_buffer.append(u"</tr>")
-
-        # finish tbody
-        html_buffer.append(u"</tbody></table>")
-        html_content = "".join(html_buffer)
+        renderer = HTMLTableRenderer(
+            self._table, self._property, self._escape, self._max_rows)
+        sink = self._sink
+        if sink is None:
+            chunks = []
+            renderer.render(chunks.append)
+            result = u"".join(chunks)
+        elif isinstance(sink, types.StringTypes):
+            with io.open(sink, "w", encoding=self._encoding or "utf-8") as f:
+                renderer.render(f.write)
+            result = sink
+        else:
+            if self._encoding:
+                encoding = self._encoding
+
+                def write(chunk):
+                    sink.write(chunk.encode(encoding))
+            else:
+                write = sink.write
+            renderer.render(write)
+            result = sink
+
         if self._variable:
-            context[self._variable] = html_content
-        return html_content
+            context[self._variable] = result
+        return result
+
 
-    def _extract_properties(self, element_type, row_index=None,
-                            column_index=None, field_name=None, value=None):
-        """提取元素属性
+class HTMLTableRenderer(object):
+
+    """流式HTML表格渲染器，按块输出HTML片段。
+       当数据行和单元格的属性都不是函数时，会预先编译行模板，每一行只进行一次格式化，
+       字符串单元格的转义结果会被缓存，以便快速处理大量重复的值
+    """
+
+    # 每次写出的行数
+    ROWS_PER_CHUNK = 1000
+
+    # 转义缓存的最大条目数
+    ESCAPE_CACHE_SIZE = 10000
+
+    def __init__(self, table, property=None, escape=True, max_rows=None):
+        """
+        :param table 要渲染的表格
+        :param property 元素属性，与HTMLTable的property参数一致
+        :param escape 是否进行HTML转义
+        :param max_rows 最多渲染的行数
+        """
+        self._table = table
+        self._property = property or {}
+        self._escape = escape
+        self._max_rows = max_rows
+        self._escape_cache = {}
+
+    def render(self, write):
+        """渲染表格
+        :param write 接受unicode片段的写函数
+        """
+        table = self._table
+        titles = list(table.titles)
+        text = self._text
+
+        head = [
+            u"<table {}>".format(self._properties("table", table)),
+            u"<thead>",
+            u"<tr {}>".format(self._properties("title-row", table)),
+        ]
+        for column_index, title in enumerate(titles):
+            head.append(u"<th {}>{}</th>".format(
+                self._properties("title-cell", column_index, title),
+                text(title.title)))
+        head.append(u"</tr></thead><tbody>")
+        write(u"".join(head))
+
+        rows = table
+        if self._max_rows is not None:
+            rows = islice(table, self._max_rows)
+        render_row = self._row_renderer(titles)
+        chunk, rows_per_chunk = [], self.ROWS_PER_CHUNK
+        row_num = 0
+        for row_num, row in enumerate(rows, 1):
+            chunk.append(render_row(row_num - 1, row))
+            if len(chunk) >= rows_per_chunk:
+                write(u"".join(chunk))
+                del chunk[:]
+        if chunk:
+            write(u"".join(chunk))
+
+        if self._max_rows is not None and row_num == self._max_rows and \
+                len(table) > row_num:
+            write(u"<tr><td colspan=\"{}\">{}</td></tr>".format(
+                len(titles),
+                u"仅显示前{}行，共{}行".format(row_num, len(table))))
+        write(u"</tbody></table>")
+
+    def _row_renderer(self, titles):
+        names = [title.name for title in titles]
+        text = self._text
+        row_properties = self._property.get("data-row")
+        cell_properties = self._property.get("data-cell")
+
+        if not callable(row_properties) and not callable(cell_properties):
+            # 属性都是静态的，预先编译行模板
+            template = u"<tr {}>".format(
+                _escape_braces(row_properties or u"")) + u"".join(
+                u"<td {}>{{{}}}</td>".format(
+                    _escape_braces(cell_properties or u""), idx)
+                for idx in xrange(len(names))) + u"</tr>"
+            template = template.format
+
+            def render_row(row_index, row):
+                return template(*[text(row[name]) for name in names])
+
+            return render_row
+
+        properties = self._properties
+
+        def render_row(row_index, row):
+            html = [u"<tr {}>".format(
+                properties("data-row", row_index, row))]
+            for column_index, name in enumerate(names):
+                value = row[name]
+                html.append(u"<td {}>{}</td>".format(
+                    properties("data-cell", row_index, column_index,
+                               name, value),
+                    text(value)))
+            html.append(u"</tr>")
+            return u"".join(html)
+
+        return render_row
+
+    def _properties(self, element_type, *args):
+        """提取元素属性，属性为函数时，以元素相关的信息作为参数进行调用：
+           table(table)、title-row(table)、title-cell(column_index, title)、
+           data-row(row_index, row)、
+           data-cell(row_index, column_index, field_name, value)
         """
-        if not self._property:
-            return ""
         properties = self._property.get(element_type)
-        if not properties:
-            return ""
-
-        if isinstance(properties, types.FunctionType):
-            if element_type == "table":
-                properties = properties(value)
-            elif element_type == "title-row":
-                properties = properties(value)
-            elif element_type == "title-cell":
-                properties = properties(column_index, value)
-            elif element_type == "data-row":
-                properties = properties(row_index, value)
-            elif element_type == "data-cell":
-                properties = properties(
-                    row_index, column_index, field_name, value)
-
-        if not properties:
-            return ""
-        return properties
+        if callable(properties):
+            properties = properties(*args)
+        return properties or u""
+
+    def _text(self, value):
+        """将值转换为可以放入HTML中的文本
+        """
+        if isinstance(value, _NUMBER_TYPES) or value is None:
+            return unicode(value)
+        if isinstance(value, types.StringTypes):
+            cache = self._escape_cache
+            text = cache.get(value)
+            if text is None:
+                text = value if isinstance(value, unicode) \
+                    else value.decode("utf-8")
+                if self._escape:
+                    text = cgi.escape(text, True)
+                if len(cache) < self.ESCAPE_CACHE_SIZE:
+                    cache[value] = text
+            return text
+        text = unicode(value)
+        return cgi.escape(text, True) if self._escape else text
+
+
+_NUMBER_TYPES = (types.IntType, types.LongType, types.FloatType)
+
+
+def _escape_braces(text):
+    return text.replace(u"{", u"{{").replace(u"}", u"}}")
 
 
 class ConcatTablePlugin(object):
@@ -335,7 +647,8 @@ class ConcatTablePlugin(object):
 
     name = "concat_table"
 
-    def execute(self, context, tables, name, titles=0, variable=None):
+    def execute(self, context, tables, name, titles=0, variable=None,
+                lazy=False):
         """
         :param context 上下文对象
         :param name    表名
@@ -345,34 +658,32 @@ class ConcatTablePlugin(object):
                        1. 具体的Table对象
                        2. Table对象的上下文变量名
                        3. 元组，第一个元素为Table对象，后面为要拼接的属性名
+        :param lazy    为True时返回不复制数据的拼接视图，否则返回ListTable
         """
 
-        result = []
-        for idx, table in enumerate(tables):
-            fields = []  # 要拼接的字段
+        parts = []
+        for table in tables:
             if isinstance(table, types.StringTypes):
-                table = context[table]
-                fields = [title.name for title in table.titles]
+                parts.append(context[table])
             elif isinstance(table, AbstractTable):
-                fields = [title.name for title in table.titles]
+                parts.append(table)
             elif isinstance(table, SequenceCollectionType):
-                table, fields = table[0], table[1:]
+                table, fields = table[0], tuple(table[1:])
                 if isinstance(table, types.StringTypes):
                     table = context[table]
+                parts.append((table,) + fields)
             else:
-                raise InvalidTypeException
-
-            for row in table:
-                result.append(row[fields])
+                raise InvalidTypeException(
+                    u"不支持的拼接对象类型：{}".format(type(table).__name__))
 
-            if isinstance(titles, int) and titles == idx:
-                titles = [
-                    title for title in table.titles if title.name in fields]
+        result = ConcatView(parts, name, titles)
+        if not lazy:
+            result = result.materialize()
 
         if variable is None:
-            return ListTable(name, titles, result)
+            return result
         else:
-            context[variable] = ListTable(name, titles, result)
+            context[variable] = result
 
 
 class JoinTablePlugin(object):
@@ -428,76 +739,52 @@ class JoinTablePlugin(object):
             for statement in on_conditions.split(",")]
 
     def _inner_join(self, left_table, right_table, fields, conditions):
-        left_fields = [c.left_field for c in conditions]
-        right_fields = [c.right_field for c in conditions]
+        left_fields = tuple(c.left_field for c in conditions)
+        right_fields = tuple(c.right_field for c in conditions)
 
-        right_table_hash = self._table_hash(
-            right_table, right_fields)
+        left_keys, right_index = _join_lookup(
+            left_table, left_fields, right_table, right_fields)
         result = []
 
-        for row in left_table:
-            hash_code = hash(row[left_fields])
-            right_row_index_list = right_table_hash[hash_code]
+        for row, key in izip(left_table, left_keys):
+            right_row_index_list = right_index.positions(key)
             if not right_row_index_list:
                 continue
-
-            for right_row_index in right_row_index_list:
-                right_row = right_table[right_row_index]
-                if row[left_fields] == right_row[right_fields]:
-                    result.append(self._build_row(fields, row, right_row))
-                    break
+            right_row = right_table[right_row_index_list[0]]
+            result.append(self._build_row(fields, row, right_row))
         return result
 
     def _side_join(self, way, main_table, sub_table, fields, conditions):
 
-        left_fields = [c.left_field for c in conditions]
-        right_fields = [c.right_field for c in conditions]
+        left_fields = tuple(c.left_field for c in conditions)
+        right_fields = tuple(c.right_field for c in conditions)
 
         if way == "left":
             main_fields, sub_fields = left_fields, right_fields
         elif way == "right":
             main_fields, sub_fields = right_fields, left_fields
 
-        sub_table_hash = self._table_hash(sub_table, sub_fields)
+        main_keys, sub_index = _join_lookup(
+            main_table, main_fields, sub_table, sub_fields)
 
         result = []
 
-        for row in main_table:
-            hash_code = hash(row[main_fields])
-            sub_row_index_list = sub_table_hash[hash_code]
-
-            if way == "left":
-                left_row, right_row = row, None
-            else:
-                left_row, right_row = None, row
+        for row, key in izip(main_table, main_keys):
+            sub_row_index_list = sub_index.positions(key)
 
             if not sub_row_index_list:
-                result.append(self._build_row(fields, left_row, right_row))
-                continue
+                sub_row = None
+            else:
+                sub_row = sub_table[sub_row_index_list[0]]
 
-            missed = True
-            for sub_row_index in sub_row_index_list:
-                sub_row = sub_table[sub_row_index]
-                if row[main_fields] == sub_row[sub_fields]:
-                    if way == "left":
-                        left_row, right_row = row, sub_row
-                    else:
-                        left_row, right_row = sub_row, row
-                    result.append(self._build_row(fields, left_row, right_row))
-                    missed = False
-                    break
-
-            if missed:
-                result.append(self._build_row(fields, left_row, right_row))
+            if way == "left":
+                left_row, right_row = row, sub_row
+            else:
+                left_row, right_row = sub_row, row
+            result.append(self._build_row(fields, left_row, right_row))
 
         return result
 
-    def _table_hash(self, table, fields):
-        hash_row_dict = defaultdict(list)
-        for idx, row in enumerate(table):
-            hash_row_dict[hash(row[fields])].append(idx)
-        return hash_row_dict
-
     def _build_row(self, fields, left_row, right_row):
         if not fields:
             return tuple(left_row) + tuple(right_row)
@@ -516,6 +803,53 @@ class JoinTablePlugin(object):
         return row
 
 
+# 支持缓存索引的表格类型
+_INDEXED_TABLE_TYPES = (BaseLocalTable, ColumnTable)
+
+
+def _table_index(table, fields):
+    """获取表格的哈希索引，本地表格会复用缓存在表格上的索引
+    """
+    if isinstance(table, _INDEXED_TABLE_TYPES):
+        return table.index(fields)
+    return HashIndex(table, fields)
+
+
+def _table_keys(table, fields):
+    """批量提取表格每一行的键
+    """
+    if isinstance(table, _INDEXED_TABLE_TYPES):
+        return table._keys(fields)
+    return [row[fields] for row in table]
+
+
+def _encoded_column(table, fields):
+    """如果关联键是ColumnTable中的单个字典编码列，那么返回该列，否则返回None
+    """
+    if not isinstance(table, ColumnTable) or len(fields) != 1:
+        return None
+    column = table.column(fields[0])
+    if isinstance(column, DictEncodedColumn):
+        return column
+    return None
+
+
+def _join_lookup(main_table, main_fields, sub_table, sub_fields):
+    """准备关联所需的主表键列表以及被关联表的索引，
+       两侧均为字典编码列时，将主表的词表翻译为被关联表的编码，直接在整数编码上进行关联
+    """
+    main_column = _encoded_column(main_table, main_fields)
+    sub_column = _encoded_column(sub_table, sub_fields)
+    if main_column is not None and sub_column is not None:
+        sub_code = sub_column.vocabulary.code
+        translation = [sub_code(value, -1)
+                       for value in main_column.vocabulary.values]
+        keys = [translation[code] for code in main_column.codes]
+        return keys, HashIndex(sub_table, sub_fields, keys=sub_column.codes)
+    return (_table_keys(main_table, main_fields),
+            _table_index(sub_table, sub_fields))
+
+
 class _JoinCondition(object):
 
     """Join 条件"""
@@ -540,34 +874,801 @@ class SplitTablePlugin(object):
 
     name = "split_table"
 
-    def execute(self, context, table, split_condition, variable=None):
+    def execute(self, context, table, split_condition, variable=None,
+                lazy=False, parallel=None, pool_type=ThreadPoolExecutor):
         """
         :param context 上下文对象
         :param table 要分割的table对象
         :param split_condition 接受一个函数对象，参数为一个行对象，结果返回两个值，
-                               第一个为引用的key，第二个为表格名称
+                               第一个为引用的key，第二个为表格名称；
+                               也可以是列名或者列名列表，此时按照列值进行分割，
+                               key为列值，表格名称为"原表名_列值"；
+                               也可以是分区器，比如HashPartitioner、RangePartitioner，
+                               key为分区键，表格名称为"原表名_分区键"
         :param variable 要保存到的上下文变量
+        :param lazy 为True时分割结果为引用原表格行的视图，不复制行数据
+        :param parallel 使用列名或分区器分割时，将表格切分为若干块并行分区，
+                        内置分区器受GIL限制，使用线程池时只有分区器释放GIL才能加速，
+                        gevent进行monkey patch之后会退化为在当前线程中分区
+        :param pool_type 并行分区使用的执行器类型，CPU密集的分区可以使用ProcessPoolExecutor
 
         :return 返回一个字典对象，key为split_condition中返回的引用值，value为表格对象
         """
-        result = {}
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+
+        if isinstance(split_condition, types.StringTypes) or \
+                isinstance(split_condition, SequenceCollectionType):
+            if parallel:
+                buckets = partition_table(
+                    table, ValuePartitioner(split_condition),
+                    parallel, pool_type)
+            else:
+                # 利用表格上缓存的哈希索引进行分组
+                buckets = _table_index(table, split_condition).groups()
+            result = self._split_by_positions(table, buckets, lazy)
+        elif isinstance(split_condition, AbstractPartitioner):
+            buckets = partition_table(
+                table, split_condition, parallel, pool_type)
+            result = self._split_by_positions(table, buckets, lazy)
+        elif lazy:
+            result = self._split_by_condition_lazily(table, split_condition)
+        else:
+            result = self._split_by_condition(table, split_condition)
 
+        if variable:
+            context[variable] = result
+
+        return result
+
+    def _split_by_condition(self, table, split_condition):
+        rows, names = {}, {}
         for row in table:
             split_result = split_condition(row)
             if split_result is None:
                 continue
             ref_key, sub_table_name = split_result
-            if ref_key in result:
-                sub_table = result[ref_key]
-                sub_table.append(row.obj)
+            sub_rows = rows.get(ref_key)
+            if sub_rows is None:
+                rows[ref_key] = [row.obj]
+                names[ref_key] = sub_table_name
+            else:
+                sub_rows.append(row.obj)
+        return {
+            ref_key: TableWrapper(names[ref_key], table.titles,
+                                  convert=False)(rows[ref_key])
+            for ref_key in rows
+        }
+
+    def _split_by_condition_lazily(self, table, split_condition):
+        positions, names = {}, {}
+        for position, row in enumerate(table):
+            split_result = split_condition(row)
+            if split_result is None:
+                continue
+            ref_key, sub_table_name = split_result
+            if ref_key in positions:
+                positions[ref_key].append(position)
+            else:
+                positions[ref_key] = [position]
+                names[ref_key] = sub_table_name
+        return {ref_key: PositionView(table, positions[ref_key],
+                                      names[ref_key])
+                for ref_key in positions}
+
+    def _split_by_positions(self, table, buckets, lazy):
+        """根据分组的行号生成子表格
+        :param buckets (key, 行号列表)序列或者{key: 行号列表}
+        """
+        if isinstance(buckets, types.DictType):
+            buckets = buckets.iteritems()
+        result = {}
+        for key, positions in buckets:
+            sub_table_name = u"{}_{}".format(
+                table.name,
+                "_".join(map(unicode, key))
+                if isinstance(key, tuple) else key)
+            if lazy:
+                result[key] = PositionView(table, positions, sub_table_name)
+                continue
+            if isinstance(table, ColumnTable):
+                result[key] = table.take(positions, sub_table_name)
+                continue
+            if isinstance(table, BaseLocalTable):
+                data = [table._data[position] for position in positions]
+                result[key] = type(table)(sub_table_name, table.titles, data)
+                continue
+            data = [table[position].obj for position in positions]
+            result[key] = TableWrapper(sub_table_name, table.titles,
+                                       convert=False)(data)
+        return result
+
+
+class FilterTablePlugin(object):
+
+    """根据条件过滤表格中的行，条件可以是表达式，例如：
+
+       Job("filter_table", args={
+            "table": "students",
+            "condition": "age > 30 and grade in (1, 2)",
+            "variable": "old_students"
+       })
+
+       表达式只编译一次，并直接作用于表格的底层数据，
+       对于"列 运算符 常量"形式的简单条件，会借助表格上缓存的索引进行查找
+    """
+
+    name = "filter_table"
+
+    def execute(self, context, table, condition, name=None,
+                variable=None, lazy=False):
+        """
+        :param context 上下文对象
+        :param table 要过滤的表格，可以是表格对象，也可以是上下文变量名
+        :param condition 过滤条件，可以是表达式字符串，也可以是接受行对象的函数
+        :param name 结果表格名称，默认与原表格相同
+        :param variable 要保存到的上下文变量
+        :param lazy 为True时返回引用原表格行的视图，不复制行数据
+        """
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+        if name is None:
+            name = table.name
+
+        positions = self._positions(table, condition)
+        result = _take_rows(table, positions, name, lazy)
+
+        if variable:
+            context[variable] = result
+        return result
+
+    def _positions(self, table, condition):
+        if not isinstance(condition, types.StringTypes):
+            return [idx for idx, row in enumerate(table) if condition(row)]
+        expression = compile_expression(condition)
+        positions = self._indexed_positions(table, expression)
+        if positions is not None:
+            return positions
+        if isinstance(table, ColumnTable):
+            # 列式表格直接按列求值，不需要构建行对象
+            columns = {field: table.column(field)
+                       for field in expression.fields}
+            mask = expression.evaluate_columns(columns, len(table))
+            return [idx for idx, matched in enumerate(mask) if matched]
+        function = expression.for_table(table)
+        rows = table._data if isinstance(table, BaseLocalTable) else table
+        return [idx for idx, row in enumerate(rows) if function(row)]
+
+    def _indexed_positions(self, table, expression):
+        """借助索引计算满足条件的行位置，无法使用索引时返回None，
+           等值查询会使用（必要时构建）哈希索引，范围查询只使用已经构建好的有序索引
+        """
+        if not isinstance(table, _INDEXED_TABLE_TYPES):
+            return None
+        comparison = expression.simple_comparison()
+        if comparison is None:
+            return None
+        field, operator_name, value = comparison
+        if field not in [title.name for title in table.titles]:
+            return None
+
+        try:
+            if operator_name == "==":
+                return sorted(table.index(field).positions(value))
+            if operator_name == "in":
+                index = table.index(field)
+                return sorted(position for v in value
+                              for position in index.positions(v))
+        except TypeError:
+            # 不可哈希的值
+            return None
+
+        if ("sorted", field) not in table._indexes:
+            return None
+        index = table.index(field, kind="sorted")
+        if operator_name == "<":
+            positions = index.range(high=value)
+        elif operator_name == "<=":
+            positions = index.range(high=value, include_high=True)
+        elif operator_name == ">":
+            positions = index.range(low=value, include_low=False)
+        else:
+            positions = index.range(low=value)
+        return sorted(positions)
+
+
+def _take_rows(table, positions, name, lazy=False):
+    """按照行号提取表格中的行，lazy为True时返回引用原表格行的视图
+    """
+    if lazy:
+        return PositionView(table, positions, name)
+    if isinstance(table, BaseLocalTable):
+        return type(table)(name, table.titles,
+                           [table._data[p] for p in positions])
+    if isinstance(table, ColumnTable):
+        return table.take(positions, name)
+    return PositionView(table, positions, name).materialize()
+
+
+class DeriveColumnsPlugin(object):
+
+    """根据表达式计算新的列，例如：
+
+       Job("derive_columns", args={
+            "table": "orders",
+            "expressions": [
+                "total = price * qty",
+                (Title("discount", u"折后价"), "total * 0.8"),
+            ],
+            "variable": "orders"
+       })
+
+       表达式按列进行求值，后面的表达式可以引用前面派生的列，与已有列同名时会替换已有列
+    """
+
+    name = "derive_columns"
+
+    def execute(self, context, table, expressions, name=None, variable=None):
+        """
+        :param context 上下文对象
+        :param table 原表格，可以是表格对象，也可以是上下文变量名
+        :param expressions 派生列列表，元素可以是"total = price * qty"形式的字符串，
+                           也可以是(Title对象, 表达式)形式的元组
+        :param name 结果表格名称，默认与原表格相同
+        :param variable 要保存到的上下文变量
+        """
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+
+        titles = list(table.titles)
+        field_names = [title.name for title in titles]
+        columns = {}
+        derived = set()
+
+        for item in expressions:
+            if isinstance(item, SequenceCollectionType):
+                title, expression = item[0], compile_expression(item[1])
+            else:
+                expression = compile_expression(item)
+                if expression.target is None:
+                    raise InvalidArgumentException(
+                        u"派生列表达式'{}'缺少赋值目标".format(
+                            expression.source))
+                title = Title(expression.target)
+
+            for field in expression.fields:
+                if field in columns:
+                    continue
+                if field not in field_names:
+                    raise InvalidArgumentException(
+                        u"表格'{}'中不存在列'{}'".format(table.name, field))
+                columns[field] = _column(table, field)
+            columns[title.name] = expression.evaluate_columns(
+                columns, len(table))
+            derived.add(title.name)
+
+            if title.name in field_names:
+                titles[field_names.index(title.name)] = title
+            else:
+                titles.append(title)
+                field_names.append(title.name)
+
+        name = table.name if name is None else name
+        if isinstance(table, ColumnTable):
+            # 未派生的列需要复制，避免与原表格共享同一个列对象
+            columns = [columns[field] if field in derived
+                       else copy_column(_column(table, field))
+                       for field in field_names]
+            result = ColumnTable(name, titles, columns=columns)
+        else:
+            columns = [columns[field] if field in columns
+                       else _column(table, field) for field in field_names]
+            result = ListTable(name, titles, zip(*columns))
+
+        if variable:
+            context[variable] = result
+        return result
+
+
+class TableStatsPlugin(object):
+
+    """对表格或记录迭代器进行单遍的流式统计，每一列计算计数、空值数、最值、均值、
+       标准差、近似唯一值数目、近似分位数以及随机样本，例如：
+
+       Job("table_stats", args={
+            "table": "orders",
+            "columns": ["amount", "user_id"],
+            "quantiles": (0.5, 0.9, 0.99),
+            "variable": "order_stats"
+       })
+
+       内存占用只与precision、compression以及sample_size有关，与数据量无关，
+       结果为每列一行的ListTable
+    """
+
+    name = "table_stats"
+
+    # 按行统计时每批读取的行数
+    BATCH_SIZE = 4096
+
+    def execute(self, context, table, columns=None, precision=14,
+                compression=100, sample_size=20, quantiles=(0.25, 0.5, 0.75),
+                seed=None, name=None, variable=None):
+        """
+        :param context 上下文对象
+        :param table 要统计的表格，可以是表格对象、上下文变量名，
+                     也可以是字典或序列记录的迭代器，序列记录需要通过columns指定列名
+        :param columns 要统计的列名列表，默认统计全部列
+        :param precision HyperLogLog的精度，相对误差约为1.04 / sqrt(2^precision)
+        :param compression t-digest的压缩参数，越大分位数越精确
+        :param sample_size 每列保留的随机样本数目
+        :param quantiles 要计算的分位点
+        :param seed 抽样的随机数种子
+        :param name 结果表格名称，默认为"原表名_stats"
+        :param variable 要保存到的上下文变量
+        """
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+        for q in quantiles:
+            if not 0 <= q <= 1:
+                raise InvalidArgumentException(u"分位点必须在0~1之间")
+
+        def new_stats(field):
+            return ColumnStats(field, precision, compression,
+                               sample_size, seed)
+
+        if isinstance(table, AbstractTable):
+            fields = list(columns) if columns else \
+                [title.name for title in table.titles]
+            stats = [new_stats(field) for field in fields]
+            self._update_table(table, fields, stats)
+            if name is None:
+                name = u"{}_stats".format(table.name)
+        else:
+            stats = self._update_records(iter(table), columns, new_stats)
+            if name is None:
+                name = u"stats"
+
+        result = self._result_table(name, stats, quantiles)
+        if variable:
+            context[variable] = result
+        return result
+
+    def _update_table(self, table, fields, stats):
+        if isinstance(table, (ListTable, ColumnTable)):
+            # 可以直接按列访问底层数据，逐列统计，不需要构建行对象
+            for field, column_stats in izip(fields, stats):
+                if isinstance(table, ColumnTable):
+                    column_stats.update(table.column(field))
+                else:
+                    column_stats.update(imap(
+                        operator.itemgetter(table._mapping[field]),
+                        table._data))
+            return
+        rows = iter(table)
+        while True:
+            batch = list(islice(rows, self.BATCH_SIZE))
+            if not batch:
+                break
+            for field, column_stats in izip(fields, stats):
+                column_stats.update([row[field] for row in batch])
+
+    def _update_records(self, records, columns, new_stats):
+        batch = list(islice(records, self.BATCH_SIZE))
+        if not batch:
+            return [new_stats(field) for field in columns or ()]
+        if isinstance(batch[0], types.DictType):
+            fields = list(columns) if columns else batch[0].keys()
+            getters = fields
+        elif columns:
+            fields, getters = list(columns), range(len(columns))
+        else:
+            raise InvalidArgumentException(
+                u"统计序列记录时需要通过columns指定列名")
+        stats = [new_stats(field) for field in fields]
+        while batch:
+            for getter, column_stats in izip(getters, stats):
+                column_stats.update(
+                    [record.get(getter) if isinstance(record, types.DictType)
+                     else record[getter] for record in batch])
+            batch = list(islice(records, self.BATCH_SIZE))
+        return stats
+
+    def _result_table(self, name, stats, quantiles):
+        titles = [
+            Title("column", u"列名"),
+            Title("count", u"行数"),
+            Title("nulls", u"空值数"),
+            Title("distinct", u"唯一值数"),
+            Title("min", u"最小值"),
+            Title("max", u"最大值"),
+            Title("mean", u"均值"),
+            Title("stddev", u"标准差"),
+        ]
+        titles.extend(Title("p{:g}".format(q * 100), u"{:g}%分位数".format(
+            q * 100)) for q in quantiles)
+        titles.append(Title("sample", u"样本"))
+        rows = []
+        for column_stats in stats:
+            row = [column_stats.name, column_stats.count, column_stats.nulls,
+                   column_stats.distinct, column_stats.min, column_stats.max,
+                   column_stats.mean, column_stats.stddev]
+            row.extend(column_stats.quantile(q) for q in quantiles)
+            row.append(column_stats.sample)
+            rows.append(row)
+        return ListTable(name, titles, rows)
+
+
+class DiffTablePlugin(object):
+
+    """按照主键比较两个表格，得到新增、删除以及变更的行，例如：
+
+       Job("diff_table", args={
+            "old": "yesterday",
+            "new": "today",
+            "keys": "id",
+            "variable": "delta"
+       })
+
+       每一行只保存主键以及比较列的摘要，两个表格各遍历一次，
+       数据量很大时可以通过spill参数将主键与摘要分区溢出到磁盘
+    """
+
+    name = "diff_table"
+
+    def execute(self, context, old, new, keys, fields=None, name=None,
+                variable=None, lazy=False, spill=False, partitions=16,
+                spill_dir=None):
+        """
+        :param context 上下文对象
+        :param old 旧表格，可以是表格对象，也可以是上下文变量名
+        :param new 新表格，可以是表格对象，也可以是上下文变量名
+        :param keys 主键列，字符串表示单列，列表或元组表示多列
+        :param fields 参与比较的列，默认为新表格中除主键以外的所有列
+        :param name 结果表格名称前缀，默认为新表格的名称
+        :param variable 要保存到的上下文变量
+        :param lazy 为True时结果为引用原表格行的视图，不复制行数据
+        :param spill 是否将主键与摘要溢出到磁盘上分区比较
+        :param partitions 溢出到磁盘时的分区数目
+        :param spill_dir 分区文件所在的目录，默认为系统临时目录
+
+        :return 字典，inserted为新表格中新增的行，deleted为旧表格中被删除的行，
+                changed为新表格中发生变更的行，表格名称分别为"前缀_inserted"等
+        """
+        if isinstance(old, types.StringTypes):
+            old = context[old]
+        if isinstance(new, types.StringTypes):
+            new = context[new]
+        if name is None:
+            name = new.name
+
+        inserted, deleted, changed = diff_table(
+            old, new, keys, fields, spill, partitions, spill_dir)
+        result = {
+            "inserted": _take_rows(new, inserted,
+                                   u"{}_inserted".format(name), lazy),
+            "deleted": _take_rows(old, deleted,
+                                  u"{}_deleted".format(name), lazy),
+            "changed": _take_rows(new, changed,
+                                  u"{}_changed".format(name), lazy),
+        }
+
+        if variable:
+            context[variable] = result
+        return result
+
+
+class TopTablePlugin(object):
+
+    """计算每个分组中排序列最大（或最小）的N行，例如排行榜：
+
+       Job("top_table", args={
+            "table": "scores",
+            "n": 10,
+            "order_by": "score",
+            "group_by": "class_id",
+            "variable": "top10"
+       })
+
+       每个分组只维护一个大小为N的堆，只需要遍历一次表格，不需要对整个表格排序
+    """
+
+    name = "top_table"
+
+    def execute(self, context, table, n, order_by, group_by=None,
+                ascending=False, name=None, variable=None, lazy=False):
+        """
+        :param context 上下文对象
+        :param table 原表格，可以是表格对象，也可以是上下文变量名
+        :param n 每个分组保留的行数
+        :param order_by 排序列，字符串表示单列，列表或元组表示多列
+        :param group_by 分组列，为None时对整个表格计算Top N
+        :param ascending 为True时保留排序列最小的N行
+        :param name 结果表格名称，默认与原表格相同
+        :param variable 要保存到的上下文变量
+        :param lazy 为True时返回引用原表格行的视图，不复制行数据
+
+        :return 结果表格，分组按照首次出现的顺序排列，组内按照排序列排列
+        """
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+        if name is None:
+            name = table.name
+
+        groups = None if group_by is None else _table_keys(table, group_by)
+        positions = top_positions(_table_keys(table, order_by), n,
+                                  groups, ascending)
+        result = _take_rows(table, positions, name, lazy)
+
+        if variable:
+            context[variable] = result
+        return result
+
+
+class WindowTablePlugin(object):
+
+    """在按照分区列、排序列排好序的表格上计算窗口函数，例如7日移动平均：
+
+       Job("window_table", args={
+            "table": "daily_sales",
+            "order_by": "day",
+            "partition_by": "shop_id",
+            "functions": [
+                "rn = row_number()",
+                "prev_amount = lag(amount)",
+                "avg_7d = rolling_avg(amount, \"7d\")",
+            ],
+            "variable": "daily_sales"
+       })
+
+       支持row_number、rank、dense_rank、lag、lead、rolling_sum、rolling_avg、
+       rolling_count，所有函数在一次遍历中完成计算，结果作为新的列追加到表格中
+    """
+
+    name = "window_table"
+
+    def execute(self, context, table, order_by, functions, partition_by=None,
+                sort=False, name=None, variable=None):
+        """
+        :param context 上下文对象
+        :param table 原表格，可以是表格对象，也可以是上下文变量名
+        :param order_by 排序列，rank以及按时间跨度滚动的函数依赖该列
+        :param functions 窗口函数列表，元素可以是"avg_7 = rolling_avg(amount, 7)"
+                         形式的字符串，也可以是(Title对象, "rolling_avg(amount, 7)")
+                         形式的元组
+        :param partition_by 分区列，字符串表示单列，列表或元组表示多列
+        :param sort 表格没有排好序时，设置为True先按照分区列、排序列进行排序
+        :param name 结果表格名称，默认与原表格相同
+        :param variable 要保存到的上下文变量
+        """
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+        if name is None:
+            name = table.name
+
+        compiled = []
+        for item in functions:
+            if isinstance(item, SequenceCollectionType):
+                title = item[0]
+                function = compile_window_function(
+                    u"{} = {}".format(title.name, item[1]))
             else:
-                sub_table = TableWrapper(
-                    sub_table_name,
-                    table.titles
-                )([row.obj])
-                result[ref_key] = sub_table
+                function = compile_window_function(item)
+                title = Title(function.target)
+            compiled.append((title, function))
+
+        if sort:
+            partition_keys = _table_keys(table, partition_by) \
+                if partition_by is not None else [None] * len(table)
+            order_keys = _table_keys(table, order_by)
+            positions = sorted(
+                xrange(len(table)),
+                key=lambda p: (partition_keys[p], order_keys[p]))
+            table = _take_rows(table, positions, name)
+
+        titles = list(table.titles)
+        field_names = [field_title.name for field_title in titles]
+        columns = {}
+        derived = set()
+        order_values = _column(table, order_by)
+        bounds = partition_bounds(
+            _table_keys(table, partition_by) if partition_by is not None
+            else [None] * len(table))
+
+        for title, function in compiled:
+            for field in function.fields:
+                if field in columns:
+                    continue
+                if field not in field_names:
+                    raise InvalidArgumentException(
+                        u"表格'{}'中不存在列'{}'".format(table.name, field))
+                columns[field] = _column(table, field)
+            columns[title.name] = function.evaluate(
+                columns, order_values, bounds)
+            derived.add(title.name)
+            if title.name in field_names:
+                titles[field_names.index(title.name)] = title
+            else:
+                titles.append(title)
+                field_names.append(title.name)
+
+        if isinstance(table, ColumnTable):
+            # 排序之后的表格是新生成的，否则未计算的列需要复制，避免与原表格共享列对象
+            columns = [columns[field] if field in derived
+                       else _column(table, field) if sort
+                       else copy_column(_column(table, field))
+                       for field in field_names]
+            result = ColumnTable(name, titles, columns=columns)
+        else:
+            columns = [columns[field] if field in columns
+                       else _column(table, field) for field in field_names]
+            result = ListTable(name, titles, zip(*columns))
 
         if variable:
             context[variable] = result
+        return result
+
+
+class EnrichTablePlugin(object):
+
+    """根据键从维度表中查找列并追加到事实表或者记录流中，不需要完整的join，例如：
+
+       Job("enrich_table", args={
+            "table": "orders",
+            "dimension": load_shops,
+            "on": "shop_id=id",
+            "fields": ["shop_name", "city"],
+            "cache_key": "shops",
+            "ttl": "10m",
+            "variable": "orders"
+       })
+
+       维度表只会被加载为一个{键: 值元组}的字典，指定cache_key之后，该字典会缓存在插件中，
+       在forever、interval模式下运行的工作流的多次执行之间共享，超过ttl之后重新加载
+    """
+
+    name = "enrich_table"
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def execute(self, context, table, dimension, on, fields=None,
+                cache_key=None, ttl=None, default=None, name=None,
+                variable=None):
+        """
+        :param context 上下文对象
+        :param table 事实表，可以是表格对象、上下文变量名，也可以是字典记录的迭代器，
+                     迭代器会被逐条补全并以生成器的形式返回
+        :param dimension 维度表，可以是表格对象、上下文变量名，
+                         也可以是接受上下文返回表格的函数，只在缓存失效时调用
+        :param on 关联条件，fact_column=dimension_column，多个条件用逗号隔开，
+                  两侧列名相同时可以只写一个列名
+        :param fields 要追加的维度列，元素可以是列名或者Title对象，
+                      默认为维度表中除关联列以外的所有列
+        :param cache_key 跨执行缓存维度字典的键，为None时不缓存
+        :param ttl 缓存的有效期，可以是秒数或者"10m"这样的时间单位，为None时永不过期
+        :param default 找不到维度行时追加的值
+        :param name 结果表格名称，默认与事实表相同
+        :param variable 要保存到的上下文变量
+        """
+        fact_fields, dimension_fields = self._parse_on(on)
+        lookup, titles = self._lookup(context, dimension, dimension_fields,
+                                      fields, cache_key, ttl)
+        defaults = (default,) * len(titles)
+
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+        if isinstance(table, AbstractTable):
+            result = self._enrich_table(table, fact_fields, lookup, titles,
+                                        defaults, name)
+        else:
+            result = self._enrich_records(table, fact_fields, lookup, titles,
+                                          defaults)
 
+        if variable:
+            context[variable] = result
         return result
+
+    def sys_cleanup(self, config):
+        with self._lock:
+            self._cache.clear()
+
+    def _parse_on(self, on):
+        fact_fields, dimension_fields = [], []
+        for statement in on.split(","):
+            if "=" in statement:
+                condition = _JoinCondition.parse(statement)
+                fact_fields.append(condition.left_field)
+                dimension_fields.append(condition.right_field)
+            else:
+                fact_fields.append(statement.strip())
+                dimension_fields.append(statement.strip())
+        return fact_fields, dimension_fields
+
+    def _lookup(self, context, dimension, dimension_fields, fields,
+                cache_key, ttl):
+        """获取维度字典，缓存命中且未过期时直接返回缓存的结果
+        """
+        if cache_key is None:
+            return self._build_lookup(context, dimension, dimension_fields,
+                                      fields)
+        if isinstance(ttl, types.StringTypes):
+            ttl = parse_time_unit(ttl)
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is not None and \
+                    (entry[0] is None or entry[0] > time.time()):
+                return entry[1], entry[2]
+            lookup, titles = self._build_lookup(
+                context, dimension, dimension_fields, fields)
+            expires = None if ttl is None else time.time() + ttl
+            self._cache[cache_key] = (expires, lookup, titles)
+            return lookup, titles
+
+    def _build_lookup(self, context, dimension, dimension_fields, fields):
+        if isinstance(dimension, types.StringTypes):
+            dimension = context[dimension]
+        elif callable(dimension):
+            dimension = dimension(context)
+
+        dimension_titles = {title.name: title for title in dimension.titles}
+        if fields is None:
+            titles = [title for title in dimension.titles
+                      if title.name not in dimension_fields]
+        else:
+            titles = [field if isinstance(field, Title)
+                      else dimension_titles.get(field) or Title(field)
+                      for field in fields]
+        for field in dimension_fields + [title.name for title in titles]:
+            if field not in dimension_titles:
+                raise InvalidArgumentException(
+                    u"维度表'{}'中不存在列'{}'".format(dimension.name, field))
+
+        keys = _table_keys(dimension, dimension_fields[0]
+                           if len(dimension_fields) == 1
+                           else dimension_fields)
+        values = izip(*dimension.columns([title.name for title in titles])) \
+            if titles else [()] * len(keys)
+        # 键重复时后出现的行生效
+        return dict(izip(keys, values)), titles
+
+    def _enrich_table(self, table, fact_fields, lookup, titles, defaults,
+                      name):
+        keys = _table_keys(table, fact_fields[0] if len(fact_fields) == 1
+                           else fact_fields)
+        found = [lookup.get(key, defaults) for key in keys]
+        new_columns = [list(column) for column in izip(*found)] \
+            if found else [[] for _ in titles]
+
+        field_names = [title.name for title in table.titles]
+        result_titles = list(table.titles)
+        columns = table.columns(field_names)
+        if isinstance(table, ColumnTable):
+            # 复制事实表的列，避免结果表格与事实表共享列对象
+            columns = [copy_column(column) for column in columns]
+        for title, column in izip(titles, new_columns):
+            if title.name in field_names:
+                columns[field_names.index(title.name)] = column
+                result_titles[field_names.index(title.name)] = title
+            else:
+                columns.append(column)
+                result_titles.append(title)
+                field_names.append(title.name)
+
+        name = table.name if name is None else name
+        if isinstance(table, ColumnTable):
+            return ColumnTable(name, result_titles, columns=columns)
+        return ListTable(name, result_titles, zip(*columns))
+
+    def _enrich_records(self, records, fact_fields, lookup, titles,
+                        defaults):
+        names = [title.name for title in titles]
+        single = len(fact_fields) == 1
+        for record in records:
+            if not isinstance(record, types.DictType):
+                raise InvalidTypeException(u"记录流中只能包含字典类型的记录")
+            key = record.get(fact_fields[0]) if single \
+                else tuple(record.get(field) for field in fact_fields)
+            record.update(izip(names, lookup.get(key, defaults)))
+            yield record
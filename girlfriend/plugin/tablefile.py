@@ -0,0 +1,74 @@
+# coding: utf-8
+
+"""表格文件读取与写入插件
+表格文件是按列存储的二进制格式，适合在工作流之间传递大型的中间表格，
+具体格式参见girlfriend.data.tablefile
+"""
+
+import types
+from girlfriend.util.lang import args2fields
+from girlfriend.data.encoding import DEFAULT_ENCODE_THRESHOLD
+from girlfriend.data.tablefile import read_table, write_table
+from girlfriend.plugin.data import AbstractDataReader
+
+
+class TableReaderPlugin(object):
+
+    name = "read_table"
+
+    def execute(self, context, *table_readers):
+        return [reader(context) for reader in table_readers]
+
+
+class TableR(AbstractDataReader):
+
+    """表格文件读单元，以单个文件为单位
+    """
+
+    @args2fields()
+    def __init__(self, path, columns=None, lazy=True,
+                 result_wrapper=None, variable=None):
+        """
+        :param path 表格文件路径
+        :param columns 要读取的列名列表，为None时读取全部列
+        :param lazy 为True时列数据在首次访问时才会被加载
+        :param result_wrapper 对最终结果的包装器
+        :param variable context中的引用变量名
+        """
+        pass
+
+    def __call__(self, context):
+        table = read_table(self._path, self._columns, self._lazy)
+        return self._handle_result(context, table)
+
+
+class TableWriterPlugin(object):
+
+    name = "write_table"
+
+    def execute(self, context, *table_writers):
+        return [writer(context) for writer in table_writers]
+
+
+class TableW(object):
+
+    """表格文件写单元，以单个文件为单位
+    """
+
+    @args2fields()
+    def __init__(self, path, table, compression=None,
+                 encode_threshold=DEFAULT_ENCODE_THRESHOLD):
+        """
+        :param path 写入文件路径
+        :param table 要写入的表格，可以是表格对象，也可以是上下文变量名
+        :param compression 压缩方式，None或者"zlib"
+        :param encode_threshold 低基数字符串列进行字典编码的阈值，为None时不进行编码
+        """
+        pass
+
+    def __call__(self, context):
+        table = self._table
+        if isinstance(table, types.StringTypes):
+            table = context[table]
+        return write_table(table, self._path, self._compression,
+                           self._encode_threshold)
@@ -0,0 +1,50 @@
+# coding: utf-8
+
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import Title, ListTable
+from girlfriend.data.console import format_table
+
+
+class ConsoleTableRendererTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.table = ListTable(
+            "students",
+            (Title("id", u"编号"), Title("name"), Title("score")),
+            [(idx, u"小王" if idx % 2 else "Sam", idx * 1.5)
+             for idx in xrange(10)]
+        )
+
+    def test_format(self):
+        lines = format_table(self.table).splitlines()
+        self.assertEquals(lines[0], u"+------+------+-------+")
+        self.assertEquals(lines[1], u"| 编号 | name | score |")
+        self.assertEquals(lines[3], u"|    0 | Sam  |   0.0 |")
+        self.assertEquals(lines[4], u"|    1 | 小王 |   1.5 |")
+        self.assertEquals(len(lines), 14)
+        self.assertEquals(unicode(self.table), format_table(
+            self.table, sample_size=None))
+        self.assertEquals(str(self.table).decode("utf-8"),
+                          unicode(self.table))
+
+    def test_truncate_rows(self):
+        lines = format_table(self.table, max_rows=3).splitlines()
+        self.assertEquals(lines[3], u"|    0 | Sam  |   0.0 |")
+        self.assertEquals(lines[4], u"|    1 | 小王 |   1.5 |")
+        self.assertEquals(lines[5], u"| ...  | ...  | ...   |")
+        self.assertEquals(lines[6], u"|    9 | 小王 |  13.5 |")
+        self.assertEquals(lines[-1], u"10 rows in set (7 rows omitted)")
+
+        lines = format_table(self.table, head=0, tail=1).splitlines()
+        self.assertEquals(lines[4], u"|    9 | 小王 |  13.5 |")
+
+        lines = format_table(self.table, max_rows=10).splitlines()
+        self.assertEquals(len(lines), 14)
+
+    def test_sample(self):
+        table = ListTable("t", (Title("text"),),
+                          [("a",), ("abcdefgh\nij",)])
+        lines = format_table(table, sample_size=1).splitlines()
+        self.assertEquals(lines[4], u"| a... |")
+        lines = format_table(table, sample_size=None).splitlines()
+        self.assertEquals(lines[4], u"| abcdefgh ij |")
@@ -0,0 +1,90 @@
+# coding: utf-8
+
+from decimal import Decimal
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import Title, ListTable, ColumnTable, DictTable
+from girlfriend.data.diff import diff_table
+from girlfriend.exception import InvalidArgumentException
+
+
+class DiffTableTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        titles = (Title("id"), Title("name"), Title("score"))
+        self.old = ListTable("old", titles, [
+            (idx, "user_%d" % idx, idx % 10) for idx in xrange(1000)])
+        new_rows = []
+        for idx in xrange(100, 1100):
+            score = idx % 10
+            if idx % 100 == 0:
+                score = -1
+            new_rows.append((idx, "user_%d" % idx, score))
+        self.new = ListTable("new", titles, new_rows)
+
+    def test_diff(self):
+        for old, new in (
+                (self.old, self.new),
+                (ColumnTable("old", self.old.titles, self.old._data),
+                 ColumnTable("new", self.new.titles, self.new._data))):
+            for spill in (False, True):
+                inserted, deleted, changed = diff_table(
+                    old, new, "id", spill=spill, partitions=4)
+                self.assertEquals(inserted, range(900, 1000))
+                self.assertEquals(deleted, range(100))
+                self.assertEquals(changed, range(0, 900, 100))
+
+        # 只比较name列时，分数的变化会被忽略
+        _, _, changed = diff_table(self.old, self.new, ["id"],
+                                   fields=["name"])
+        self.assertEquals(changed, [])
+
+    def test_composite_keys(self):
+        titles = (Title("shop"), Title("sku"), Title("price"))
+        old = DictTable("old", titles, [
+            {"shop": 1, "sku": "a", "price": 1.0},
+            {"shop": 1, "sku": "b", "price": 2.0},
+            {"shop": 2, "sku": "a", "price": 3.0},
+        ])
+        new = ListTable("new", titles, [
+            (2, "a", 3.5), (1, "a", 1.0), (2, "b", 1.0)])
+        self.assertEquals(diff_table(old, new, ("shop", "sku")),
+                          ([2], [1], [0]))
+        self.assertEquals(
+            diff_table(old, new, ("shop", "sku"), spill=True),
+            ([2], [1], [0]))
+
+    def test_equal_values_of_different_types(self):
+        # CSV读取的字符串为str，数据库返回unicode与long
+        titles = (Title("id"), Title("name"), Title("score"))
+        csv_table = ListTable("csv", titles, [
+            (1, "x", 5), (2, u"北京".encode("utf-8"), 6), (3, "z", 7)])
+        db_table = ListTable("db", titles, [
+            (1L, u"x", 5L), (2L, u"北京", 6), (3L, u"z", 8L)])
+        for spill in (False, True):
+            self.assertEquals(diff_table(csv_table, db_table, "id",
+                                         spill=spill),
+                              ([], [], [2]))
+
+    def test_equal_numbers_of_different_types(self):
+        titles = (Title("id"), Title("amount"))
+        old = ListTable("old", titles, [
+            (1, 5), (2, 1.5), (3, 0.1), (4, 7L), (5, 2.5), (6, None)])
+        new = ListTable("new", titles, [
+            (1, Decimal("5")), (2, Decimal("1.50")), (3, Decimal("0.1")),
+            (4, 7.0), (5, Decimal("2.51")), (6, None)])
+        for spill in (False, True):
+            self.assertEquals(diff_table(old, new, "id", spill=spill),
+                              ([], [], [4]))
+
+    def test_invalid(self):
+        duplicated = ListTable("dup", self.old.titles,
+                               [(1, "a", 1), (1, "b", 2)])
+        self.assertRaises(InvalidArgumentException, diff_table,
+                          duplicated, self.new, "id")
+        self.assertRaises(InvalidArgumentException, diff_table,
+                          self.old, duplicated, "id")
+        self.assertRaises(InvalidArgumentException, diff_table,
+                          self.old, self.new, "missing")
+        self.assertRaises(InvalidArgumentException, diff_table,
+                          self.old, self.new, "id", spill=True,
+                          partitions=0)
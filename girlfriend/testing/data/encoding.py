@@ -0,0 +1,222 @@
+# coding: utf-8
+
+from array import array
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import (
+    Title,
+    ColumnTable,
+    ColumnTableWrapper,
+    TableWrapper
+)
+from girlfriend.data.encoding import (
+    Vocabulary,
+    DictEncodedColumn,
+    KeyCodec,
+    copy_column,
+    encode_column,
+    factorize,
+    factorize_columns
+)
+from girlfriend.data.exception import InvalidSizeException
+from girlfriend.exception import InvalidArgumentException, InvalidTypeException
+
+CITIES = ["beijing", "shanghai", "beijing", "guangzhou"] * 10
+
+
+class _Rows(list):
+
+    keys = ["id", "amount"]
+
+
+class EncodingTestCase(GirlFriendTestCase):
+
+    def test_vocabulary(self):
+        vocabulary = Vocabulary(["a", "b", "a"])
+        self.assertEquals(vocabulary.values, ["a", "b"])
+        self.assertEquals(vocabulary.encode("c"), 2)
+        self.assertEquals(vocabulary.code("b"), 1)
+        self.assertIsNone(vocabulary.code("d"))
+        self.assertEquals(vocabulary.decode(0), "a")
+        self.assertTrue("c" in vocabulary)
+
+    def test_dict_encoded_column(self):
+        column = DictEncodedColumn.encode(["x", "y", "x"])
+        self.assertEquals(list(column.codes), [0, 1, 0])
+        self.assertEquals(list(column), ["x", "y", "x"])
+        self.assertEquals(column[1], "y")
+        self.assertEquals(column[1:], ["y", "x"])
+        column.append("z")
+        self.assertEquals(column.decode(), ["x", "y", "x", "z"])
+        sub_column = column.take([3, 0])
+        self.assertEquals(sub_column.decode(), ["z", "x"])
+        self.assertIs(sub_column.vocabulary, column.vocabulary)
+
+    def test_copy_column(self):
+        column = DictEncodedColumn.encode(["x", "y"])
+        for source in (column, [1, 2], array("l", [1, 2])):
+            copied = copy_column(source)
+            self.assertIsNot(copied, source)
+            self.assertEquals(list(copied), list(source))
+            copied.append(copied[0])
+            self.assertEquals(len(source), 2)
+
+    def test_key_codec(self):
+        vocabulary = Vocabulary(["x", "y"])
+        codec = KeyCodec([vocabulary], False)
+        self.assertEquals(codec.encode("y"), 1)
+        self.assertIsNone(codec.encode("z"))
+        self.assertEquals(codec.decode(0), "x")
+
+        codec = KeyCodec([None, vocabulary], True)
+        self.assertEquals(codec.encode((5, "y")), (5, 1))
+        self.assertIsNone(codec.encode((5, "z")))
+        self.assertIsNone(codec.encode("y"))
+        self.assertEquals(codec.decode((5, 0)), (5, "x"))
+
+    def test_encode_column(self):
+        column = encode_column(CITIES)
+        self.assertIsInstance(column, DictEncodedColumn)
+        self.assertEquals(column.vocabulary.values,
+                          ["beijing", "shanghai", "guangzhou"])
+        self.assertEquals(list(column), CITIES)
+
+        # 行数太少
+        self.assertIsNone(encode_column(CITIES[:4]))
+        # 唯一值太多
+        self.assertIsNone(encode_column(CITIES, threshold=0.05))
+        # 非字符串列
+        self.assertIsNone(encode_column(range(4) * 10))
+        # 不进行编码
+        self.assertIsNone(encode_column(CITIES, threshold=None))
+
+    def test_factorize(self):
+        codes, uniques = factorize(["b", "a", "b"])
+        self.assertEquals(codes, [0, 1, 0])
+        self.assertEquals(uniques, ["b", "a"])
+
+        # 基于整数编码进行分解，唯一值顺序仍按首次出现的顺序
+        column = DictEncodedColumn.encode(["x", "y", "z"])
+        codes, uniques = factorize(column.take([2, 0, 2]))
+        self.assertEquals(codes, [0, 1, 0])
+        self.assertEquals(uniques, ["z", "x"])
+
+        codes, uniques = factorize_columns(
+            [DictEncodedColumn.encode(["a", "a", "b"]), [1, 1, 1]])
+        self.assertEquals(codes, [0, 0, 1])
+        self.assertEquals(uniques, [("a", 1), ("b", 1)])
+
+        self.assertEquals(factorize_columns([], 2), ([0, 0], [()]))
+
+
+class ColumnTableTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.titles = (Title("id"), Title("city"), Title("score"))
+        self.table = ColumnTable(
+            "scores", self.titles,
+            [(idx, city, idx * 10) for idx, city in enumerate(CITIES)])
+
+    def test_columns(self):
+        table = self.table
+        self.assertEquals(table.row_num, 40)
+        self.assertEquals(table.column_num, 3)
+        self.assertIsInstance(table.column("city"), DictEncodedColumn)
+        self.assertIsInstance(table.column("score"), list)
+        self.assertEquals(table[1].city, "shanghai")
+        self.assertEquals(table[1]["score"], 10)
+        self.assertEquals(table.cell(3, 1), "guangzhou")
+        self.assertEquals([row.city for row in table][:2],
+                          ["beijing", "shanghai"])
+
+        # 不进行编码
+        table = ColumnTable("scores", self.titles,
+                            [(0, "beijing", 0)] * 20, encode_threshold=None)
+        self.assertIsInstance(table.column("city"), list)
+
+        self.assertRaises(InvalidSizeException, ColumnTable,
+                          "scores", self.titles, columns=[[1]])
+        self.assertRaises(InvalidArgumentException, ColumnTable,
+                          "scores", self.titles, encode_threshold=2)
+
+    def test_append_and_take(self):
+        table = self.table
+        index = table.index("city")
+        table.append((40, "shenzhen", 400))
+        self.assertEquals(table[40].city, "shenzhen")
+        self.assertIsNot(table.index("city"), index)
+        self.assertEquals(list(table.index("city").positions("shenzhen")),
+                          [40])
+
+        # 数组列中追加空值或者其它类型的值时退化为列表，整行要么全部追加，要么全部不追加
+        numbers = ColumnTableWrapper("numbers")(_Rows([(1, 1.5), (2, 2.5)]))
+        self.assertIsInstance(numbers.column("id"), array)
+        numbers.append((None, 3))
+        self.assertEquals([tuple(row) for row in numbers],
+                          [(1, 1.5), (2, 2.5), (None, 3)])
+        self.assertIsInstance(numbers.column("id"), list)
+        self.assertIsInstance(numbers.column("amount"), list)
+        self.assertRaises(InvalidSizeException, numbers.append, (1,))
+        self.assertEquals(len(numbers), 3)
+
+        sub_table = table.take([0, 40], "sub")
+        self.assertEquals(sub_table.name, "sub")
+        self.assertEquals([tuple(row) for row in sub_table],
+                          [(0, "beijing", 0), (40, "shenzhen", 400)])
+        self.assertIs(sub_table.column("city").vocabulary,
+                      table.column("city").vocabulary)
+
+        # 无法哈希的值使字典编码列退化为列表
+        table.append((41, {"unhashable": True}, 410))
+        self.assertEquals(table[41].city, {"unhashable": True})
+        self.assertEquals(table[40].city, "shenzhen")
+
+    def test_group_on_codes(self):
+        keys, codec = self.table._encoded_keys("city")
+        self.assertEquals(keys[:4], [0, 1, 0, 2])
+        self.assertIsNotNone(codec)
+        self.assertIsNone(self.table._encoded_keys("id")[1])
+
+        groups = dict(self.table.index("city").groups())
+        self.assertEquals(sorted(groups), ["beijing", "guangzhou", "shanghai"])
+        self.assertEquals(groups["shanghai"][:2], [1, 5])
+        self.assertEquals(
+            list(self.table.index(("city", "score")).positions(
+                ("guangzhou", 30))), [3])
+        self.assertEquals(
+            list(self.table.index(("city", "score")).positions(
+                ("shenzhen", 30))), [])
+
+    def test_table_wrapper(self):
+        table = TableWrapper("scores", self.titles, table_type=ColumnTable)(
+            [(idx, city, 0) for idx, city in enumerate(CITIES)])
+        self.assertIsInstance(table, ColumnTable)
+        self.assertIsInstance(table.column("city"), DictEncodedColumn)
+
+    def test_column_table_wrapper(self):
+        class Batches(object):
+            keys = ["id", "city", "score"]
+
+            def batches(self):
+                for offset in xrange(0, len(CITIES), 7):
+                    yield [(idx, CITIES[idx], idx * 0.5) for idx in
+                           xrange(offset, min(offset + 7, len(CITIES)))]
+
+        table = ColumnTableWrapper("scores")(Batches())
+        self.assertEquals([title.name for title in table.titles],
+                          Batches.keys)
+        self.assertEquals(table.row_num, 40)
+        self.assertIsInstance(table.column("id"), array)
+        self.assertIsInstance(table.column("score"), array)
+        self.assertIsInstance(table.column("city"), DictEncodedColumn)
+        self.assertEquals(tuple(table[3]), (3, "guangzhou", 1.5))
+
+        # 普通的行序列，数值列中出现空值时退化为列表
+        rows = [(idx, CITIES[idx], idx) for idx in xrange(40)]
+        rows[35] = (35, "beijing", None)
+        table = ColumnTableWrapper("scores", self.titles)(rows)
+        self.assertIsInstance(table.column("id"), array)
+        self.assertIsInstance(table.column("score"), list)
+        self.assertEquals([tuple(row) for row in table], rows)
+
+        self.assertRaises(InvalidTypeException,
+                          ColumnTableWrapper("scores"), rows)
@@ -0,0 +1,91 @@
+# coding: utf-8
+
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import (
+    Title,
+    ListTable,
+    DictTable,
+    ObjectTable
+)
+from girlfriend.data.view import FilterView
+from girlfriend.data.expression import Expression, compile_expression
+from girlfriend.exception import InvalidArgumentException
+
+
+class Item(object):
+
+    def __init__(self, price, qty):
+        self.price = price
+        self.qty = qty
+
+
+class ExpressionTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.titles = (Title("price"), Title("qty"), Title("grade"))
+        self.table = ListTable("items", self.titles, [
+            (2.0, 3, 1),
+            (1.5, 10, 2),
+            (3.0, 1, 3),
+        ])
+
+    def test_parse(self):
+        e = Expression("total = price * qty")
+        self.assertEquals(e.target, "total")
+        self.assertEquals(e.fields, ("price", "qty"))
+
+        e = Expression("price == qty and abs(grade) >= 1")
+        self.assertIsNone(e.target)
+        self.assertEquals(e.fields, ("price", "qty", "grade"))
+
+        self.assertIs(compile_expression(e), e)
+
+        for bad in ("price.__class__", "__import__('os')",
+                    "lambda: 1", "price +", "[x for x in qty]",
+                    "float(price, base=10)"):
+            self.failUnlessException(InvalidArgumentException,
+                                     Expression, bad)
+
+    def test_evaluate(self):
+        e = Expression("price * qty > 5 and grade in (1, 2)")
+        self.assertEquals(e.mask(self.table), [True, True, False])
+        self.assertEquals(Expression("total = price * qty").evaluate(
+            self.table), [6.0, 15.0, 3.0])
+        self.assertEquals(Expression("'high' if grade > 1 else 'low'")
+                          .evaluate(self.table), ["low", "high", "high"])
+        self.failUnlessException(InvalidArgumentException,
+                                 Expression("missing + 1").evaluate,
+                                 self.table)
+
+    def test_other_tables(self):
+        e = Expression("price * qty")
+        dict_table = DictTable("items", self.titles[:2], [
+            {"price": 2, "qty": 3}, {"price": 1, "qty": 1}])
+        self.assertEquals(e.evaluate(dict_table), [6, 1])
+
+        object_table = ObjectTable("items", self.titles[:2], [
+            Item(2, 3), Item(4, 4)])
+        self.assertEquals(e.evaluate(object_table), [6, 16])
+
+        view = FilterView(self.table, lambda row: row.grade > 1)
+        self.assertEquals(e.evaluate(view), [15.0, 3.0])
+
+    def test_evaluate_columns(self):
+        e = Expression("price * qty + 1")
+        self.assertEquals(
+            e.evaluate_columns({"price": [1, 2], "qty": [3, 4]}), [4, 9])
+        self.assertEquals(Expression("abs(price)").evaluate_columns(
+            {"price": [-1, 2]}), [1, 2])
+        self.assertEquals(Expression("1").evaluate_columns({}, 3), [1, 1, 1])
+        self.failUnlessException(InvalidArgumentException,
+                                 e.evaluate_columns, {"price": [1]})
+
+    def test_simple_comparison(self):
+        self.assertEquals(Expression("grade == 1").simple_comparison(),
+                          ("grade", "==", 1))
+        self.assertEquals(Expression("3 > grade").simple_comparison(),
+                          ("grade", "<", 3))
+        self.assertEquals(Expression("grade in (1, 2)").simple_comparison(),
+                          ("grade", "in", frozenset((1, 2))))
+        self.assertIsNone(Expression("grade + 1 == 2").simple_comparison())
+        self.assertIsNone(Expression("grade == qty").simple_comparison())
@@ -0,0 +1,86 @@
+# coding: utf-8
+
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import (
+    Title,
+    ListTable,
+    DictTable
+)
+from girlfriend.data.index import (
+    HashIndex,
+    UniqueHashIndex,
+    SortedIndex
+)
+from girlfriend.data.exception import DuplicateKeyException
+from girlfriend.exception import InvalidArgumentException
+
+
+class IndexTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.table = ListTable(
+            "students",
+            (Title("id"), Title("name"), Title("age"), Title("grade")),
+            [
+                (1, "Sam", 26, "A"),
+                (2, "Jack", 31, "B"),
+                (3, "James", 18, "A"),
+                (4, "Betty", 22, "B"),
+                (5, "Lucy", 26, "A"),
+            ]
+        )
+
+    def test_hash_index(self):
+        index = self.table.index("grade")
+        self.assertIsInstance(index, HashIndex)
+        self.assertEquals(list(index.positions("A")), [0, 2, 4])
+        self.assertEquals([row.name for row in index.rows("B")],
+                          ["Jack", "Betty"])
+        self.assertEquals(list(index.positions("C")), [])
+        self.assertTrue("A" in index)
+
+        # 组合索引的键为元组
+        index = self.table.index(["grade", "age"])
+        self.assertEquals(list(index.positions(("A", 26))), [0, 4])
+
+    def test_unique_index(self):
+        index = self.table.index("id", kind="unique")
+        self.assertIsInstance(index, UniqueHashIndex)
+        self.assertEquals(index.row(3).name, "James")
+        self.assertIsNone(index.row(10))
+
+        self.failUnlessException(
+            DuplicateKeyException, self.table.index, "grade", "unique")
+        self.failUnlessException(
+            InvalidArgumentException, self.table.index, "grade", "btree")
+
+    def test_sorted_index(self):
+        index = self.table.index("age", kind="sorted")
+        self.assertIsInstance(index, SortedIndex)
+        self.assertEquals([row.age for row in index.range_rows(20, 26)],
+                          [22])
+        self.assertEquals(
+            [row.age for row in index.range_rows(
+                20, 26, include_high=True)], [22, 26, 26])
+        self.assertEquals(
+            [row.age for row in index.range_rows(
+                low=22, include_low=False)], [26, 26, 31])
+        self.assertEquals([row.id for row in index.range_rows(high=22)],
+                          [3])
+        self.assertEquals(index.positions(26), [0, 4])
+
+    def test_cache(self):
+        index = self.table.index("grade")
+        self.assertIs(index, self.table.index("grade"))
+
+        # append会使缓存的索引失效
+        self.table.append((6, "Tom", 20, "C"))
+        index = self.table.index("grade")
+        self.assertEquals(list(index.positions("C")), [5])
+
+    def test_dict_table(self):
+        table = DictTable(
+            "students", (Title("id"), Title("name")),
+            [{"id": 1, "name": "Sam"}, {"id": 2, "name": "Jack"}]
+        )
+        self.assertEquals(table.index("name").rows("Jack")[0].id, 2)
@@ -0,0 +1,92 @@
+# coding: utf-8
+
+import sys
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import Title, ListTable, ColumnTable
+from girlfriend.data.partition import (
+    HashPartitioner,
+    ValuePartitioner,
+    RangePartitioner,
+    partition_table
+)
+from girlfriend.exception import InvalidArgumentException
+
+
+class PartitionTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.table = ListTable(
+            "users", (Title("id"), Title("region"), Title("age")),
+            [(idx, ("north", "south", "east")[idx % 3], idx % 70)
+             for idx in xrange(1000)]
+        )
+
+    def test_hash(self):
+        result = partition_table(self.table, HashPartitioner("id", 4))
+        self.assertEquals(sorted(result), [0, 1, 2, 3])
+        self.assertEquals(result[1][:2], [1, 5])
+        self.assertEquals(sum(len(positions) for positions in
+                              result.values()), 1000)
+        self.assertRaises(InvalidArgumentException, HashPartitioner, "id", 0)
+
+    def test_value(self):
+        result = partition_table(self.table,
+                                 ValuePartitioner(["region", "age"]))
+        self.assertEquals(result[("south", 1)][:2], [1, 211])
+
+    def test_range(self):
+        result = partition_table(self.table,
+                                 RangePartitioner("age", [18, 60]))
+        self.assertEquals(sorted(result), [0, 1, 2])
+        self.assertEquals(result[0][17:19], [17, 70])
+        self.assertEquals(result[2][:2], [60, 61])
+        self.assertRaises(InvalidArgumentException,
+                          RangePartitioner, "age", [60, 18])
+
+    def test_parallel(self):
+        for partitioner in (HashPartitioner("id", 4),
+                            ValuePartitioner("region"),
+                            RangePartitioner("age", [18, 60])):
+            expected = partition_table(self.table, partitioner)
+            self.assertEquals(
+                partition_table(self.table, partitioner, parallel=3),
+                expected)
+
+    def test_encoded(self):
+        # 字典编码列按编码分区，结果与按列值分区一致，哈希分区的空分区也会保留
+        table = ColumnTable(self.table.name, self.table.titles,
+                            [tuple(row) for row in self.table])
+        self.assertEquals(table.column("region").vocabulary.values,
+                          ["north", "south", "east"])
+        for partitioner in (HashPartitioner("region", 8),
+                            ValuePartitioner(["region", "age"]),
+                            RangePartitioner("region", ["m", "s"])):
+            self.assertEquals(partition_table(table, partitioner),
+                              partition_table(self.table, partitioner))
+
+    def test_gevent_patched(self):
+        # gevent进行monkey patch之后不使用执行器，直接在当前线程中分区
+        class Monkey(object):
+
+            @staticmethod
+            def is_module_patched(name):
+                return True
+
+        class FailingPool(object):
+
+            def __init__(self, max_workers):
+                raise AssertionError(u"不应该创建执行器")
+
+        monkey = sys.modules.get("gevent.monkey")
+        sys.modules["gevent.monkey"] = Monkey()
+        try:
+            partitioner = HashPartitioner("id", 4)
+            self.assertEquals(
+                partition_table(self.table, partitioner, parallel=2,
+                                pool_type=FailingPool),
+                partition_table(self.table, partitioner))
+        finally:
+            if monkey is None:
+                del sys.modules["gevent.monkey"]
+            else:
+                sys.modules["gevent.monkey"] = monkey
@@ -0,0 +1,146 @@
+# coding: utf-8
+
+from array import array
+from decimal import Decimal
+from datetime import date, datetime
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import (
+    Title,
+    ListTable,
+    DictTable,
+    ColumnTable,
+    TableWrapper
+)
+from girlfriend.data.schema import convert_records, ColumnBuilder
+from girlfriend.data.exception import ConvertException, InvalidSizeException
+from girlfriend.exception import InvalidArgumentException
+
+
+class SchemaTestCase(GirlFriendTestCase):
+
+    def test_converters(self):
+        self.assertIsNone(Title("id").converter)
+        self.assertEquals(Title("id", type="int").converter("12"), 12)
+        self.assertEquals(Title("x", type="float").converter("1.5"), 1.5)
+        self.assertEquals(Title("x", type="decimal").converter(" 1.10 "),
+                          Decimal("1.10"))
+        self.assertEquals(Title("x", type="decimal").converter(0.1),
+                          Decimal("0.1"))
+        self.assertEquals(Title("x", type="date").converter("2016-01-02"),
+                          date(2016, 1, 2))
+        self.assertEquals(
+            Title("x", type="date").converter(datetime(2016, 1, 2, 3)),
+            date(2016, 1, 2))
+        self.assertEquals(
+            Title("x", type="datetime", format="%Y/%m/%d %H:%M").converter(
+                "2016/01/02 03:04"),
+            datetime(2016, 1, 2, 3, 4))
+        self.assertEquals(Title("x", type="bool").converter("Yes"), True)
+        self.assertEquals(Title("x", type="bool").converter("0"), False)
+        self.assertEquals(Title("x", type="str").converter(12), u"12")
+        self.assertEquals(Title("x", type="str").converter(""), "")
+
+    def test_nullable(self):
+        self.assertIsNone(Title("id", type="int").converter(""))
+        self.assertIsNone(Title("id", type="int").converter(None))
+        converter = Title("id", type="int", nullable=False).converter
+        self.assertRaises(ConvertException, converter, "")
+        self.assertRaises(ConvertException, converter, None)
+
+    def test_invalid(self):
+        self.assertRaises(InvalidArgumentException, Title, "id", type="long")
+        self.assertRaises(ConvertException,
+                          Title("id", type="int").converter, "abc")
+        self.assertRaises(ConvertException,
+                          Title("x", type="bool").converter, "maybe")
+        self.assertRaises(ConvertException,
+                          Title("x", type="decimal").converter, "1.x")
+
+        # 整数列不截断小数部分
+        converter = Title("id", type="int").converter
+        self.assertEquals(converter(3.0), 3)
+        self.assertEquals(converter(Decimal("4.00")), 4)
+        self.assertRaises(ConvertException, converter, 3.7)
+        self.assertRaises(ConvertException, converter, Decimal("3.7"))
+        self.assertRaises(ConvertException, converter, float("nan"))
+
+    def test_convert_records(self):
+        titles = (Title("id", type="int"), Title("name"),
+                  Title("score", type="float"))
+        self.assertEquals(
+            convert_records(titles, [["1", "Sam", "9.5"], ["2", "Jack", ""]]),
+            [(1, "Sam", 9.5), (2, "Jack", None)])
+
+        records = [{"id": "1", "name": "Sam", "score": "9"}]
+        self.assertIs(convert_records(titles, records), records)
+        self.assertEquals(records[0], {"id": 1, "name": "Sam", "score": 9.0})
+
+        # ORM实体等对象记录按属性原地转换
+        class User(object):
+
+            def __init__(self, id, name, score):
+                self.id, self.name, self.score = id, name, score
+
+        users = [User("3", "Tom", "8.5"), User(4.0, "Lily", None)]
+        self.assertIs(convert_records(titles, users), users)
+        self.assertEquals([(user.id, user.score) for user in users],
+                          [(3, 8.5), (4, None)])
+        self.assertRaises(ConvertException, convert_records, titles,
+                          [object()])
+
+        untyped = (Title("id"),)
+        rows = [["1"]]
+        self.assertIs(convert_records(untyped, rows), rows)
+
+        # 行的列数必须与标题数一致
+        self.assertRaises(InvalidSizeException, convert_records, titles,
+                          [(1, "Sam", "2", 9)])
+        self.assertRaises(InvalidSizeException, convert_records, titles,
+                          [(1, "Sam", "2"), (1,)])
+
+    def test_table_wrapper(self):
+        titles = (Title("id", type="int", nullable=False),
+                  Title("joined", type="date"))
+        table = TableWrapper("users", titles)([["1", "2016-05-01"]])
+        self.assertIsInstance(table, ListTable)
+        self.assertEquals(tuple(table[0]), (1, date(2016, 5, 1)))
+
+        table = TableWrapper("users", titles)(
+            [{"id": "2", "joined": None}])
+        self.assertIsInstance(table, DictTable)
+        self.assertEquals(table[0].id, 2)
+
+        table = TableWrapper("users", titles, convert=False)([["1", None]])
+        self.assertEquals(table[0].id, "1")
+
+        table = TableWrapper("users", titles, table_type=ColumnTable)(
+            [[str(idx), None] for idx in xrange(5)])
+        self.assertIsInstance(table.column("id"), array)
+        self.assertEquals(list(table.column("id")), range(5))
+
+    def test_column_builder(self):
+        builder = ColumnBuilder()
+        self.assertEquals(builder.build(), [])
+        builder.extend((1, 2))
+        builder.extend(())
+        builder.extend((3,))
+        self.assertEquals(builder.build(), array("l", [1, 2, 3]))
+        builder.extend((4.5, None))
+        self.assertEquals(builder.build(), [1, 2, 3, 4.5, None])
+
+        builder = ColumnBuilder(Title("amount", type="float",
+                                      nullable=False))
+        builder.extend(("1.5", 2))
+        self.assertEquals(builder.build(), array("d", [1.5, 2.0]))
+
+        builder = ColumnBuilder()
+        builder.extend((Decimal("1.5"),))
+        self.assertEquals(builder.build(), [Decimal("1.5")])
+
+        # 数据库驱动返回的long在范围内时同样使用数组存储
+        builder = ColumnBuilder()
+        builder.extend((1L, 2))
+        builder.extend((3L,))
+        self.assertEquals(builder.build(), array("l", [1, 2, 3]))
+        builder.extend((2 ** 70,))
+        self.assertEquals(builder.build(), [1, 2, 3, 2 ** 70])
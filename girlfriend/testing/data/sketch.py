@@ -0,0 +1,96 @@
+# coding: utf-8
+
+import random
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.sketch import (
+    HyperLogLog,
+    TDigest,
+    ReservoirSample,
+    ColumnStats
+)
+from girlfriend.exception import InvalidArgumentException
+
+
+class HyperLogLogTestCase(GirlFriendTestCase):
+
+    def test_count(self):
+        hll = HyperLogLog(12)
+        hll.update(xrange(100000))
+        self.assertTrue(abs(hll.count() - 100000) < 100000 * 0.05)
+
+        # 少量数据时使用线性计数，结果几乎是精确的
+        hll = HyperLogLog()
+        hll.update("user_%d" % (idx % 100) for idx in xrange(10000))
+        self.assertEquals(hll.count(), 100)
+
+        self.assertRaises(InvalidArgumentException, HyperLogLog, 20)
+
+    def test_merge(self):
+        left, right = HyperLogLog(), HyperLogLog()
+        left.update(xrange(0, 3000))
+        right.update(xrange(2000, 5000))
+        left.merge(right)
+        self.assertTrue(abs(len(left) - 5000) < 5000 * 0.05)
+        self.assertRaises(InvalidArgumentException,
+                          left.merge, HyperLogLog(10))
+
+
+class TDigestTestCase(GirlFriendTestCase):
+
+    def test_quantile(self):
+        digest = TDigest()
+        values = range(100001)
+        random.Random(1).shuffle(values)
+        digest.update(values)
+        self.assertEquals(digest.count, 100001)
+        self.assertEquals(digest.quantile(0), 0)
+        self.assertEquals(digest.quantile(1), 100000)
+        for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+            self.assertTrue(abs(digest.quantile(q) - q * 100000) < 500)
+        # 质心数目有界
+        self.assertTrue(len(digest._means) < 1000)
+
+        self.assertEquals(TDigest().quantile(0.5), None)
+        self.assertRaises(InvalidArgumentException, digest.quantile, 1.5)
+
+
+class ReservoirSampleTestCase(GirlFriendTestCase):
+
+    def test_sample(self):
+        reservoir = ReservoirSample(10, seed=7)
+        reservoir.update(xrange(5))
+        self.assertEquals(reservoir.sample, [0, 1, 2, 3, 4])
+
+        reservoir.update(xrange(5, 100000))
+        sample = reservoir.sample
+        self.assertEquals(len(sample), 10)
+        self.assertEquals(len(set(sample)), 10)
+        self.assertEquals(reservoir.count, 100000)
+        # 固定种子时结果可以复现
+        other = ReservoirSample(10, seed=7)
+        other.update(xrange(100000))
+        self.assertEquals(other.sample, sample)
+
+
+class ColumnStatsTestCase(GirlFriendTestCase):
+
+    def test_update(self):
+        stats = ColumnStats("score", sample_size=3, seed=1)
+        stats.update([1, 2, None, 3, 4, None, 5])
+        self.assertEquals(stats.count, 7)
+        self.assertEquals(stats.nulls, 2)
+        self.assertEquals((stats.min, stats.max), (1, 5))
+        self.assertEquals(stats.mean, 3.0)
+        self.assertAlmostEquals(stats.stddev, 1.5811388, places=6)
+        self.assertEquals(stats.distinct, 5)
+        self.assertEquals(stats.quantile(0.5), 3)
+        self.assertEquals(len(stats.sample), 3)
+
+        # 非数值列只统计计数、最值、唯一值以及样本
+        stats = ColumnStats("name")
+        stats.update(["b", "a", None, "c", "a"])
+        self.assertEquals((stats.min, stats.max), ("a", "c"))
+        self.assertEquals(stats.distinct, 3)
+        self.assertEquals(stats.mean, None)
+        self.assertEquals(stats.stddev, None)
+        self.assertEquals(stats.quantile(0.5), None)
@@ -7,7 +7,10 @@ from girlfriend.data.table import (
     ObjectTable,
     DictTable
 )
-from girlfriend.data.exception import InvalidSizeException
+from girlfriend.data.exception import (
+    InvalidSizeException,
+    MissingKeyException
+)
 
 
 class ListTableTestCase(GirlFriendTestCase):
@@ -73,6 +76,28 @@ class ListTableTestCase(GirlFriendTestCase):
             self.assertEquals(
                 (row.id, row.name, row.age, row.grade), data[idx])
 
+    def test_column(self):
+        column = self.wrapped_table.column("name")
+        self.assertEquals(column, ["Sam", "Jack", "James"])
+        # 列数据会被缓存
+        self.assertIs(self.wrapped_table.column("name"), column)
+        self.assertEquals(self.wrapped_table.columns(["id", "grade"]),
+                          [[1, 2, 3], ["A", "B", "C"]])
+        self.failUnlessException(MissingKeyException,
+                                 self.wrapped_table.column, "missing")
+
+        # 添加新行后缓存失效
+        self.wrapped_table.append((4, "Betty", 21, "A"))
+        self.assertEquals(self.wrapped_table.column("name"),
+                          ["Sam", "Jack", "James", "Betty"])
+
+        # 不允许为空的数值列以array存储
+        table = ListTable("typed", (Title("id", type="int", nullable=False),
+                                    Title("score", type="float")),
+                          [(1, 1.5), (2, None)])
+        self.assertEquals(table.column("id").typecode, "l")
+        self.assertEquals(table.column("score"), [1.5, None])
+
 
 class Student(object):
 
@@ -117,6 +142,14 @@ class ObjectTableTestCase(GirlFriendTestCase):
                 (std.id, std.name, std.grade)
             )
 
+    def test_column(self):
+        self.assertEquals(self.wrapped_table.column("name"),
+                          ["Sam", "Jack", "Peter"])
+        self.table.append(Student(4, "James", 2))
+        self.assertEquals(self.table.column("grade"), [2])
+        self.table.append(Student(5, "Lily", 3))
+        self.assertEquals(self.table.column("grade"), [2, 3])
+
 
 class DictTableTestCase(GirlFriendTestCase):
 
@@ -151,3 +184,9 @@ class DictTableTestCase(GirlFriendTestCase):
                 row["id", "name", "grade"],
                 tuple(record[k] for k in ("id", "name", "grade"))
             )
+
+    def test_column(self):
+        self.assertEquals(self.wrapped_table.columns(("id", "name")),
+                          [[1, 2, 3], ["Sam", "Jack", "Peter"]])
+        self.table.append({"id": 4, "name": "James", "grade": 2})
+        self.assertEquals(self.table.column("id"), [4])
@@ -0,0 +1,147 @@
+# coding: utf-8
+
+import os
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import (
+    Title,
+    ListTable,
+    DictTable,
+    ColumnTable
+)
+from girlfriend.data.encoding import DictEncodedColumn
+from girlfriend.data.tablefile import (
+    MappedTable,
+    TableFileWriter,
+    read_table,
+    write_table
+)
+from girlfriend.data.exception import (
+    MissingKeyException,
+    InvalidTableFileException
+)
+from girlfriend.exception import InvalidArgumentException
+from girlfriend.plugin.table import HTMLTableRenderer
+
+TITLES = (Title("id", u"编号"), Title("city", u"城市"),
+          Title("amount"), Title("remark"))
+
+ROWS = [(idx, ("beijing", "shanghai")[idx % 2], idx * 1.5,
+         None if idx % 3 else {"idx": idx})
+        for idx in xrange(30)]
+
+
+class TableFileTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.path = "test_table.gft"
+        self.table = ListTable(u"订单", TITLES, ROWS)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_write_and_read(self):
+        for compression in (None, "zlib"):
+            write_table(self.table, self.path, compression=compression)
+            table = read_table(self.path)
+            self.assertIsInstance(table, MappedTable)
+            self.assertEquals(table.name, u"订单")
+            self.assertEquals([title.title for title in table.titles],
+                              [u"编号", u"城市", "amount", "remark"])
+            self.assertEquals(len(table), 30)
+            self.assertFalse(table.is_loaded("id"))
+            self.assertEquals([tuple(row) for row in table], ROWS)
+            self.assertTrue(table.is_loaded("id"))
+            self.assertIsInstance(table.column("city"), DictEncodedColumn)
+            self.assertEquals(table[3].remark, {"idx": 3})
+
+    def test_row_access(self):
+        write_table(self.table, self.path)
+        table = read_table(self.path, columns=(u"city", "id"))
+        self.assertIsInstance(table.titles[0].name, str)
+        self.assertEquals(table[1]["city"], "shanghai")
+        self.assertEquals(table[1][table.titles[1].name], 1)
+
+        fragments = []
+        HTMLTableRenderer(read_table(self.path)).render(fragments.append)
+        html = u"".join(fragments)
+        self.assertIn(u"<td >shanghai</td>", html)
+        self.assertIn(u"城市", html)
+
+    def test_lazy_columns(self):
+        write_table(self.table, self.path)
+        table = read_table(self.path, columns=("amount", "id"))
+        self.assertEquals([title.name for title in table.titles],
+                          ["amount", "id"])
+        self.assertEquals(table.column("id")[29], 29)
+        self.assertFalse(table.is_loaded("amount"))
+        self.assertEquals(table.row_num, 30)
+
+        table = read_table(self.path, lazy=False)
+        self.assertTrue(all(table.is_loaded(title.name)
+                            for title in table.titles))
+
+        self.assertRaises(MissingKeyException, read_table,
+                          self.path, columns=("missing",))
+
+    def test_append(self):
+        write_table(self.table, self.path)
+        table = read_table(self.path)
+        table.append((30, "shenzhen", 0.5, None))
+        self.assertEquals(len(table), 31)
+        self.assertEquals(list(table.index("city").positions("shenzhen")),
+                          [30])
+
+    def test_other_tables(self):
+        table = DictTable("dict_table", (Title("id"), Title("name")),
+                          [{"id": 1, "name": "Sam"}, {"id": 2, "name": None}])
+        write_table(table, self.path)
+        result = read_table(self.path)
+        self.assertEquals([tuple(row) for row in result],
+                          [(1, "Sam"), (2, None)])
+
+        table = ColumnTable("empty", (Title("id"),))
+        write_table(table, self.path)
+        self.assertEquals(len(read_table(self.path)), 0)
+
+    def test_schema(self):
+        titles = (Title("id", type="int", nullable=False),
+                  Title("day", type="date", format="%Y%m%d"))
+        table = ListTable("typed", titles, [(1, None)])
+        write_table(table, self.path)
+        title_id, title_day = read_table(self.path).titles
+        self.assertEquals((title_id.type, title_id.nullable), ("int", False))
+        self.assertEquals((title_day.type, title_day.format),
+                          ("date", "%Y%m%d"))
+
+    def test_invalid(self):
+        self.assertRaises(InvalidArgumentException, write_table,
+                          self.table, self.path, compression="lzma")
+        with open(self.path, "wb") as f:
+            f.write("id,name\n1,Sam\n")
+        self.assertRaises(InvalidTableFileException, read_table, self.path)
+
+    def test_writer(self):
+        for compression in (None, "zlib"):
+            with TableFileWriter(self.path, u"订单", TITLES,
+                                 compression=compression) as writer:
+                for start in xrange(0, 30, 7):
+                    writer.write_rows(ROWS[start:start + 7])
+            self.assertEquals(writer.row_num, 30)
+            table = read_table(self.path)
+            self.assertEquals(table.name, u"订单")
+            self.assertEquals([tuple(row) for row in table], ROWS)
+            self.assertIsInstance(table.column("city"), DictEncodedColumn)
+
+        # 不同分块的类型不一致
+        titles = (Title("value"),)
+        with TableFileWriter(self.path, "mixed", titles) as writer:
+            writer.write_rows([(1,), (2,)])
+            writer.write_rows([(1.5,), (None,)])
+            writer.write_rows([("a",), ("b",)])
+        self.assertEquals(list(read_table(self.path).column("value")),
+                          [1, 2, 1.5, None, "a", "b"])
+
+        with TableFileWriter(self.path, "empty", titles):
+            pass
+        self.assertEquals(len(read_table(self.path)), 0)
@@ -0,0 +1,97 @@
+# coding: utf-8
+
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import (
+    Title,
+    ListTable,
+    DictTable
+)
+from girlfriend.data.view import (
+    FilterView,
+    ProjectView,
+    SliceView,
+    ConcatView,
+    PositionView
+)
+from girlfriend.data.exception import IndexOutOfBoundsException
+from girlfriend.exception import (
+    InvalidArgumentException,
+    UnsupportMethodException
+)
+
+
+class TableViewTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.titles = (Title("id"), Title("name"), Title("age"))
+        self.data = [
+            [1, "Sam", 26],
+            [2, "Jack", 31],
+            [3, "James", 18],
+            [4, "Betty", 22],
+        ]
+        self.table = ListTable("students", self.titles, self.data)
+
+    def test_filter(self):
+        view = FilterView(self.table, lambda row: row.age > 20)
+        self.assertEquals([row.id for row in view], [1, 2, 4])
+        self.assertEquals(len(view), 3)
+        self.assertEquals(view[-1].name, "Betty")
+        self.assertIs(view[0].obj, self.data[0])
+        self.failUnlessException(IndexOutOfBoundsException, view.row, 3)
+        self.failUnlessException(UnsupportMethodException,
+                                 view.append, (5, "Tom", 30))
+
+        # 视图不复制数据，源表格的变化能够反映到视图中
+        self.table.append([5, "Tom", 30])
+        self.assertEquals(len(view), 4)
+        self.assertEquals(view[3].name, "Tom")
+
+    def test_project(self):
+        view = ProjectView(self.table, ("name", "id"))
+        self.assertEquals([t.name for t in view.titles], ["name", "id"])
+        self.assertEquals(tuple(view[1]), ("Jack", 2))
+        self.assertEquals(view[1].id, 2)
+        self.failUnlessException(InvalidArgumentException,
+                                 ProjectView, self.table, ("gender",))
+
+    def test_slice(self):
+        view = SliceView(self.table, 1, 3)
+        self.assertEquals([row.id for row in view], [2, 3])
+        self.assertEquals(len(view), 2)
+        self.assertEquals(view[1].name, "James")
+        self.assertEquals(len(SliceView(self.table, 2)), 2)
+        self.assertEquals(len(SliceView(self.table, 10)), 0)
+
+    def test_compose(self):
+        view = FilterView(self.table, lambda row: row.age > 20) \
+            .select("id", "name").slice(1)
+        self.assertEquals([tuple(row) for row in view],
+                          [(2, "Jack"), (4, "Betty")])
+        table = view.materialize("result")
+        self.assertIsInstance(table, ListTable)
+        self.assertEquals(table.name, "result")
+        self.assertEquals(table[0].name, "Jack")
+        self.assertEquals(view.filter(lambda row: row.id > 3)[0].name,
+                          "Betty")
+
+    def test_concat(self):
+        dict_table = DictTable("teachers", self.titles, [
+            {"id": 10, "name": "Lucy", "age": 40}
+        ])
+        view = ConcatView(
+            ((self.table, "id", "name"), (dict_table, "id", "name")), "all")
+        self.assertEquals([t.name for t in view.titles], ["id", "name"])
+        self.assertEquals(len(view), 5)
+        self.assertEquals(tuple(view[4]), (10, "Lucy"))
+        self.assertEquals([row.name for row in view][-2:], ["Betty", "Lucy"])
+
+        view = ConcatView((self.table, self.table), "twice")
+        self.assertEquals(len(view), 8)
+        self.assertEquals(view[5].name, "Jack")
+
+    def test_positions(self):
+        view = PositionView(self.table, [3, 0], "picked")
+        self.assertEquals([row.id for row in view], [4, 1])
+        self.assertEquals(view.name, "picked")
+        self.assertEquals(view[1].name, "Sam")
@@ -0,0 +1,70 @@
+# coding: utf-8
+
+from datetime import date, timedelta
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.window import (
+    top_positions,
+    partition_bounds,
+    compile_window_function
+)
+from girlfriend.exception import InvalidArgumentException
+
+
+class TopPositionsTestCase(GirlFriendTestCase):
+
+    def test_top(self):
+        keys = [5, 3, 9, 3, 7, 1, 9]
+        self.assertEquals(top_positions(keys, 3), [2, 6, 4])
+        self.assertEquals(top_positions(keys, 3, ascending=True), [5, 1, 3])
+        groups = ["a", "b", "a", "b", "a", "b", "b"]
+        self.assertEquals(top_positions(keys, 2, groups), [2, 4, 6, 1])
+        self.assertEquals(top_positions(keys, 1, groups, ascending=True),
+                          [0, 5])
+        self.assertRaises(InvalidArgumentException, top_positions, keys, 0)
+
+
+class WindowFunctionTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.order = [1, 2, 2, 3, 1, 2]
+        self.bounds = partition_bounds(["a", "a", "a", "a", "b", "b"])
+        self.columns = {"amount": [10, 20, None, 40, 1, 2]}
+
+    def evaluate(self, source, order=None):
+        return compile_window_function(source).evaluate(
+            self.columns, order or self.order, self.bounds)
+
+    def test_ranking(self):
+        self.assertEquals(self.bounds, [(0, 4), (4, 6)])
+        self.assertEquals(self.evaluate("rn = row_number()"),
+                          [1, 2, 3, 4, 1, 2])
+        self.assertEquals(self.evaluate("rk = rank()"), [1, 2, 2, 4, 1, 2])
+        self.assertEquals(self.evaluate("rk = dense_rank()"),
+                          [1, 2, 2, 3, 1, 2])
+
+    def test_lag_lead(self):
+        self.assertEquals(self.evaluate("prev = lag(amount)"),
+                          [None, 10, 20, None, None, 1])
+        self.assertEquals(self.evaluate("next = lead(amount, 2, 0)"),
+                          [None, 40, 0, 0, 0, 0])
+
+    def test_rolling(self):
+        self.assertEquals(self.evaluate("s = rolling_sum(amount, 2)"),
+                          [10, 30, 20, 40, 1, 3])
+        self.assertEquals(self.evaluate("a = rolling_avg(amount, 3)"),
+                          [10.0, 15.0, 15.0, 30.0, 1.0, 1.5])
+        self.assertEquals(self.evaluate("c = rolling_count(amount, 3)"),
+                          [1, 2, 2, 2, 1, 2])
+
+        days = [date(2016, 1, 1) + timedelta(days=offset)
+                for offset in (0, 1, 3, 4, 0, 7)]
+        self.assertEquals(self.evaluate("s = rolling_sum(amount, \"2d\")",
+                                        days), [10, 30, None, 40, 1, 2])
+
+    def test_invalid(self):
+        for source in ("row_number()", "x = unknown()", "x = amount + 1",
+                       "x = rolling_sum(amount, \"7w\")", "x = lag(a=1)"):
+            self.assertRaises(InvalidArgumentException,
+                              compile_window_function, source)
+        self.assertRaises(InvalidArgumentException, self.evaluate,
+                          "s = rolling_sum(amount, 0)")
@@ -4,6 +4,7 @@ import os
 import httpretty
 from girlfriend.testing import GirlFriendTestCase
 from girlfriend.plugin.csv import CSVR, CSVW
+from girlfriend.data.table import Title, TableWrapper
 
 
 STUDENTS = (
@@ -41,6 +42,14 @@ class CSVReaderTestCase(GirlFriendTestCase):
             result_wrapper=tuple)({})
         self.assertEquals(result, STUDENTS)
 
+    def test_read_with_schema(self):
+        titles = (Title("id", type="int", nullable=False), Title("name"),
+                  Title("grade", type="int"))
+        table = CSVR("test.csv", result_wrapper=TableWrapper(
+            "students", titles))({})
+        self.assertEquals(tuple(table[0]), (1, "Sam", 1))
+        self.assertEquals(sum(row.grade for row in table), 8)
+
     def test_read_from_web(self):
         result = CSVR(
             "http://test.gf/csv",
@@ -5,6 +5,7 @@ import xlrd
 import os.path
 from girlfriend.data.table import ListTable, Title
 from girlfriend.testing import GirlFriendTestCase
+from girlfriend.plugin.orm import ResultStream
 from girlfriend.plugin.excel import (
     ExcelWriterPlugin,
     SheetW,
@@ -102,6 +103,22 @@ class ExcelWriterPluginTestCase(GirlFriendTestCase):
         student_table = workbook.sheet_by_name("std")
         self.assertEquals(student_table.nrows, len(self.students_list))
 
+    def test_write_stream(self):
+        ctx = {}
+        batches = iter([list(self.students_list[:2]),
+                        list(self.students_list[2:])])
+        stream = ResultStream(batches, keys=["id", "name", "gender", "grade"])
+        # 流式查询结果没有名称，不指定sheet_name时使用默认名称
+        ExcelWriterPlugin().execute(
+            ctx, "memory:students_xlsx", sheets=(SheetW(stream),),
+            constant_memory=True)
+        book_buffer = ctx["students_xlsx"]
+        book_buffer.seek(0)
+        workbook = xlrd.open_workbook(file_contents=book_buffer.buf)
+        sheet = workbook.sheet_by_name("Sheet1")
+        self.assertEquals(sheet.nrows, len(self.students_list))
+        self.assertEquals(sheet.cell_value(2, 1), u"韩梅梅")
+
     def _check_table_workbook(self, workbook):
         self.assertEquals(len(workbook.sheets()), 1)
         student_table = workbook.sheet_by_name("students")
@@ -1,15 +1,36 @@
 # coding: utf-8
 
+from __future__ import absolute_import
+
 import os
+import csv
+import gzip
+import time
+import ujson
+import shutil
+import tempfile
 import os.path
 import sqlite3
+import threading
 from girlfriend.plugin.orm import (
     EngineManager,
     _engine_manager,
     Query,
     SQL,
+    ResultStream,
+    DBW,
+    KeysetQuery,
+    IncrementalQuery,
+    EngineContainer,
+    OrmQueryPlugin,
+    QueryExecutionException,
+    QueryCacheManager,
+    query_cache_key,
+    SQLExport,
+    _BackgroundGzipFile,
     KeyExtractWrapper
 )
+from girlfriend.util.cache import MemoryCache, TieredCache
 from girlfriend.util.config import Config
 from girlfriend.exception import (
     InvalidArgumentException,
@@ -17,16 +38,25 @@ from girlfriend.exception import (
 )
 from girlfriend.testing import GirlFriendTestCase
 from sqlalchemy import (
+    create_engine,
     Column,
     Integer,
     String,
     func,
     and_
 )
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.pool import QueuePool, NullPool
 from sqlalchemy.ext.declarative import declarative_base
 from girlfriend.plugin import plugin_manager
-from girlfriend.data.table import TableWrapper, Title
+from girlfriend.data.table import (
+    TableWrapper,
+    ColumnTableWrapper,
+    ColumnTable,
+    Title,
+    ListTable,
+    DictTable
+)
+from girlfriend.data.tablefile import read_table
 
 
 class EngineManagerTestCase(GirlFriendTestCase):
@@ -128,6 +158,61 @@ class EngineManagerTestCase(GirlFriendTestCase):
             self.assertEquals(tuple(result)[0],
                               (1, "SamChi", 1, "I am SamChi"))
 
+    def test_lazy_engine(self):
+        engine_manager = EngineManager()
+        self.config["db_test"]["warmup"] = "true"
+        engine_manager.validate_config(self.config)
+        engine_manager.init_all(self.config)
+        # 只有配置了warmup的引擎会在初始化时创建
+        self.assertEquals(engine_manager._engines.keys(), ["test"])
+        stats = engine_manager.pool_stats()["test"]
+        self.assertEquals(stats["connects"], 10)
+        self.assertEquals(stats["checked_in"], 10)
+        self.assertEquals(stats["checked_out"], 0)
+
+        test_engine2 = engine_manager.engine("test2")
+        self.assertIs(engine_manager.engine("test2"), test_engine2)
+        self.assertEquals(sorted(engine_manager._engines.keys()),
+                          ["test", "test2"])
+        self.assertRaises(KeyError, engine_manager.engine, "test3")
+        engine_manager.dispose_all()
+
+    def test_pool_stats(self):
+        engine = create_engine(
+            "sqlite:///{}".format(self.test_db_file), poolclass=QueuePool,
+            pool_size=1, max_overflow=0, pool_timeout=1,
+            connect_args={"check_same_thread": False})
+        container = EngineContainer(engine)
+        connection = engine.connect()
+        stats = container.pool_stats()
+        self.assertEquals(stats["checked_out"], 1)
+        self.assertEquals(stats["max_checked_out"], 1)
+
+        # 连接池已满，第二个连接需要等待第一个连接归还
+        threading.Timer(0.2, connection.close).start()
+        engine.connect().close()
+        stats = container.pool_stats()
+        self.assertEquals(stats["checkouts"], 2)
+        self.assertEquals(stats["checked_out"], 0)
+        self.assertEquals(stats["waits"], 1)
+        self.assertTrue(stats["wait_time"] >= 0.1)
+        self.assertEquals(stats["connects"], 1)
+        self.assertEquals(stats["timeouts"], 0)
+
+        # dispose重建连接池之后继续统计新的连接池
+        engine.dispose()
+        stats = container.pool_stats()
+        self.assertEquals(stats["checked_in"], 0)
+        connection = engine.connect()
+        threading.Timer(0.2, connection.close).start()
+        engine.connect().close()
+        stats = container.pool_stats()
+        self.assertEquals(stats["checkouts"], 4)
+        self.assertEquals(stats["connects"], 2)
+        self.assertEquals(stats["waits"], 2)
+        self.assertEquals(stats["checked_in"], 1)
+        engine.dispose()
+
     def test_dispose_all(self):
         engine_manager = EngineManager()
         engine_manager.validate_config(self.config)
@@ -137,6 +222,46 @@ class EngineManagerTestCase(GirlFriendTestCase):
         self.failUnlessException(InvalidStatusException,
                                  engine_manager.engine, "test")
 
+    def test_automap_class(self):
+        conn = sqlite3.connect(self.test_db_file)
+        conn.execute("create table course (id integer primary key, "
+                     "name varchar(10))")
+        conn.commit()
+        cache_dir = tempfile.mkdtemp()
+        url = "sqlite:///{}".format(self.test_db_file)
+        try:
+            container = EngineContainer(
+                create_engine(url), metadata_cache=cache_dir,
+                metadata_cache_ttl="1d", schema_version="1")
+            user_class = container.automap_class("user")
+            self.assertEquals(user_class.__table__.name, "user")
+            # 只反射用到的表
+            self.assertEquals(container._metadata.tables.keys(), ["user"])
+            self.assertIsNone(container.automap_class("not_exists"))
+
+            # 新的进程直接使用缓存的表结构
+            conn.execute("alter table user add column age int")
+            conn.commit()
+            container = EngineContainer(
+                create_engine(url), metadata_cache=cache_dir,
+                schema_version="1")
+            self.assertFalse(
+                hasattr(container.automap_class("user"), "age"))
+            self.assertIsNotNone(container.automap_class("course"))
+            self.assertEquals(sorted(container._metadata.tables.keys()),
+                              ["course", "user"])
+
+            # 表结构版本变化之后重新反射
+            container = EngineContainer(
+                create_engine(url), metadata_cache=cache_dir,
+                schema_version="2")
+            self.assertTrue(hasattr(container.automap_class("user"), "age"))
+            container.invalidate_metadata()
+            self.assertEquals(container._metadata.tables.keys(), [])
+        finally:
+            conn.close()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
 Base = declarative_base()
 
 
@@ -197,8 +322,12 @@ class QueryTestCase(GirlFriendTestCase):
             grade2
         ])
         session.commit()
+        session.close()
         self.config = config
 
+    def tearDown(self):
+        Base.metadata.drop_all(_engine_manager.engine("test").engine)
+
     def test_query(self):
         ctx = {}
 
@@ -376,12 +505,526 @@ class QueryTestCase(GirlFriendTestCase):
         self.assertEquals([(1, "Sam")], result_1)
         self.assertEquals([(2, "Jack")], result_2)
 
+    def test_stream(self):
+        ctx = {}
+        s = SQL("test", "students", "select * from student order by id",
+                stream=True, fetch_size=2)
+        stream = s(ctx)
+        self.assertIs(ctx["students"], stream)
+        self.assertIsInstance(stream, ResultStream)
+        self.assertEquals([len(batch) for batch in stream.batches()],
+                          [2, 1])
+        self.failUnlessException(InvalidStatusException, list, stream)
+
+        stream = SQL("test", "students", "select id from student "
+                     "where id > :id order by id", {"id": 1},
+                     row_handler=lambda row: row[0], stream=True)(ctx)
+        self.assertEquals(list(stream), [2, 3])
+
+        q = Query("test", "students", (Student.id, Student.name),
+                  order_by=Student.id, stream=True, fetch_size=2)
+        self.assertEquals(list(q(ctx)),
+                          [(1, "Sam"), (2, "Jack"), (3, "Betty")])
+
+        q = Query("test", "students", Student, "grade = :grade",
+                  params={"grade": 1}, row_handler=lambda std: std.name,
+                  order_by=Student.id, stream=True)
+        stream = q(ctx)
+        # 未遍历完时可以主动关闭
+        stream.close()
+        self.assertEquals(list(q(ctx)), ["Sam", "Betty"])
+
+        # 直接按列物化，标题取自查询结果的列名
+        table = SQL("test", "students",
+                    "select id, name, grade from student order by id",
+                    stream=True, fetch_size=2,
+                    result_wrapper=ColumnTableWrapper("students"))(ctx)
+        self.assertIsInstance(table, ColumnTable)
+        self.assertEquals([title.name for title in table.titles],
+                          ["id", "name", "grade"])
+        self.assertEquals(list(table.column("id")), [1, 2, 3])
+        self.assertEquals(tuple(table[2]), (3, "Betty", 1))
+        table = Query("test", "students", (Student.id, Student.name),
+                      order_by=Student.id, stream=True,
+                      result_wrapper=ColumnTableWrapper("students"))(ctx)
+        self.assertEquals(list(table.column("name")),
+                          ["Sam", "Jack", "Betty"])
+
+    def test_cache(self):
+        ctx = {}
+        cache = MemoryCache()
+        sql = "select id, name from student where grade = :grade order by id"
+        s = SQL("test", "students", sql, {"grade": 1},
+                cache=cache, cache_ttl="5m")
+        self.assertEquals(s(ctx), ((1, "Sam"), (3, "Betty")))
+        self.assertEquals(len(cache), 1)
+
+        # 缓存命中时不再访问数据库，空白不同的同一条语句使用相同的缓存
+        session = _engine_manager.engine("test").session()
+        session.execute("update student set name = 'Tom' where id = 1")
+        session.commit()
+        session.close()
+        s = SQL("test", "students", sql.replace(" ", "  "), {"grade": 1},
+                row_handler=lambda row: (row["id"], row.name),
+                cache=cache, cache_ttl=300)
+        self.assertEquals(s(ctx), ((1, "Sam"), (3, "Betty")))
+        self.assertEquals(len(cache), 1)
+
+        # 参数不同时不会命中
+        s = SQL("test", "students", sql, {"grade": 2},
+                cache=cache, cache_ttl=300)
+        self.assertEquals(s(ctx), ((2, "Jack"),))
+
+        # 不开启缓存时读取最新数据
+        s = SQL("test", "students", sql, {"grade": 1})
+        self.assertEquals(s(ctx), ((1, "Tom"), (3, "Betty")))
+
+        q = Query("test", "students", Student, "grade = :grade",
+                  params={"grade": 1}, row_handler=lambda std: std.name,
+                  order_by=Student.id, cache=cache, cache_ttl=300)
+        self.assertEquals(q(ctx), ("Tom", "Betty"))
+        self.assertEquals(len(cache), 3)
+        q = Query("test", "students", (Student.id, Student.name),
+                  order_by=Student.id, cache=cache, cache_ttl=300)
+        self.assertEquals(q(ctx), [(1, "Tom"), (2, "Jack"), (3, "Betty")])
+        self.assertEquals(len(cache), 4)
+
+        # 按引擎失效
+        cache.invalidate("test")
+        self.assertEquals(len(cache), 0)
+
+        # 字符串常量中的空白不会被合并
+        sql = "select id from student where name = 'Tom  Chi'"
+        self.assertNotEquals(
+            query_cache_key("test", sql),
+            query_cache_key("test", sql.replace("  ", " ")))
+        self.assertEquals(
+            query_cache_key("test", sql),
+            query_cache_key("test", " " + sql.replace(" id", "\n  id")))
+
+        self.failUnlessException(
+            InvalidArgumentException, SQL, "test", "students", sql,
+            stream=True, cache_ttl=300)
+
+    def test_cache_config(self):
+        manager = QueryCacheManager()
+        self.assertEquals(manager.resolve("test"), (None, None))
+        config = Config({
+            "query_cache": {
+                "store": "memory, sqlite",
+            }
+        })
+        self.failUnlessException(
+            InvalidArgumentException, manager.validate_config, config)
+        cache_file = "/tmp/gf_query_cache_test.db"
+        config["query_cache"]["path"] = cache_file
+        config["query_cache"]["ttl"] = "10m"
+        config["query_cache"]["engines"] = "test, replica"
+        try:
+            manager.validate_config(config)
+            manager.init(config)
+            cache, ttl = manager.resolve("test")
+            self.assertIsInstance(cache, TieredCache)
+            self.assertEquals(ttl, 600)
+            self.assertEquals(manager.resolve("other"), (None, None))
+            self.assertEquals(manager.resolve("test", cache_ttl=0),
+                              (None, None))
+            self.assertEquals(manager.resolve("other", cache_ttl="1h"),
+                              (cache, 3600))
+
+            cache.set(query_cache_key("test", "select 1"), (1,), 600, "test")
+            cache.set(query_cache_key("test", "select 2"), (2,), 600, "test")
+            manager.invalidate("test", " select  1 ")
+            self.assertIsNone(cache.get(query_cache_key("test", "select 1")))
+            self.assertEquals(
+                cache.get(query_cache_key("test", "select 2")), (2,))
+            manager.invalidate("test")
+            self.assertIsNone(cache.get(query_cache_key("test", "select 2")))
+            manager.dispose()
+            self.assertEquals(manager.resolve("test"), (None, None))
+        finally:
+            os.remove(cache_file)
+
     def _check_students_list(self, students):
         self.assertEquals(len(students), 3)
         self.assertEquals([std.name for std in students],
                           ["Sam", "Jack", "Betty"])
 
 
+class DBWTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.db_file = "/tmp/gf_write_db.db"
+        engine = create_engine("sqlite:///{}".format(self.db_file))
+        engine.execute("create table score (id integer primary key, "
+                       "name varchar(10), score integer)")
+        _engine_manager._engines["write_test"] = EngineContainer(engine)
+        self.status = _engine_manager._status
+        _engine_manager._status = EngineManager.STATUS_OK
+        self.engine = engine
+
+    def tearDown(self):
+        self.engine.dispose()
+        del _engine_manager._engines["write_test"]
+        _engine_manager._status = self.status
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def _rows(self):
+        return [tuple(row) for row in self.engine.execute(
+            "select id, name, score from score order by id")]
+
+    def test_insert(self):
+        table = ListTable("score", (Title("id"), Title("name"),
+                                    Title("score")),
+                          [(idx, "user_%d" % idx, idx % 100)
+                           for idx in xrange(1, 2501)])
+        ctx = {"score": table}
+        result = DBW("write_test", "score", "score", batch_size=100,
+                     commit_batches=3, variable="stats")(ctx)
+        self.assertIs(ctx["stats"], result)
+        self.assertEquals(result["rows"], 2500)
+        self.assertTrue(result["rows_per_second"] > 0)
+        rows = self._rows()
+        self.assertEquals(len(rows), 2500)
+        self.assertEquals(rows[0], (1, "user_1", 1))
+
+        # 记录迭代器以及记录过滤器
+        DBW("write_test", "score",
+            ((idx, "x", 0) for idx in xrange(3000, 3010)),
+            columns=("id", "name", "score"),
+            record_filter=lambda record: record[0] % 2 == 0)(ctx)
+        self.assertEquals(len(self._rows()), 2505)
+
+        # 出错时回滚当前事务
+        self.failUnlessException(
+            Exception, DBW("write_test", "score",
+                           [{"id": 5000, "name": "a", "score": 1},
+                            {"id": 1, "name": "b", "score": 1}]), ctx)
+        self.assertEquals(len(self._rows()), 2505)
+
+    def test_upsert(self):
+        table = DictTable("score", (Title("id"), Title("name"),
+                                    Title("score")), [
+            {"id": 1, "name": "Sam", "score": 60},
+            {"id": 2, "name": "Jack", "score": 70}])
+        DBW("write_test", "score", table)({})
+        table = ListTable("score", (Title("id"), Title("score")),
+                          [(2, 90), (3, 80)])
+        DBW("write_test", "score", table, mode="upsert", keys="id")({})
+        self.assertEquals(self._rows(), [
+            (1, "Sam", 60), (2, "Jack", 90), (3, None, 80)])
+
+        # 不指定keys时使用INSERT OR REPLACE
+        DBW("write_test", "score", [(1, "Samchi", 100)],
+            columns=("id", "name", "score"), mode="upsert")({})
+        self.assertEquals(self._rows()[0], (1, "Samchi", 100))
+
+        self.failUnlessException(InvalidArgumentException, DBW,
+                                 "write_test", "score", table, mode="merge")
+        self.failUnlessException(InvalidArgumentException,
+                                 DBW("write_test", "score", [(1, 2)]), {})
+
+
+class KeysetQueryTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.db_file = "/tmp/gf_keyset.db"
+        engine = create_engine("sqlite:///{}".format(self.db_file))
+        engine.execute("create table score (id integer primary key, "
+                       "name varchar(10), score integer)")
+        engine.execute("insert into score values (?, ?, ?)",
+                       [(idx * 3, "user_%d" % idx, idx % 10)
+                        for idx in xrange(1, 101)])
+        _engine_manager._engines["keyset_test"] = EngineContainer(engine)
+        self.status = _engine_manager._status
+        _engine_manager._status = EngineManager.STATUS_OK
+        self.engine = engine
+        self.expected = [(idx * 3, "user_%d" % idx, idx % 10)
+                         for idx in xrange(1, 101)]
+
+    def tearDown(self):
+        self.engine.dispose()
+        del _engine_manager._engines["keyset_test"]
+        _engine_manager._status = self.status
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def test_keyset_query(self):
+        ctx = {}
+        for partitions in (1, 3, 200):
+            result = KeysetQuery("keyset_test", "scores", "score", "id",
+                                 page_size=7, partitions=partitions)(ctx)
+            self.assertIs(ctx["scores"], result)
+            self.assertEquals(result, tuple(self.expected))
+
+        # 查询的列中不包含主键，附加过滤条件以及包装为表格
+        table = KeysetQuery(
+            "keyset_test", "scores", "score", "id",
+            columns=["name", "score"], where="score < :score",
+            params={"score": "$max_score"}, page_size=6, partitions=4,
+            result_wrapper=TableWrapper(
+                "score", titles=[Title("name"), Title("score")]))(
+            {"max_score": 2})
+        self.assertEquals([tuple(row) for row in table],
+                          [row[1:] for row in self.expected if row[2] < 2])
+
+        # 流式读取，提前关闭时停止所有分区
+        stream = KeysetQuery("keyset_test", "scores", "score", "id",
+                             page_size=5, partitions=3, stream=True,
+                             row_handler=lambda row: row["id"])(ctx)
+        self.assertIsInstance(stream, ResultStream)
+        batches = stream.batches()
+        self.assertEquals(next(batches), [3, 6, 9, 12, 15])
+        batches.close()
+
+        self.failUnlessException(
+            InvalidArgumentException, KeysetQuery("keyset_test", "scores",
+                                                  "score", "name",
+                                                  partitions=2), ctx)
+        self.failUnlessException(
+            InvalidArgumentException, KeysetQuery, "keyset_test", "scores",
+            "score", "id", page_size=0)
+
+
+class SQLExportTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.directory, "export.db")
+        engine = create_engine("sqlite:///{}".format(self.db_file))
+        engine.execute("create table orders (id integer primary key, "
+                       "city varchar(10), amount numeric, day date)")
+        engine.execute("insert into orders values (?, ?, ?, ?)",
+                       [(idx, (u"北京", "shanghai")[idx % 2], idx * 1.5,
+                         "2016-01-%02d" % (idx % 28 + 1))
+                        for idx in xrange(1, 51)])
+        _engine_manager._engines["export_test"] = EngineContainer(engine)
+        self.status = _engine_manager._status
+        _engine_manager._status = EngineManager.STATUS_OK
+        self.engine = engine
+
+    def tearDown(self):
+        self.engine.dispose()
+        del _engine_manager._engines["export_test"]
+        _engine_manager._status = self.status
+        shutil.rmtree(self.directory)
+
+    def test_csv(self):
+        path = os.path.join(self.directory, "orders.csv")
+        ctx = {"min_id": 10}
+        result = SQLExport("export_test",
+                           "select id, city from orders where id > :min_id",
+                           path, params={"min_id": "$min_id"},
+                           titles=[Title("id", u"编号"), "city"],
+                           fetch_size=7, variable="stat")(ctx)
+        self.assertIs(ctx["stat"], result)
+        self.assertEquals(result["rows"], 40)
+        self.assertFalse(os.path.exists(path + ".tmp"))
+        with open(path) as f:
+            rows = list(csv.reader(f))
+        self.assertEquals(rows[0], [u"编号".encode("utf-8"), "city"])
+        self.assertEquals(rows[1], ["11", "shanghai"])
+        self.assertEquals(rows[2], ["12", u"北京".encode("utf-8")])
+        self.assertEquals(len(rows), 41)
+
+    def test_json_gzip(self):
+        path = os.path.join(self.directory, "orders.json.gz")
+        result = SQLExport("export_test",
+                           "select id, amount, day from orders order by id",
+                           path, format="json", fetch_size=9)({})
+        self.assertEquals(result["rows"], 50)
+        with gzip.open(path) as f:
+            records = [ujson.loads(line) for line in f]
+        self.assertEquals(len(records), 50)
+        self.assertEquals(records[0],
+                          {"id": 1, "amount": 1.5, "day": "2016-01-02"})
+
+    def test_table(self):
+        path = os.path.join(self.directory, "orders.gft")
+        SQLExport("export_test", "select id, city from orders", path,
+                  format="table", compression="zlib", fetch_size=8,
+                  row_handler=lambda row: (row[0] * 10, row[1]))({})
+        table = read_table(path)
+        self.assertEquals(len(table), 50)
+        self.assertEquals(tuple(table[0]), (10, "shanghai"))
+        self.assertEquals(tuple(table[1]), (20, u"北京"))
+
+    def test_error(self):
+        path = os.path.join(self.directory, "error.csv")
+        self.failUnlessException(
+            Exception, SQLExport("export_test", "select * from missing",
+                                 path), {})
+        self.assertEquals(os.listdir(self.directory), ["export.db"])
+
+        self.failUnlessException(
+            InvalidArgumentException, SQLExport, "export_test",
+            "select * from orders", path, format="xml")
+        self.failUnlessException(
+            InvalidArgumentException, SQLExport, "export_test",
+            "select * from orders", path + ".gz", format="table")
+
+        # 压缩线程出错时在close时抛出异常
+        gzip_file = _BackgroundGzipFile(
+            os.path.join(self.directory, "missing", "a.gz"), chunk_size=1)
+        gzip_file.write("abc")
+        gzip_file.write("def")
+        self.failUnlessException(IOError, gzip_file.close)
+
+
+class IncrementalQueryTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.db_file = "/tmp/gf_incremental.db"
+        self.state_file = "/tmp/gf_incremental_state.db"
+        engine = create_engine("sqlite:///{}".format(self.db_file))
+        engine.execute("create table event (id integer primary key, "
+                       "name varchar(10), updated_at integer)")
+        engine.execute("insert into event values (?, ?, ?)",
+                       [(1, "a", 100), (2, "b", 100), (3, "c", 200)])
+        _engine_manager._engines["incremental_test"] = EngineContainer(engine)
+        self.status = _engine_manager._status
+        _engine_manager._status = EngineManager.STATUS_OK
+        self.engine = engine
+
+    def tearDown(self):
+        self.engine.dispose()
+        del _engine_manager._engines["incremental_test"]
+        _engine_manager._status = self.status
+        for path in (self.db_file, self.state_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_incremental_query(self):
+        ctx = {}
+        # 自增id作为水位线，每次只读取新增的行
+        q = IncrementalQuery("incremental_test", "events", "event", "id",
+                             columns=["name"], state=MemoryCache())
+        self.assertEquals(q(ctx), (("a",), ("b",), ("c",)))
+        self.assertEquals(q(ctx), ())
+        self.engine.execute("insert into event values (4, 'd', 300)")
+        self.assertEquals(q(ctx), (("d",),))
+        q.reset()
+        self.assertEquals(len(q(ctx)), 4)
+
+        # 时间戳作为水位线，合并到基础表中，状态持久化到SQLite文件
+        def merge_query():
+            return IncrementalQuery(
+                "incremental_test", "events", "event", "updated_at",
+                columns=["id", "name"], key="id", merge=True,
+                inclusive=True, state=self.state_file,
+                result_wrapper=TableWrapper(
+                    "events", titles=[Title("id"), Title("name")]))
+        table = merge_query()(ctx)
+        self.assertIs(ctx["events"], table)
+        self.assertEquals([tuple(row) for row in table],
+                          [(1, "a"), (2, "b"), (3, "c"), (4, "d")])
+        self.engine.execute(
+            "update event set name = 'cc', updated_at = 300 where id = 3")
+        self.engine.execute("insert into event values (5, 'e', 300)")
+        table = merge_query()(ctx)
+        self.assertEquals([tuple(row) for row in table],
+                          [(1, "a"), (2, "b"), (3, "cc"), (4, "d"),
+                           (5, "e")])
+
+        self.failUnlessException(
+            InvalidArgumentException, IncrementalQuery, "incremental_test",
+            "events", "event", "updated_at", merge=True)
+
+    def test_inclusive_without_merge(self):
+        ctx = {}
+        q = IncrementalQuery("incremental_test", "events", "event",
+                             "updated_at", columns=["id", "updated_at"],
+                             key="id", inclusive=True, state=MemoryCache())
+        self.assertEquals(q(ctx), ((1, 100), (2, 100), (3, 200)))
+        # 上次水位线上的行不会重复返回
+        self.assertEquals(q(ctx), ())
+        self.assertEquals(q(ctx), ())
+        # 与上次水位线相同的新行仍然可以读取到
+        self.engine.execute("insert into event values (4, 'd', 200)")
+        self.assertEquals(q(ctx), ((4, 200),))
+        self.engine.execute("insert into event values (5, 'e', 300)")
+        self.assertEquals(q(ctx), ((5, 300),))
+        self.assertEquals(q(ctx), ())
+
+
+class _SlowQuery(object):
+
+    def __init__(self, engine_name, value, seconds=0.2):
+        self._engine_name = engine_name
+        self._value = value
+        self._seconds = seconds
+        self.thread = None
+
+    def __call__(self, context):
+        self.thread = threading.current_thread()
+        time.sleep(self._seconds)
+        if isinstance(self._value, Exception):
+            raise self._value
+        return self._value
+
+
+class ParallelQueryTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.db_file = "/tmp/gf_parallel.db"
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("create table t (id integer primary key)")
+        conn.executemany("insert into t values (?)", [(1,), (2,), (3,)])
+        conn.commit()
+        conn.close()
+        url = "sqlite:///{}".format(self.db_file)
+        _engine_manager._engines["pa"] = EngineContainer(
+            create_engine(url, poolclass=QueuePool, pool_size=2))
+        _engine_manager._engines["pb"] = EngineContainer(
+            create_engine(url, poolclass=NullPool))
+        _engine_manager._engines["pc"] = EngineContainer(
+            create_engine("sqlite:///:memory:"))
+        self.status = _engine_manager._status
+        _engine_manager._status = EngineManager.STATUS_OK
+
+    def tearDown(self):
+        for name in ("pa", "pb", "pc"):
+            _engine_manager._engines.pop(name).engine.dispose()
+        _engine_manager._status = self.status
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def test_parallel(self):
+        self.assertEquals(_engine_manager.engine("pa").concurrency, 2)
+        self.assertEquals(_engine_manager.engine("pc").concurrency, 0)
+
+        plugin, ctx = OrmQueryPlugin(), {}
+        slow = [_SlowQuery("pa", idx) for idx in xrange(4)]
+        inline = _SlowQuery("pc", "inline", 0)
+        start = time.time()
+        result = plugin.execute(ctx, queries=slow + [
+            SQL("pb", "rows", "select id from t order by id"), inline],
+            parallel=True)
+        # 连接池大小为2，4个查询分两轮执行
+        self.assertTrue(time.time() - start < 0.7)
+        self.assertEquals(result[:4], [0, 1, 2, 3])
+        self.assertEquals(result[4], ((1,), (2,), (3,)))
+        self.assertIs(ctx["rows"], result[4])
+        self.assertEquals(result[5], "inline")
+        # SingletonThreadPool的查询在当前线程中执行
+        self.assertIs(inline.thread, threading.current_thread())
+
+        try:
+            plugin.execute(ctx, _SlowQuery("pa", ValueError("bad"), 0),
+                           _SlowQuery("pa", 1, 0),
+                           _SlowQuery("pb", KeyError("x"), 0),
+                           parallel=True)
+        except QueryExecutionException as e:
+            self.assertEquals([idx for idx, _ in e.errors], [0, 2])
+            self.assertIsInstance(e.errors[0][1], ValueError)
+        else:
+            self.fail(u"应该抛出QueryExecutionException")
+
+        self.failUnlessException(InvalidArgumentException, plugin.execute,
+                                 ctx, slow[0], unknown=True)
+
+
 class KeyExtratcWrapperTestCase(GirlFriendTestCase):
 
     def test_wrap_collection_row(self):
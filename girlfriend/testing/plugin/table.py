@@ -1,10 +1,13 @@
 # coding: utf-8
 
 import random
+import StringIO
 import webbrowser
 from girlfriend.data.table import (
     Title,
     ListTable,
+    DictTable,
+    ColumnTable,
     TableWrapper
 )
 from girlfriend.plugin.table import (
@@ -16,8 +19,19 @@ from girlfriend.plugin.table import (
     SplitTablePlugin,
     JoinTablePlugin,
     HTMLTable,
+    FilterTablePlugin,
+    DeriveColumnsPlugin,
+    TableStatsPlugin,
+    DiffTablePlugin,
+    TopTablePlugin,
+    WindowTablePlugin,
+    EnrichTablePlugin,
 )
+from girlfriend.data.view import ConcatView, PositionView
+from girlfriend.data.encoding import DictEncodedColumn
+from girlfriend.data.partition import HashPartitioner, RangePartitioner
 from girlfriend.testing import GirlFriendTestCase
+from girlfriend.exception import InvalidArgumentException
 
 
 class TableMetaTestCase(GirlFriendTestCase):
@@ -148,6 +162,55 @@ class TableColumn2TitlePluginTestCase(GirlFriendTestCase):
         print "\n"
         print changed_table
 
+    def test_aggregate(self):
+        """测试多值列以及重复单元格的聚合
+        """
+        ctx = {
+            "scores": ListTable(
+                "scores",
+                (Title("id"), Title("week"), Title("score"), Title("bonus")),
+                (
+                    (1, 2, 90, 1),
+                    (1, 1, 80, 2),
+                    (1, 1, 70, 3),
+                    (2, 1, 60, 4),
+                )
+            )
+        }
+        transformer = TableColumn2TitlePlugin()
+
+        transformer.execute(ctx, "scores", "last", "week",
+                            ("score", "bonus"), default=0,
+                            sum_title=(Title("score_sum"), Title("bonus_sum")))
+        table = ctx["last"]
+        self.assertEquals(
+            [title.name for title in table.titles],
+            ["id", "score_1", "score_2", "bonus_1", "bonus_2",
+             "score_sum", "bonus_sum"])
+        self.assertEquals(tuple(table[0]), (1, 70, 90, 3, 1, 160, 4))
+        self.assertEquals(tuple(table[1]), (2, 60, 0, 4, 0, 60, 4))
+
+        ctx["plain"] = ListTable(
+            "plain", (Title("id"), Title("week"), Title("score")),
+            [row[:3] for row in ctx["scores"]._data])
+        transformer.execute(ctx, "plain", "sum", "week", "score",
+                            aggregate="sum", default=0,
+                            avg_title=Title("avg"))
+        self.assertEquals(tuple(ctx["sum"][0]), (1, 150, 90, 120))
+
+        transformer.execute(ctx, "plain", "avg", "week", "score",
+                            aggregate="avg")
+        self.assertEquals(tuple(ctx["avg"][0]), (1, 75, 90))
+        self.assertEquals(tuple(ctx["avg"][1]), (2, 60, None))
+
+        transformer.execute(ctx, "plain", "count", "week", "score",
+                            aggregate="count")
+        self.assertEquals(tuple(ctx["count"][0]), (1, 2, 1))
+
+        transformer.execute(ctx, "plain", "custom", "week", "score",
+                            aggregate=lambda values: tuple(values))
+        self.assertEquals(tuple(ctx["custom"][0]), (1, (80, 70), (90,)))
+
 
 class PrintTablePluginTestCase(GirlFriendTestCase):
 
@@ -225,6 +288,14 @@ class ConcatTablePluginTestCase(GirlFriendTestCase):
         self.assertEquals(len(table), 7)
         self.assertEquals(tuple(table[0]), ("Sam", "A", "M"))
 
+    def test_lazy_concat(self):
+        ctx = {"table_b": self.table_b}
+        view = ConcatTablePlugin().execute(
+            ctx, (self.table_a, "table_b"), "concat_table", lazy=True)
+        self.assertIsInstance(view, ConcatView)
+        self.assertEquals(len(view), 5)
+        self.assertEquals(view[4].name, "Peter")
+
 
 class JoinTablePluginTestCase(GirlFriendTestCase):
 
@@ -409,6 +480,46 @@ class SplitTablePluginTestCase(GirlFriendTestCase):
         self.assertEquals(len(result["students_grade_3"]), 1)
         print result["students_grade_3"]
 
+    def test_split_by_fields(self):
+        ctx = {}
+        split_table = SplitTablePlugin()
+        result = split_table.execute(ctx, self.students_table, "grade",
+                                     variable="grades")
+        self.assertIs(ctx["grades"], result)
+        self.assertEquals(sorted(result), [1, 2, 3])
+        self.assertEquals([row.name for row in result[2]],
+                          ["Betty", "Tom", "Lucy"])
+        self.assertEquals(result[3].name, u"students_3")
+
+        result = split_table.execute(ctx, self.students_table, "grade",
+                                     lazy=True)
+        self.assertIsInstance(result[1], PositionView)
+        self.assertEquals([row.id for row in result[1]], [1, 2, 3])
+
+        result = split_table.execute(
+            ctx, self.students_table,
+            lambda row: (row.grade % 2, "odd" if row.grade % 2 else "even"),
+            lazy=True)
+        self.assertEquals(result[0].name, "even")
+        self.assertEquals(len(result[1]), 4)
+
+    def test_split_by_partitioner(self):
+        split_table = SplitTablePlugin()
+        result = split_table.execute(
+            {}, self.students_table, RangePartitioner("id", [3, 6]))
+        self.assertEquals(sorted(result), [0, 1, 2])
+        self.assertEquals([row.id for row in result[1]], [3, 4, 5])
+        self.assertEquals(result[2].name, u"students_2")
+        self.assertIsInstance(result[2], ListTable)
+
+        result = split_table.execute(
+            {}, self.students_table, HashPartitioner("id", 2), parallel=2)
+        self.assertEquals([row.id for row in result[0]], [2, 4, 6])
+
+        result = split_table.execute(
+            {}, self.students_table, "grade", parallel=2, lazy=True)
+        self.assertEquals([row.id for row in result[2]], [4, 5, 6])
+
 
 class HtmlTablePluginTestCase(GirlFriendTestCase):
 
@@ -456,3 +567,434 @@ class HtmlTablePluginTestCase(GirlFriendTestCase):
         with open("/tmp/table.html", "w") as f:
             f.write(html_content.encode("gbk"))
         webbrowser.open("file:///tmp/table.html")
+
+    def test_streaming(self):
+        table = ListTable(
+            "student", (Title("id", u"<编号>"), Title("name")),
+            [(idx, "Tom & Jerry" if idx % 2 else u"<b>小王</b>")
+             for idx in xrange(2500)])
+
+        html_content = HTMLTable(table, property={"data-cell": "a='{x}'"})({})
+        self.assertTrue(html_content.startswith(
+            u"<table ><thead><tr ><th >&lt;编号&gt;</th><th >name</th>"))
+        self.assertIn(u"<tr ><td a='{x}'>1</td>"
+                      u"<td a='{x}'>Tom &amp; Jerry</td></tr>", html_content)
+        self.assertIn(u"<td a='{x}'>&lt;b&gt;小王&lt;/b&gt;</td>",
+                      html_content)
+        self.assertTrue(html_content.endswith(u"</tbody></table>"))
+
+        # 属性为函数时逐个单元格渲染，结果应与模板渲染一致
+        dynamic = HTMLTable(table, property={
+            "data-cell": lambda row_index, column_index, field, value:
+                "a='{x}'"})({})
+        self.assertEquals(dynamic, html_content)
+
+        raw = HTMLTable(table, escape=False)({})
+        self.assertIn(u"<td ><b>小王</b></td>", raw)
+
+        sink = StringIO.StringIO()
+        ctx = {"student": table}
+        result = HTMLTable("student", "html", sink=sink,
+                           encoding="utf-8")(ctx)
+        self.assertIs(result, sink)
+        self.assertIs(ctx["html"], sink)
+        self.assertEquals(sink.getvalue().decode("utf-8"),
+                          HTMLTable(table)({}))
+
+    def test_max_rows(self):
+        html_content = HTMLTable(self.table, max_rows=2)({})
+        self.assertEquals(html_content.count(u"<tr >"), 3)
+        self.assertIn(u"<td colspan=\"3\">仅显示前2行，共3行</td>",
+                      html_content)
+        html_content = HTMLTable(self.table, max_rows=3)({})
+        self.assertNotIn(u"colspan", html_content)
+
+
+class FilterTablePluginTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.table = ListTable(
+            "students",
+            (Title("id"), Title("name"), Title("age"), Title("grade")),
+            [
+                (1, "Sam", 26, 1),
+                (2, "Jack", 31, 2),
+                (3, "James", 35, 3),
+                (4, "Betty", 22, 2),
+            ]
+        )
+
+    def test_filter(self):
+        ctx = {"students": self.table}
+        filter_table = FilterTablePlugin()
+
+        result = filter_table.execute(
+            ctx, "students", "age > 25 and grade in (1, 2)",
+            variable="result")
+        self.assertIs(ctx["result"], result)
+        self.assertIsInstance(result, ListTable)
+        self.assertEquals([row.id for row in result], [1, 2])
+
+        result = filter_table.execute(
+            ctx, self.table, lambda row: row.name.startswith("J"),
+            name="j_students")
+        self.assertEquals(result.name, "j_students")
+        self.assertEquals([row.id for row in result], [2, 3])
+
+        view = filter_table.execute(ctx, self.table, "age < 30", lazy=True)
+        self.assertIsInstance(view, PositionView)
+        self.assertEquals([row.id for row in view], [1, 4])
+
+    def test_indexed_filter(self):
+        filter_table = FilterTablePlugin()
+
+        # 等值条件会借助哈希索引
+        result = filter_table.execute({}, self.table, "grade == 2")
+        self.assertEquals([row.id for row in result], [2, 4])
+        self.assertIn(("hash", "grade"), self.table._indexes)
+        result = filter_table.execute({}, self.table, "grade in (1, 3)")
+        self.assertEquals([row.id for row in result], [1, 3])
+
+        # 范围条件只使用已经存在的有序索引
+        self.table.index("age", kind="sorted")
+        result = filter_table.execute({}, self.table, "30 <= age")
+        self.assertEquals([row.id for row in result], [2, 3])
+        result = filter_table.execute({}, self.table, "age < 30")
+        self.assertEquals([row.id for row in result], [1, 4])
+
+
+class DeriveColumnsPluginTestCase(GirlFriendTestCase):
+
+    def test_derive(self):
+        table = ListTable(
+            "orders",
+            (Title("id"), Title("price"), Title("qty")),
+            [(1, 2.0, 3), (2, 1.5, 4)]
+        )
+        derive = DeriveColumnsPlugin()
+        ctx = {"orders": table}
+        result = derive.execute(ctx, "orders", (
+            "total = price * qty",
+            (Title("discount", u"折后价"), "total * 0.5"),
+            "qty = qty + 1",
+        ), variable="orders2")
+
+        self.assertIs(ctx["orders2"], result)
+        self.assertEquals(
+            [title.name for title in result.titles],
+            ["id", "price", "qty", "total", "discount"])
+        self.assertEquals(result.titles[-1].title, u"折后价")
+        self.assertEquals(tuple(result[0]), (1, 2.0, 4, 6.0, 3.0))
+        self.assertEquals(tuple(result[1]), (2, 1.5, 5, 6.0, 3.0))
+
+        # 派生表格与原表格不共享列，追加行互不影响
+        column_table = ColumnTable("orders", table.titles, table._data)
+        result = derive.execute(ctx, column_table, ("total = price * qty",))
+        result.append((3, 1.0, 6, 6.0))
+        self.assertEquals(len(result), 3)
+        self.assertEquals(len(column_table), 2)
+        self.assertEquals([tuple(row) for row in column_table],
+                          [(1, 2.0, 3), (2, 1.5, 4)])
+
+        self.failUnlessException(InvalidArgumentException, derive.execute,
+                                 ctx, table, ("price * 2",))
+        self.failUnlessException(InvalidArgumentException, derive.execute,
+                                 ctx, table, ("a = missing * 2",))
+
+
+class ColumnTablePluginTestCase(GirlFriendTestCase):
+
+    """各插件在字典编码的ColumnTable上的行为应与普通表格一致
+    """
+
+    def setUp(self):
+        cities = ("beijing", "shanghai")
+        self.scores = ColumnTable(
+            "scores",
+            (Title("id"), Title("city"), Title("week"), Title("score")),
+            [(idx % 10, cities[idx % 2], "w%d" % (idx / 10), idx)
+             for idx in xrange(20)]
+        )
+        self.cities = ColumnTable(
+            "cities", (Title("city"), Title("province")),
+            columns=[DictEncodedColumn.encode(["shanghai", "shenzhen"]),
+                     ["SH", "GD"]]
+        )
+
+    def test_encoded(self):
+        self.assertIsInstance(self.scores.column("city"), DictEncodedColumn)
+        self.assertIsInstance(self.scores.column("week"), DictEncodedColumn)
+
+    def test_column2title(self):
+        ctx = {"scores": self.scores}
+        TableColumn2TitlePlugin().execute(
+            ctx, "scores", "pivot", "week", "score",
+            sum_title=Title("total"))
+        table = ctx["pivot"]
+        self.assertEquals([title.name for title in table.titles],
+                          ["id", "city", "w0", "w1", "total"])
+        self.assertEquals(tuple(table[0]), (0, "beijing", 0, 10, 10))
+        self.assertEquals(tuple(table[9]), (9, "shanghai", 9, 19, 28))
+
+    def test_join(self):
+        join_table = JoinTablePlugin()
+        result = join_table.execute(
+            {}, "inner", self.scores, self.cities, on="city = city",
+            fields=("l.id", "r.province"), name="provinces",
+            titles=(Title("id"), Title("province")))
+        self.assertEquals(len(result), 10)
+        self.assertEquals(tuple(result[0]), (1, "SH"))
+
+        result = join_table.execute(
+            {}, "left", self.scores, self.cities, on="city = city",
+            fields=("l.id", "r.province"), name="provinces",
+            titles=(Title("id"), Title("province")))
+        self.assertEquals(len(result), 20)
+        self.assertEquals(tuple(result[0]), (0, None))
+        self.assertEquals(tuple(result[1]), (1, "SH"))
+
+    def test_filter_and_derive(self):
+        result = FilterTablePlugin().execute(
+            {}, self.scores, "city == 'beijing' and score > 10")
+        self.assertIsInstance(result, ColumnTable)
+        self.assertEquals([row.score for row in result], [12, 14, 16, 18])
+        self.assertIs(result.column("city").vocabulary,
+                      self.scores.column("city").vocabulary)
+
+        result = FilterTablePlugin().execute({}, self.scores, "week == 'w1'")
+        self.assertEquals(len(result), 10)
+
+        result = DeriveColumnsPlugin().execute(
+            {}, self.scores, ("double = score * 2",))
+        self.assertIsInstance(result, ColumnTable)
+        self.assertEquals(result[3].double, 6)
+
+
+class TableStatsPluginTestCase(GirlFriendTestCase):
+
+    def test_table_stats(self):
+        rows = [(idx, None if idx % 10 == 0 else idx % 7, "u%d" % (idx % 50))
+                for idx in xrange(1000)]
+        titles = (Title("id"), Title("score"), Title("user"))
+        plugin = TableStatsPlugin()
+        ctx = {}
+        for table in (ListTable("t", titles, rows),
+                      ColumnTable("t", titles, rows),
+                      DictTable("t", titles, [
+                          dict(zip(("id", "score", "user"), row))
+                          for row in rows])):
+            ctx["t"] = table
+            result = plugin.execute(ctx, "t", seed=1, variable="stats")
+            self.assertIs(ctx["stats"], result)
+            self.assertEquals(result.name, "t_stats")
+            self.assertEquals(
+                [title.name for title in result.titles],
+                ["column", "count", "nulls", "distinct", "min", "max",
+                 "mean", "stddev", "p25", "p50", "p75", "sample"])
+            id_stats, score_stats, user_stats = result
+            self.assertEquals(
+                (id_stats.count, id_stats.nulls,
+                 id_stats.min, id_stats.max, id_stats.mean),
+                (1000, 0, 0, 999, 499.5))
+            self.assertTrue(abs(id_stats.distinct - 1000) < 20)
+            self.assertTrue(abs(id_stats.p50 - 499.5) < 5)
+            self.assertEquals((score_stats.nulls, score_stats.distinct),
+                              (100, 7))
+            self.assertEquals((user_stats.distinct, user_stats.mean),
+                              (50, None))
+            self.assertEquals(len(user_stats.sample), 20)
+
+    def test_record_stats(self):
+        plugin = TableStatsPlugin()
+        records = ({"a": idx, "b": "x"} for idx in xrange(10000))
+        result = plugin.execute({}, records, columns=["a"],
+                                quantiles=(0.5, 0.99), sample_size=5)
+        self.assertEquals(result.name, "stats")
+        self.assertEquals(len(result), 1)
+        self.assertEquals(result[0].count, 10000)
+        self.assertTrue(abs(result[0].p99 - 9900) < 50)
+        self.assertEquals(len(result[0].sample), 5)
+
+        result = plugin.execute({}, iter([(1, "a"), (2, None)]),
+                                columns=["x", "y"])
+        self.assertEquals(result[1].nulls, 1)
+        self.failUnlessException(InvalidArgumentException, plugin.execute,
+                                 {}, iter([(1, "a")]))
+        self.failUnlessException(InvalidArgumentException, plugin.execute,
+                                 {}, iter([(1, "a")]), ["x", "y"],
+                                 quantiles=(2,))
+
+
+class DiffTablePluginTestCase(GirlFriendTestCase):
+
+    def test_diff_table(self):
+        titles = (Title("id"), Title("name"), Title("age"))
+        ctx = {
+            "yesterday": ListTable("users", titles, [
+                (1, "Sam", 20), (2, "Jack", 30), (3, "Betty", 25)]),
+            "today": ListTable("users", titles, [
+                (1, "Sam", 21), (3, "Betty", 25), (4, "Tom", 18)]),
+        }
+        diff = DiffTablePlugin()
+        for lazy, spill in ((False, False), (True, True)):
+            result = diff.execute(ctx, "yesterday", "today", "id",
+                                  variable="delta", lazy=lazy, spill=spill)
+            self.assertIs(ctx["delta"], result)
+            self.assertEquals(result["inserted"].name, "users_inserted")
+            self.assertEquals([tuple(row) for row in result["inserted"]],
+                              [(4, "Tom", 18)])
+            self.assertEquals([tuple(row) for row in result["deleted"]],
+                              [(2, "Jack", 30)])
+            self.assertEquals([tuple(row) for row in result["changed"]],
+                              [(1, "Sam", 21)])
+        self.assertIsInstance(result["changed"], PositionView)
+
+
+class TopTablePluginTestCase(GirlFriendTestCase):
+
+    def test_top_table(self):
+        table = ListTable("scores", (Title("class"), Title("name"),
+                                     Title("score")), [
+            (1, "Sam", 90), (2, "Jack", 85), (1, "Betty", 95),
+            (2, "Tom", 70), (1, "Lily", 60), (2, "Lucy", 99)])
+        ctx = {"scores": table}
+        result = TopTablePlugin().execute(
+            ctx, "scores", 2, "score", group_by="class", variable="top")
+        self.assertIs(ctx["top"], result)
+        self.assertEquals([row.name for row in result],
+                          ["Betty", "Sam", "Lucy", "Jack"])
+
+        result = TopTablePlugin().execute(ctx, table, 1, "score",
+                                          ascending=True, lazy=True)
+        self.assertIsInstance(result, PositionView)
+        self.assertEquals(result[0].name, "Lily")
+
+
+class WindowTablePluginTestCase(GirlFriendTestCase):
+
+    def test_window_table(self):
+        table = ListTable("sales", (Title("shop"), Title("day"),
+                                    Title("amount")), [
+            ("b", 2, 5), ("a", 1, 10), ("a", 3, 30),
+            ("b", 1, 1), ("a", 2, 20)])
+        ctx = {"sales": table}
+        result = WindowTablePlugin().execute(ctx, "sales", "day", (
+            "rn = row_number()",
+            (Title("avg2", u"两日均值"), "rolling_avg(amount, 2)"),
+            "prev = lag(amount)",
+        ), partition_by="shop", sort=True, variable="sales2")
+        self.assertIs(ctx["sales2"], result)
+        self.assertEquals(
+            [title.name for title in result.titles],
+            ["shop", "day", "amount", "rn", "avg2", "prev"])
+        self.assertEquals(result.titles[4].title, u"两日均值")
+        self.assertEquals([tuple(row) for row in result], [
+            ("a", 1, 10, 1, 10.0, None),
+            ("a", 2, 20, 2, 15.0, 10),
+            ("a", 3, 30, 3, 25.0, 20),
+            ("b", 1, 1, 1, 1.0, None),
+            ("b", 2, 5, 2, 3.0, 1),
+        ])
+
+        column_table = ColumnTable("sales", table.titles, table._data)
+        result = WindowTablePlugin().execute(
+            ctx, column_table, "day", ("total = rolling_sum(amount, 10)",))
+        self.assertIsInstance(result, ColumnTable)
+        self.assertEquals(list(result.column("total")),
+                          [5, 15, 45, 46, 66])
+        result.append(("c", 1, 1, 1))
+        self.assertEquals(len(column_table), 5)
+        self.assertEquals(list(column_table.column("amount")),
+                          [5, 10, 30, 1, 20])
+        self.failUnlessException(
+            InvalidArgumentException, WindowTablePlugin().execute,
+            ctx, table, "day", ("x = lag(missing)",))
+
+
+class EnrichTablePluginTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.shops = ListTable("shops", (Title("id"), Title("shop_name"),
+                                         Title("city")), [
+            (1, "Apple", "Beijing"), (2, "Pear", "Shanghai")])
+        self.orders = ListTable("orders", (Title("order_id"),
+                                           Title("shop_id")), [
+            (100, 2), (101, 1), (102, 3)])
+
+    def test_enrich_table(self):
+        plugin = EnrichTablePlugin()
+        ctx = {"shops": self.shops, "orders": self.orders}
+        result = plugin.execute(ctx, "orders", "shops", "shop_id=id",
+                                fields=["shop_name", Title("city", u"城市")],
+                                default="-", variable="orders2")
+        self.assertIs(ctx["orders2"], result)
+        self.assertEquals(
+            [title.name for title in result.titles],
+            ["order_id", "shop_id", "shop_name", "city"])
+        self.assertEquals(result.titles[-1].title, u"城市")
+        self.assertEquals([tuple(row) for row in result], [
+            (100, 2, "Pear", "Shanghai"),
+            (101, 1, "Apple", "Beijing"),
+            (102, 3, "-", "-"),
+        ])
+
+        column_orders = ColumnTable("orders", self.orders.titles,
+                                    self.orders._data)
+        result = plugin.execute(ctx, column_orders, self.shops, "shop_id=id",
+                                fields=["city"])
+        self.assertIsInstance(result, ColumnTable)
+        self.assertEquals(list(result.column("city")),
+                          ["Shanghai", "Beijing", None])
+        result.append((103, 2, "Shanghai"))
+        self.assertEquals(len(result), 4)
+        self.assertEquals(len(column_orders), 3)
+        self.assertEquals(list(column_orders.column("order_id")),
+                          [100, 101, 102])
+
+        self.failUnlessException(InvalidArgumentException, plugin.execute,
+                                 ctx, "orders", "shops", "shop_id=id",
+                                 ["missing"])
+
+    def test_enrich_records(self):
+        plugin = EnrichTablePlugin()
+        records = iter([{"shop_id": 1, "amount": 5},
+                        {"shop_id": 4, "amount": 6}])
+        result = plugin.execute({}, records, self.shops, "shop_id=id")
+        self.assertEquals(list(result), [
+            {"shop_id": 1, "amount": 5, "shop_name": "Apple",
+             "city": "Beijing"},
+            {"shop_id": 4, "amount": 6, "shop_name": None, "city": None},
+        ])
+
+    def test_cache(self):
+        plugin = EnrichTablePlugin()
+        loads = []
+
+        def load_shops(ctx):
+            loads.append(1)
+            return self.shops
+
+        for _ in xrange(3):
+            plugin.execute({}, self.orders, load_shops, "shop_id=id",
+                           cache_key="shops")
+        self.assertEquals(len(loads), 1)
+
+        # 过期之后重新加载
+        plugin.execute({}, self.orders, load_shops, "shop_id=id",
+                       cache_key="shops_ttl", ttl=0)
+        plugin.execute({}, self.orders, load_shops, "shop_id=id",
+                       cache_key="shops_ttl", ttl=0)
+        self.assertEquals(len(loads), 3)
+
+        plugin.sys_cleanup({})
+        plugin.execute({}, self.orders, load_shops, "shop_id=id",
+                       cache_key="shops")
+        self.assertEquals(len(loads), 4)
+
+        # 多列关联，列名相同时可以只写一个列名
+        stock = ListTable("stock", (Title("shop_id"), Title("sku"),
+                                    Title("qty")), [(1, "a", 3)])
+        items = ListTable("items", (Title("shop_id"), Title("item"),
+                                    Title("x")), [(1, "a", 0), (1, "b", 0)])
+        result = plugin.execute({}, items, stock, "shop_id, item=sku")
+        self.assertEquals(list(result.column("qty")), [3, None])
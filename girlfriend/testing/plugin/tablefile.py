@@ -0,0 +1,41 @@
+# coding: utf-8
+
+import os
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.data.table import Title, ListTable
+from girlfriend.plugin.tablefile import (
+    TableR,
+    TableW,
+    TableReaderPlugin,
+    TableWriterPlugin
+)
+
+
+class TableFilePluginTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.path = "test_plugin_table.gft"
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_write_and_read(self):
+        ctx = {
+            "students": ListTable(
+                "students", (Title("id"), Title("name")),
+                [(1, "Sam"), (2, "Jack")])
+        }
+        TableWriterPlugin().execute(
+            ctx, TableW(self.path, "students", compression="zlib"))
+        result = TableReaderPlugin().execute(
+            ctx, TableR(self.path, variable="loaded"))
+        table = ctx["loaded"]
+        self.assertIs(result[0], table)
+        self.assertEquals([tuple(row) for row in table],
+                          [(1, "Sam"), (2, "Jack")])
+
+        result = TableReaderPlugin().execute(
+            ctx, TableR(self.path, columns=("name",), result_wrapper=list))
+        self.assertEquals([tuple(row) for row in result[0]],
+                          [("Sam",), ("Jack",)])
@@ -0,0 +1,87 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+
+import time
+import shutil
+import tempfile
+import os.path
+from girlfriend.testing import GirlFriendTestCase
+from girlfriend.util.cache import (
+    MemoryCache,
+    SQLiteCache,
+    FileCache,
+    TieredCache
+)
+from girlfriend.exception import InvalidArgumentException
+
+
+class CacheTestCase(GirlFriendTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _check_cache(self, cache):
+        cache.set("a", [1, 2, 3], tag="db1")
+        cache.set("b", {"x": u"中文"}, ttl=60, tag="db2")
+        cache.set("c", (1, None), ttl=0.05, tag="db1")
+        self.assertEquals(cache.get("a"), [1, 2, 3])
+        self.assertEquals(cache.get("b"), {"x": u"中文"})
+        self.assertEquals(cache.get("c"), (1, None))
+        self.assertIsNone(cache.get("d"))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("c"))
+
+        cache.delete("b")
+        self.assertIsNone(cache.get("b"))
+        cache.set("b", 2, tag="db2")
+        cache.invalidate("db1")
+        self.assertIsNone(cache.get("a"))
+        self.assertEquals(cache.get("b"), 2)
+        cache.invalidate()
+        self.assertIsNone(cache.get("b"))
+        self.failUnlessException(
+            InvalidArgumentException, cache.set, "e", 1, 0)
+
+    def test_memory_cache(self):
+        self._check_cache(MemoryCache())
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        # 淘汰最久未使用的b
+        self.assertEquals(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEquals(cache.get("a"), 1)
+
+    def test_sqlite_cache(self):
+        path = os.path.join(self.directory, "cache.db")
+        cache = SQLiteCache(path)
+        self._check_cache(cache)
+        cache.set("a", range(100), ttl=60)
+        cache.close()
+        # 重新打开之后仍然可用
+        cache = SQLiteCache(path)
+        self.assertEquals(cache.get("a"), range(100))
+        cache.close()
+
+    def test_file_cache(self):
+        self._check_cache(FileCache(os.path.join(self.directory, "files")))
+
+    def test_tiered_cache(self):
+        self._check_cache(TieredCache(
+            MemoryCache(), SQLiteCache(os.path.join(self.directory, "t.db"))))
+
+        front = MemoryCache()
+        back = FileCache(self.directory)
+        back.set("a", 1, ttl=60, tag="db1")
+        cache = TieredCache(front, back)
+        self.assertEquals(cache.get("a"), 1)
+        # 回填到内存缓存中，并且保留剩余的过期时间与标签
+        value, expire_time, tag = front.get_entry("a")
+        self.assertEquals((value, tag), (1, "db1"))
+        self.assertTrue(time.time() < expire_time <= time.time() + 60)
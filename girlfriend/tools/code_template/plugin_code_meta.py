@@ -41,6 +41,36 @@ all_meta = {
         ]
     ),
 
+    # table file series
+    "read_table": PluginCodeMeta(
+        plugin_name="read_table",
+        args_template="""[
+                TableR(
+                  path="filepath",
+                  columns=None,
+                  lazy=True,
+                  result_wrapper=None,
+                  variable=None
+                ),
+            ]""",
+        auto_imports=[
+            "from girlfriend.plugin.tablefile import TableR",
+        ]
+    ),
+    "write_table": PluginCodeMeta(
+        plugin_name="write_table",
+        args_template="""[
+                TableW(
+                  path="filepath",
+                  table="$table_var",
+                  compression=None
+                ),
+            ]""",
+        auto_imports=[
+            "from girlfriend.plugin.tablefile import TableW",
+        ]
+    ),
+
     # excel series
     "read_excel": PluginCodeMeta(
         plugin_name="read_excel",
@@ -75,7 +105,8 @@ all_meta = {
                         sheet_handler=None
                     ),
                 ),
-                "workbook_handler": None
+                "workbook_handler": None,
+                "constant_memory": False
             }""",
         auto_imports=[
             "from girlfriend.plugin.excel import SheetW"
@@ -155,7 +186,9 @@ all_meta = {
                     result_wrapper=TableWrapper(
                             "table_name",
                             titles=[]
-                    )
+                    ),
+                    stream=False,
+                    cache_ttl=None
                 ),
                 SQL(
                     engine_name="",
@@ -166,7 +199,9 @@ all_meta = {
                     result_wrapper=TableWrapper(
                             "table_name",
                             titles=[]
-                    )
+                    ),
+                    stream=False,
+                    cache_ttl=None
                 ),
             ]""",
         auto_imports=[
@@ -174,6 +209,49 @@ all_meta = {
             "from girlfriend.data.table import TableWrapper"
         ]
     ),
+    "write_db": PluginCodeMeta(
+        plugin_name="write_db",
+        args_template="""[
+                DBW(
+                    engine_name="",
+                    table_name="",
+                    object="$table_var",
+                    columns=None,
+                    mode="insert",
+                    keys=None,
+                    batch_size=1000,
+                    commit_batches=10,
+                    record_handler=None,
+                    record_filter=None,
+                    variable=None
+                ),
+            ]""",
+        auto_imports=[
+            "from girlfriend.plugin.orm import DBW",
+        ]
+    ),
+    "export_sql": PluginCodeMeta(
+        plugin_name="export_sql",
+        args_template="""[
+                SQLExport(
+                    engine_name="",
+                    sql="",
+                    path="",
+                    params=None,
+                    format="csv",
+                    titles=None,
+                    header=True,
+                    fetch_size=1000,
+                    compress=None,
+                    row_handler=None,
+                    compression=None,
+                    variable=None
+                ),
+            ]""",
+        auto_imports=[
+            "from girlfriend.plugin.orm import SQLExport",
+        ]
+    ),
 
     # table series
     "table_adapter": PluginCodeMeta(
@@ -203,7 +281,8 @@ all_meta = {
                 "new_table_name": None,
                 "default": None,
                 "sum_title": None,
-                "avg_title": None
+                "avg_title": None,
+                "aggregate": None
             }""",
         auto_imports=[
             "from girlfriend.data.table import Title",
@@ -213,9 +292,16 @@ all_meta = {
         plugin_name="print_table",
         args_template="""[
                 "$table1",
-                "$table2",
+                PrintTable(
+                    table="$table2",
+                    max_rows=None,
+                    head=None,
+                    tail=None
+                ),
             ]""",
-        auto_imports=[]
+        auto_imports=[
+            "from girlfriend.plugin.table import PrintTable",
+        ]
     ),
     "html_table": PluginCodeMeta(
         plugin_name="html_table",
@@ -229,7 +315,10 @@ all_meta = {
                         "title-cell": "",
                         "data-row": "",
                         "data-cell": "",
-                    }
+                    },
+                    sink=None,
+                    max_rows=None,
+                    escape=True
                 ),
             ]""",
         auto_imports=[
@@ -244,7 +333,8 @@ all_meta = {
                 ],
                 "name": "new table name",
                 "titles": 0,
-                "variable": None
+                "variable": None,
+                "lazy": False
             }""",
         auto_imports=[]
     ),
@@ -267,6 +357,106 @@ all_meta = {
         args_template="""{
                 "table": "$table_var",
                 "split_condition": lambda row: None, "new table name",
+                "variable": None,
+                "lazy": False,
+                "parallel": None
+            }""",
+        auto_imports=[
+            "from girlfriend.data.partition import HashPartitioner",
+        ]
+    ),
+    "filter_table": PluginCodeMeta(
+        plugin_name="filter_table",
+        args_template="""{
+                "table": "$table_var",
+                "condition": "column > 0",
+                "name": None,
+                "variable": None,
+                "lazy": False
+            }""",
+        auto_imports=[]
+    ),
+    "derive_columns": PluginCodeMeta(
+        plugin_name="derive_columns",
+        args_template="""{
+                "table": "$table_var",
+                "expressions": [
+                    "new_column = column_a * column_b",
+                ],
+                "name": None,
+                "variable": None
+            }""",
+        auto_imports=[]
+    ),
+    "table_stats": PluginCodeMeta(
+        plugin_name="table_stats",
+        args_template="""{
+                "table": "$table_var",
+                "columns": None,
+                "precision": 14,
+                "compression": 100,
+                "sample_size": 20,
+                "quantiles": (0.25, 0.5, 0.75),
+                "name": None,
+                "variable": None
+            }""",
+        auto_imports=[]
+    ),
+    "diff_table": PluginCodeMeta(
+        plugin_name="diff_table",
+        args_template="""{
+                "old": "$old_table_var",
+                "new": "$new_table_var",
+                "keys": "id",
+                "fields": None,
+                "name": None,
+                "variable": None,
+                "lazy": False,
+                "spill": False
+            }""",
+        auto_imports=[]
+    ),
+    "top_table": PluginCodeMeta(
+        plugin_name="top_table",
+        args_template="""{
+                "table": "$table_var",
+                "n": 10,
+                "order_by": "column",
+                "group_by": None,
+                "ascending": False,
+                "name": None,
+                "variable": None,
+                "lazy": False
+            }""",
+        auto_imports=[]
+    ),
+    "window_table": PluginCodeMeta(
+        plugin_name="window_table",
+        args_template="""{
+                "table": "$table_var",
+                "order_by": "column",
+                "functions": [
+                    "rn = row_number()",
+                    "avg_7 = rolling_avg(column_a, 7)",
+                ],
+                "partition_by": None,
+                "sort": False,
+                "name": None,
+                "variable": None
+            }""",
+        auto_imports=[]
+    ),
+    "enrich_table": PluginCodeMeta(
+        plugin_name="enrich_table",
+        args_template="""{
+                "table": "$table_var",
+                "dimension": "$dimension_table_var",
+                "on": "fact_column=dimension_column",
+                "fields": None,
+                "cache_key": None,
+                "ttl": "10m",
+                "default": None,
+                "name": None,
                 "variable": None
             }""",
         auto_imports=[]
@@ -0,0 +1,308 @@
+# coding: utf-8
+
+"""带有过期时间的结果缓存
+缓存项可以附带一个标签，之后按照标签批量失效，比如以引擎名作为标签失效某个数据源的所有缓存：
+
+    MemoryCache     进程内缓存，直接保存对象，超出容量时淘汰最久未使用的缓存项
+    SQLiteCache     本地SQLite文件，多个进程或者多次运行之间可以共享
+    FileCache       每个缓存项一个文件
+    TieredCache     组合多个缓存，读取时逐层查找并回填到前面的缓存中
+
+SQLiteCache与FileCache使用pickle序列化并以zlib压缩，缓存的值必须可以被pickle。
+"""
+
+from __future__ import absolute_import
+
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import collections
+import cPickle as pickle
+from abc import ABCMeta, abstractmethod
+from girlfriend.exception import InvalidArgumentException
+
+
+def dumps(value):
+    """紧凑序列化：最高版本的pickle协议加上zlib压缩
+    """
+    return zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 1)
+
+
+def loads(data):
+    return pickle.loads(zlib.decompress(data))
+
+
+def _expire_time(ttl):
+    if ttl is None:
+        return None
+    if ttl <= 0:
+        raise InvalidArgumentException(u"缓存的过期时间必须为正数")
+    return time.time() + ttl
+
+
+class AbstractCache(object):
+
+    """缓存抽象，未命中或者已经过期时get返回None，因此不能缓存None
+    """
+
+    __metaclass__ = ABCMeta
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    @abstractmethod
+    def get_entry(self, key):
+        """获取未过期的缓存项
+        :return (值, 过期时间, 标签)，未命中时返回None
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl=None, tag=None):
+        """
+        :param key 缓存键，字符串
+        :param value 缓存的值
+        :param ttl 过期时间，单位为秒，为None时永不过期
+        :param tag 标签，用于按标签失效
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def invalidate(self, tag=None):
+        """失效带有指定标签的缓存项，tag为None时清空全部缓存
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryCache(AbstractCache):
+
+    """进程内LRU缓存
+    """
+
+    def __init__(self, max_entries=1024):
+        if max_entries <= 0:
+            raise InvalidArgumentException(u"缓存容量必须为正整数")
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entry(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expire_time = entry[1]
+            if expire_time is not None and expire_time <= time.time():
+                return None
+            # 重新插入到末尾，标记为最近使用
+            self._entries[key] = entry
+            return entry
+
+    def set(self, key, value, ttl=None, tag=None):
+        entry = (value, _expire_time(ttl), tag)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, tag=None):
+        with self._lock:
+            if tag is None:
+                self._entries.clear()
+                return
+            for key in [key for key, entry in self._entries.iteritems()
+                        if entry[2] == tag]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache(AbstractCache):
+
+    """基于本地SQLite文件的缓存
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute(
+                "create table if not exists gf_cache ("
+                "key text primary key, tag text, "
+                "expire_time real, value blob)")
+            self._connection.execute(
+                "create index if not exists gf_cache_tag on gf_cache(tag)")
+            self._connection.commit()
+
+    def get_entry(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                "select value, expire_time, tag from gf_cache where key = ?",
+                (key,)).fetchone()
+        if row is None:
+            return None
+        value, expire_time, tag = row
+        if expire_time is not None and expire_time <= time.time():
+            self.delete(key)
+            return None
+        return loads(str(value)), expire_time, tag
+
+    def set(self, key, value, ttl=None, tag=None):
+        data = sqlite3.Binary(dumps(value))
+        expire_time = _expire_time(ttl)
+        with self._lock:
+            self._connection.execute(
+                "insert or replace into gf_cache values (?, ?, ?, ?)",
+                (key, tag, expire_time, data))
+            self._connection.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._connection.execute(
+                "delete from gf_cache where key = ?", (key,))
+            self._connection.commit()
+
+    def invalidate(self, tag=None):
+        with self._lock:
+            if tag is None:
+                self._connection.execute("delete from gf_cache")
+            else:
+                self._connection.execute(
+                    "delete from gf_cache where tag = ?", (tag,))
+            self._connection.commit()
+
+    def purge(self):
+        """删除所有已经过期的缓存项
+        """
+        with self._lock:
+            self._connection.execute(
+                "delete from gf_cache where expire_time <= ?", (time.time(),))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class FileCache(AbstractCache):
+
+    """基于文件的缓存，每个缓存项对应目录下的一个文件，
+       文件头部保存过期时间与标签，写入时先写临时文件再重命名，避免读到写了一半的文件
+    """
+
+    def __init__(self, directory):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._directory = directory
+
+    def _path(self, key):
+        return os.path.join(self._directory,
+                            hashlib.md5(key).hexdigest() + ".cache")
+
+    def get_entry(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                expire_time, tag = pickle.load(f)
+                if expire_time is None or expire_time > time.time():
+                    return loads(f.read()), expire_time, tag
+        except (IOError, EOFError):
+            return None
+        self.delete(key)
+        return None
+
+    def set(self, key, value, ttl=None, tag=None):
+        path = self._path(key)
+        fd, temp_path = tempfile.mkstemp(dir=self._directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((_expire_time(ttl), tag), f,
+                            pickle.HIGHEST_PROTOCOL)
+                f.write(dumps(value))
+            os.rename(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def invalidate(self, tag=None):
+        for file_name in os.listdir(self._directory):
+            if not file_name.endswith(".cache"):
+                continue
+            path = os.path.join(self._directory, file_name)
+            if tag is not None:
+                try:
+                    with open(path, "rb") as f:
+                        _, file_tag = pickle.load(f)
+                except (IOError, EOFError):
+                    continue
+                if file_tag != tag:
+                    continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class TieredCache(AbstractCache):
+
+    """多级缓存，通常由一个MemoryCache与一个持久化缓存组成，
+       持久化缓存中命中的值会以剩余的过期时间回填到前面的缓存中
+    """
+
+    def __init__(self, *caches):
+        if not caches:
+            raise InvalidArgumentException(u"多级缓存至少需要包含一个缓存")
+        self._caches = caches
+
+    def get_entry(self, key):
+        for idx, cache in enumerate(self._caches):
+            entry = cache.get_entry(key)
+            if entry is None:
+                continue
+            value, expire_time, tag = entry
+            ttl = None if expire_time is None else expire_time - time.time()
+            if ttl is None or ttl > 0:
+                for front in self._caches[:idx]:
+                    front.set(key, value, ttl, tag)
+            return entry
+        return None
+
+    def set(self, key, value, ttl=None, tag=None):
+        for cache in self._caches:
+            cache.set(key, value, ttl, tag)
+
+    def delete(self, key):
+        for cache in self._caches:
+            cache.delete(key)
+
+    def invalidate(self, tag=None):
+        for cache in self._caches:
+            cache.invalidate(tag)
+
+    def close(self):
+        for cache in self._caches:
+            cache.close()
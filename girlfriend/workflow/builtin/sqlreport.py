@@ -21,7 +21,8 @@
 
 # 该单元描述邮件发送详情，可选，server为要使用的smtp服务器，sender为发件人，receivers为收件人
   当receivers为逗号隔开的字符串时，会一并发送给所有的收件人，方便统一沟通，当receivers为数组时，会单独发给每个人
-  content为html形式的邮件正文，table为要在正文显示的html表格
+  content为html形式的邮件正文，table为要在正文显示的html表格，
+  table_max_rows为正文中每个表格最多显示的行数，可选
 {
   "server": "test",
   "sender": "hongze.chi@gmail.com",
@@ -29,6 +30,7 @@
   "subject": "数据邮件",
   "content": "<h1>数据报表</h1>",
   "table": [0, 1],
+  "table_max_rows": 500
 }
 
 # 该单元描述导出Excel文件，sheets为包含的数据库表，从0开始计数
@@ -43,13 +45,13 @@
 
 import argparse
 import os.path
-from girlfriend.data.table import TableWrapper
+from girlfriend.data.table import Title, ColumnTableWrapper
 from girlfriend.util.script import show_msg_and_exit
 from girlfriend.workflow.gfworkflow import Job, Decision
 from girlfriend.plugin.json import JSONR
 from girlfriend.plugin.orm import SQL
 from girlfriend.plugin.excel import SheetW
-from girlfriend.plugin.table import HTMLTable
+from girlfriend.plugin.table import HTMLTable, PrintTable
 from girlfriend.plugin.mail import Attachment
 
 
@@ -58,6 +60,8 @@ cmd_parser.add_argument("--task", "-t", dest="task", default="",
                         help=u"指定任务描述文件")
 cmd_parser.add_argument("--print", "-p", dest="print_tables",
                         action="store_true", help=u"是否打印表格")
+cmd_parser.add_argument("--max-rows", dest="max_rows", type=int,
+                        default=None, help=u"打印表格时最多显示的行数")
 
 
 def workflow(options):
@@ -93,7 +97,9 @@ def workflow(options):
         # print tables
         Job(
             "print_table",
-            args="orm_query.result"
+            args=lambda ctx: [
+                PrintTable(table, max_rows=options.max_rows)
+                for table in ctx["orm_query.result"]]
         ),
 
         # 决定是否要输出Excel
@@ -128,7 +134,8 @@ def workflow(options):
             "html_table",
             args=lambda ctx: [HTMLTable(
                 ctx["orm_query.result"][idx],
-                property=ctx["task"]["mail"].get("table_property"))
+                property=ctx["task"]["mail"].get("table_property"),
+                max_rows=ctx["task"]["mail"].get("table_max_rows"))
                 for idx in ctx["task"]["mail"]["tables"]]
         ),
 
@@ -154,15 +161,23 @@ def _task(records):
 
 def _gen_orm_query_args(ctx):
     sqltasks = ctx["task"]["sqltasks"]
-    return [
-        SQL(
-            engine_name=t["db"],
-            variable_name="table_%d" % idx,
-            sql=t["sql"],
-            result_wrapper=TableWrapper(t["table"], t["titles"],
-                                        auto_title_name=True)
-        ) for idx, t in enumerate(sqltasks)
-    ]
+    # 各个SQL任务相互独立，并发执行，
+    # 结果按批次读取并直接按列物化为表格，不会先生成完整的行元组列表
+    return {
+        "queries": [
+            SQL(
+                engine_name=t["db"],
+                variable_name="table_%d" % idx,
+                sql=t["sql"],
+                stream=True,
+                result_wrapper=ColumnTableWrapper(
+                    t["table"],
+                    [Title("field_%d" % title_idx, title)
+                     for title_idx, title in enumerate(t["titles"])])
+            ) for idx, t in enumerate(sqltasks)
+        ],
+        "parallel": True
+    }
 
 
 def _gen_excel_args(ctx):
@@ -6,7 +6,6 @@ from girlfriend import VERSION
 
 install_requires = [
     "SQLAlchemy >= 1.0.9",
-    "prettytable",
     "httpretty",
     "ujson",
     "termcolor >= 1.1.0",
@@ -50,6 +49,8 @@ setuptools.setup(
         "girlfriend.plugin": [
             # db plugin
             "orm_query = girlfriend.plugin.orm:OrmQueryPlugin",
+            "write_db = girlfriend.plugin.orm:DBWriterPlugin",
+            "export_sql = girlfriend.plugin.orm:SQLExportPlugin",
 
             # table plugin
             "table_adapter = girlfriend.plugin.table:TableAdapterPlugin",
@@ -59,6 +60,13 @@ setuptools.setup(
             "join_table = girlfriend.plugin.table:JoinTablePlugin",
             "split_table = girlfriend.plugin.table:SplitTablePlugin",
             "html_table = girlfriend.plugin.table:HTMLTablePlugin",
+            "filter_table = girlfriend.plugin.table:FilterTablePlugin",
+            "derive_columns = girlfriend.plugin.table:DeriveColumnsPlugin",
+            "table_stats = girlfriend.plugin.table:TableStatsPlugin",
+            "diff_table = girlfriend.plugin.table:DiffTablePlugin",
+            "top_table = girlfriend.plugin.table:TopTablePlugin",
+            "window_table = girlfriend.plugin.table:WindowTablePlugin",
+            "enrich_table = girlfriend.plugin.table:EnrichTablePlugin",
 
             # json plugin
             "read_json = girlfriend.plugin.json:JSONReaderPlugin",
@@ -72,6 +80,10 @@ setuptools.setup(
             "read_csv = girlfriend.plugin.csv:CSVReaderPlugin",
             "write_csv = girlfriend.plugin.csv:CSVWriterPlugin",
 
+            # table file plugin
+            "read_table = girlfriend.plugin.tablefile:TableReaderPlugin",
+            "write_table = girlfriend.plugin.tablefile:TableWriterPlugin",
+
             # email plugin
             "send_mail = girlfriend.plugin.mail:SendMailPlugin",
 